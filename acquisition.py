@@ -0,0 +1,165 @@
+import logging
+import queue
+import threading
+import time
+from metrics import MALFORMED_LINES, SERIAL_READ_SECONDS
+from sensor_protocol import read_available
+
+logger = logging.getLogger(__name__)
+
+
+class SerialAcquisition:
+    # Owns the serial port on a background thread: reads every line the
+    # device emits, hands it to handle_line and publishes the result to a
+    # lock-protected snapshot and a bounded queue (oldest dropped when full).
+    # With a sensor_protocol.FrameDecoder the port is drained in bulk and
+    # handle_line gets one decoded reading dict at a time instead of a line.
+
+    # What log messages call the other end
+    device = "Arduino"
+
+    def __init__(self, port, baud_rate, handle_line, queue_size=1000,
+                 min_backoff=1.0, max_backoff=30.0, settle_time=2.0, decoder=None):
+        self.port = port
+        self.baud_rate = baud_rate
+        self.handle_line = handle_line
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.settle_time = settle_time
+        self.decoder = decoder
+
+        self.lock = threading.Lock()
+        self.readings = queue.Queue(maxsize=queue_size)
+        self.snapshot = None
+        self.ser = None
+        self.connected = False
+        self.lines_read = 0
+        self.parse_errors = 0
+        self.dropped = 0
+
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name=f"acquisition-{self.port}", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=5.0):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._close()
+
+    def latest(self):
+        with self.lock:
+            return self.snapshot
+
+    def drain(self, max_items=None):
+        items = []
+        while max_items is None or len(items) < max_items:
+            try:
+                items.append(self.readings.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def stats(self):
+        stats = {
+            "port": self.port,
+            "connected": self.connected,
+            "lines_read": self.lines_read,
+            "parse_errors": self.parse_errors,
+            "dropped": self.dropped,
+            "queue_depth": self.readings.qsize()
+        }
+        if self.decoder is not None:
+            stats["protocol"] = self.decoder.stats()
+        return stats
+
+    def _connect(self):
+        # pyserial is imported on first connect, feed subscribers never need it
+        import serial
+        self.ser = serial.Serial(self.port, self.baud_rate, timeout=1)
+        # The board resets when the port opens, give it time to boot
+        self._stop_event.wait(self.settle_time)
+        self.ser.reset_input_buffer()
+        self.connected = True
+        logger.info(f"Connected to {self.device} on {self.port}")
+
+    def _close(self):
+        self.connected = False
+        if self.ser is not None:
+            try:
+                self.ser.close()
+            except Exception:
+                pass
+            self.ser = None
+
+    def _run(self):
+        backoff = self.min_backoff
+        while not self._stop_event.is_set():
+            if self.ser is None:
+                try:
+                    self._connect()
+                    backoff = self.min_backoff
+                except Exception as e:
+                    self._close()
+                    logger.error(f"Could not connect to {self.device} on {self.port}: {e}, retrying in {backoff:.0f}s")
+                    self._stop_event.wait(backoff)
+                    backoff = min(backoff * 2, self.max_backoff)
+                    continue
+
+            try:
+                items = self._read_items()
+            except Exception as e:
+                logger.error(f"Error reading from {self.device}: {e}")
+                self._close()
+                continue
+
+            for item in items:
+                self.lines_read += 1
+                try:
+                    result = self.handle_line(item)
+                except Exception as e:
+                    self.parse_errors += 1
+                    MALFORMED_LINES.labels(self.device).inc()
+                    logger.warning(f"Could not process {self.device} data {item!r}: {e}")
+                    continue
+
+                if result is not None:
+                    self._publish(result)
+
+    def _read_items(self):
+        if self.decoder is None:
+            # Only reads that returned a line are timed, so idle waits for
+            # the next sample do not swamp the histogram
+            start = time.perf_counter()
+            raw = self.ser.readline()
+            if not raw:
+                return []
+            SERIAL_READ_SECONDS.labels(self.device).observe(time.perf_counter() - start)
+            return [raw.decode('utf-8', errors='replace').strip()]
+
+        readings = read_available(self.ser, self.decoder, self.device)
+        fields = [field for field in readings if field != 'seq']
+        columns = [readings[field].tolist() for field in fields]
+        return [dict(zip(fields, values)) for values in zip(*columns)]
+
+    def _publish(self, result):
+        with self.lock:
+            self.snapshot = result
+        while True:
+            try:
+                self.readings.put_nowait(result)
+                return
+            except queue.Full:
+                try:
+                    self.readings.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
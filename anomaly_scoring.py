@@ -0,0 +1,130 @@
+import logging
+import os
+import numpy as np
+from datetime import datetime
+from compiled_model import CompiledModel, file_digest
+
+logger = logging.getLogger(__name__)
+
+ANOMALY_THRESHOLD = 0.5
+# Sensor values a record must carry; calendar fields can come from its
+# timestamp or the time of scoring
+REQUIRED_FIELDS = ('ph', 'biogas_production')
+
+
+def slim_artefact_path(model_path):
+    # Where compiled_model.py --export writes the sklearn-free form
+    return os.path.splitext(model_path)[0] + '.npz'
+
+
+def find_model(model_path):
+    # The pickle when it exists, else a slim artefact deployed on its own
+    if not os.path.exists(model_path) and os.path.exists(slim_artefact_path(model_path)):
+        return slim_artefact_path(model_path)
+    return model_path
+
+
+def load_model(model_path):
+    # Returns the package and its compiled evaluator, or None for the
+    # evaluator when the package cannot be compiled. A slim .npz exported
+    # from this very pickle is preferred, it loads in milliseconds without
+    # sklearn; after a retrain the pickle is used until it is re-exported.
+    slim_path = slim_artefact_path(model_path)
+    if os.path.exists(slim_path):
+        compiled_model = CompiledModel.load(slim_path)
+        if (model_path == slim_path or not os.path.exists(model_path)
+                or compiled_model.source_digest == file_digest(model_path)):
+            return compiled_model.package(), compiled_model
+        logger.warning(f"{slim_path} was exported from a different {model_path}, loading the pickle instead")
+
+    import joblib
+    model_package = joblib.load(model_path)
+
+    try:
+        compiled_model = CompiledModel.from_package(model_package)
+    except Exception as e:
+        logger.warning(f"Compiled evaluator unavailable, using sklearn: {e}")
+        compiled_model = None
+
+    return model_package, compiled_model
+
+
+def calendar_features(moment):
+    return {
+        'hour': moment.hour,
+        'day': moment.day,
+        'month': moment.month,
+        'day_of_week': moment.weekday()
+    }
+
+
+def check_record(record, feature_columns=()):
+    # Raises ValueError for anything build_feature_matrix would otherwise
+    # default or fail on
+    if not isinstance(record, dict):
+        raise ValueError(f"expected an object, got {type(record).__name__}")
+    missing = [field for field in REQUIRED_FIELDS if record.get(field) is None]
+    if missing:
+        raise ValueError(f"missing {', '.join(missing)}")
+    for feature in dict.fromkeys(REQUIRED_FIELDS + tuple(feature_columns)):
+        value = record.get(feature)
+        if value is None:
+            continue
+        try:
+            float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"{feature} is not a number: {value!r}") from None
+    if record.get('timestamp'):
+        try:
+            datetime.fromisoformat(str(record['timestamp']))
+        except ValueError:
+            raise ValueError(f"invalid timestamp {record['timestamp']!r}") from None
+
+
+def check_records(records, feature_columns=()):
+    for index, record in enumerate(records):
+        try:
+            check_record(record, feature_columns)
+        except ValueError as e:
+            raise ValueError(f"Invalid record {index}: {e}") from None
+
+
+def build_feature_matrix(records, feature_columns, now=None):
+    # Calendar fields missing from a record are derived from its own
+    # timestamp when it has one, otherwise from the time of scoring
+    default_calendar = calendar_features(now or datetime.now())
+
+    rows = []
+    for record in records:
+        calendar = default_calendar
+        if record.get('timestamp'):
+            calendar = calendar_features(datetime.fromisoformat(str(record['timestamp'])))
+
+        row = []
+        for feature in feature_columns:
+            value = record.get(feature)
+            if value is None:
+                value = calendar.get(feature, 0)
+            row.append(float(value))
+        rows.append(row)
+
+    return np.array(rows, dtype=np.float64).reshape(len(rows), len(feature_columns))
+
+
+def score_batch(model_package, input_data, compiled_model=None):
+    if compiled_model is not None:
+        return compiled_model.score(input_data)
+
+    # One transform/predict/inverse_transform pass for the whole batch
+    scaled_data = model_package['scaler'].transform(input_data)
+
+    if 'feature_selector' in model_package:
+        scaled_data = model_package['feature_selector'].transform(scaled_data)
+
+    prediction = model_package['model'].predict(scaled_data)
+
+    anomaly_scores = prediction[:, 0].astype(np.float64)
+    cause_ids = np.round(prediction[:, 1]).astype(int)
+    causes = model_package['cause_encoder'].inverse_transform(cause_ids)
+
+    return anomaly_scores, cause_ids, causes
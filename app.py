@@ -1,12 +1,28 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
+import atexit
 import logging
-import joblib
+import os
+import queue
 import numpy as np
-import pandas as pd
-from datetime import datetime
-import serial
+from datetime import datetime, timedelta
+import threading
 import time
+from anomaly_scoring import ANOMALY_THRESHOLD, build_feature_matrix, check_record, find_model, load_model
+from columnar import NPY_CONTENT_TYPE, decode_features, encode_results, mask_causes
+from acquisition import SerialAcquisition
+from digesters import Digester, parse_devices
+from event_stream import Broadcaster, format_event
+from history_buffer import HistoryBuffer, to_epoch
+from metrics import (
+    HISTORY_SIZE, HTTP_REQUEST_SECONDS, MALFORMED_LINES, PARSE_SECONDS, PREDICTION_SECONDS,
+    QUEUE_DEPTH, REGISTRY, SIMULATION_FALLBACKS, CONTENT_TYPE as METRICS_CONTENT_TYPE
+)
+from prediction_cache import PredictionCache
+from rollups import RollupEngine
+from segment_store import SegmentStore
+from sensor_feed import FEED_ADDRESS, FeedAcquisition
+from sensor_protocol import FrameDecoder
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -23,108 +39,148 @@ current_sensor_data = {
     'system_status': 'Normal'
 }
 
-historical_data = []
+HISTORY_CAPACITY = int(os.getenv('HISTORY_CAPACITY', '100'))
+historical_data = HistoryBuffer(HISTORY_CAPACITY)
+
+READINGS_STORE_DIR = os.getenv('READINGS_STORE_DIR', os.path.join('data', 'api'))
+STORE_RETENTION_DAYS = float(os.getenv('STORE_RETENTION_DAYS', '90'))
+STORE_COMPACT_INTERVAL = 3600
+
+# Opened by init_storage on the first request, not at import: the store
+# takes a writer lock, which the debug reloader's parent must not hold
+readings_store = None
+storage_lock = threading.Lock()
+storage_ready = False
+
+rollups = RollupEngine()
+
+STREAM_HEARTBEAT_SECONDS = 15
+broadcaster = Broadcaster()
+
+MODEL_PATH = find_model('biogas_anomaly_model.pkl')
+PREDICTION_CACHE_SIZE = int(os.getenv('PREDICTION_CACHE_SIZE', '4096'))
 
 try:
-    model_package = joblib.load('biogas_anomaly_model.pkl')
-    model = model_package['model']
-    scaler = model_package['scaler']
-    cause_encoder = model_package['cause_encoder']
+    prediction_cache = PredictionCache(MODEL_PATH, load_model, max_size=PREDICTION_CACHE_SIZE)
+    model_package = prediction_cache.model_package
+    # Only the pickled package has these, the slim artefact is compiled
+    model = model_package.get('model')
+    scaler = model_package.get('scaler')
+    cause_encoder = model_package.get('cause_encoder')
     feature_columns = model_package['feature_columns']
     logger.info("ML model loaded successfully")
 except Exception as e:
     logger.error(f"Error loading ML model: {e}")
+    prediction_cache = None
+    model_package = None
     model = None
     scaler = None
     cause_encoder = None
 
 SERIAL_PORT = 'COM3'
 BAUD_RATE = 9600
-ser = None
+ACQUISITION_QUEUE_SIZE = int(os.getenv('ACQUISITION_QUEUE_SIZE', '1000'))
+# Only used with SENSOR_FEED set to an empty string, which makes this
+# process open the port itself instead of subscribing to serial_daemon.py:
+# 'keyvalue' for ph:..,biogas:.. lines or 'binary' for sensor_protocol frames
+SERIAL_PROTOCOL = os.getenv('SERIAL_PROTOCOL', 'keyvalue')
+# Further digesters on this site as id=port pairs, see digesters.py. Each
+# gets its own reader thread, state and history under /api/devices/<id>/;
+# the original single-device routes keep serving DEFAULT_DEVICE_ID.
+DIGESTERS = os.getenv('DIGESTERS', '')
+DEFAULT_DEVICE_ID = 'default'
+# A digester whose link has delivered no usable reading for this many
+# seconds is served from simulation (three of the sketch's 5 s samples)
+READING_TIMEOUT = float(os.getenv('READING_TIMEOUT', '15'))
 
-def setup_serial():
-    global ser
-    try:
-        ser = serial.Serial(SERIAL_PORT, BAUD_RATE, timeout=1)
-        time.sleep(2)
-        logger.info(f"Connected to Arduino on {SERIAL_PORT}")
-        return True
-    except Exception as e:
-        logger.error(f"Could not connect to Arduino: {e}")
-        return False
+# Guards current_sensor_data and historical_data, which the acquisition
+# thread updates while request handlers read them
+state_lock = threading.Lock()
 
-def read_arduino_data():
-    global ser
-    if not ser:
-        if not setup_serial():
-            return None
+def parse_arduino_line(line):
+    data_parts = line.split(',')
+    data = {}
+    for part in data_parts:
+        key_value = part.split(':')
+        if len(key_value) == 2:
+            data[key_value[0].strip()] = float(key_value[1].strip())
     
-    try:
-        if ser.in_waiting > 0:
-            line = ser.readline().decode('utf-8').strip()
-            logger.info(f"Raw Arduino data: {line}")
-            
-            data_parts = line.split(',')
-            data = {}
-            for part in data_parts:
-                key_value = part.split(':')
-                if len(key_value) == 2:
-                    data[key_value[0].strip()] = float(key_value[1].strip())
-            
-            return data
+    return data
+
+def handle_arduino_line(line, digester=None):
+    logger.debug(f"Raw Arduino data: {line}")
+    with PARSE_SECONDS.labels('keyvalue').time():
+        arduino_data = parse_arduino_line(line)
+    
+    if 'ph' not in arduino_data or 'biogas' not in arduino_data:
+        MALFORMED_LINES.labels('Arduino').inc()
         return None
-    except Exception as e:
-        logger.error(f"Error reading from Arduino: {e}")
+    
+    return update_sensor_data(arduino_data['ph'], arduino_data['biogas'], digester=digester)
+
+def handle_arduino_reading(reading, digester=None):
+    # CSV-mode readings carry no biogas value; with nothing else arriving
+    # the digester goes stale and is simulated instead
+    if 'ph' not in reading or 'biogas' not in reading:
         return None
+    return update_sensor_data(reading['ph'], reading['biogas'], digester=digester)
 
-def predict_anomaly(ph, biogas_production):
-    if not model_package:
+def consume(handler, digester):
+    # The handlers update the digester themselves and nothing here drains
+    # the acquisition's queue, so hand it nothing (as serial_daemon.py
+    # does) rather than let it fill up and report drops
+    def handle(item):
+        handler(item, digester)
+        return None
+    return handle
+
+def create_acquisition(port, digester=None):
+    handle_reading = consume(handle_arduino_reading, digester)
+    handle_line = consume(handle_arduino_line, digester)
+    if port.startswith(('unix:', 'tcp:')):
+        # serial_daemon.py owns the port, this process only subscribes
+        return FeedAcquisition(handle_reading, port, queue_size=ACQUISITION_QUEUE_SIZE)
+    if SERIAL_PROTOCOL == 'binary':
+        return SerialAcquisition(port, BAUD_RATE, handle_reading,
+                                 queue_size=ACQUISITION_QUEUE_SIZE, decoder=FrameDecoder('binary'))
+    return SerialAcquisition(port, BAUD_RATE, handle_line, queue_size=ACQUISITION_QUEUE_SIZE)
+
+acquisition = create_acquisition(FEED_ADDRESS or SERIAL_PORT)
+
+def predict_anomaly_batch(records):
+    if not prediction_cache:
         logger.error("ML model not loaded")
-        return {"anomaly_probability": 0.0, "cause": "Unknown"}
+        return [{"anomaly_probability": 0.0, "cause": "Unknown"} for _ in records]
+    
+    if not records:
+        return []
     
     try:
-        now = datetime.now()
-        # Create input data matching expected feature columns
-        feature_data = {
-            'ph': ph,
-            'biogas_production': biogas_production,
-            'hour': now.hour,
-            'day': now.day,
-            'month': now.month,
-            'day_of_week': now.weekday()
-        }
-        
-        feature_columns = model_package['feature_columns']
-        
-        input_data = np.array([feature_data.get(feature, 0) for feature in feature_columns]).reshape(1, -1)
-        
-        scaled_data = model_package['scaler'].transform(input_data)
-        
-        if 'feature_selector' in model_package:
-            scaled_data = model_package['feature_selector'].transform(scaled_data)
-        
-        prediction = model_package['model'].predict(scaled_data)
+        with PREDICTION_SECONDS.labels('local').time():
+            input_data = build_feature_matrix(records, prediction_cache.model_package['feature_columns'])
+            anomaly_probabilities, _, causes = prediction_cache.score(input_data)
         
-        anomaly_probability = float(prediction[0][0])
-        
-        cause_id = int(np.round(prediction[0][1]))
-        cause = model_package['cause_encoder'].inverse_transform([cause_id])[0]
-        
-        logger.info(f"Prediction result: anomaly_prob={anomaly_probability}, cause={cause}")
-        return {
-            "anomaly_probability": anomaly_probability,
-            "cause": str(cause) if anomaly_probability > 0.5 else "None"
-        }
+        logger.info(f"Scored {len(records)} readings, anomalies={int((anomaly_probabilities > ANOMALY_THRESHOLD).sum())}")
+        return [
+            {
+                "anomaly_probability": float(anomaly_probability),
+                "cause": str(cause) if anomaly_probability > ANOMALY_THRESHOLD else "None"
+            }
+            for anomaly_probability, cause in zip(anomaly_probabilities, causes)
+        ]
     except Exception as e:
         logger.error(f"Prediction error: {e}")
-        return {"anomaly_probability": 0.0, "cause": "Error in prediction"}
+        return [{"anomaly_probability": 0.0, "cause": "Error in prediction"} for _ in records]
+
+def predict_anomaly(ph, biogas_production):
+    return predict_anomaly_batch([{'ph': ph, 'biogas_production': biogas_production}])[0]
 
 def generate_sample_historical_data():
-    global historical_data
     base_time = datetime.now()
-    for i in range(20):
+    # Oldest first, the history buffer expects readings in time order
+    for i in reversed(range(20)):
         time_offset = i * 15 * 60
-        sample_time = base_time - pd.Timedelta(seconds=time_offset)
+        sample_time = base_time - timedelta(seconds=time_offset)
         
         ph = 7.0 + np.sin(i/3) * 0.5
         biogas = 50.0 + np.cos(i/2) * 15
@@ -149,46 +205,177 @@ def generate_sample_historical_data():
         }
         historical_data.append(entry)
 
-generate_sample_historical_data()
+def stored_history(since=None, until=None, limit=None, max_points=None):
+    return [
+        {
+            'ph': record.get('ph', 0.0),
+            'biogas_production': record.get('biogas_production', 0.0),
+            'timestamp': record['timestamp'],
+            'anomaly_detected': record['anomaly_detected'],
+            'anomaly_probability': record.get('anomaly_probability', 0.0),
+            'system_status': record.get('status', 'Normal'),
+            'anomaly_cause': record.get('cause', 'None')
+        }
+        for record in readings_store.to_records(since=since, until=until, limit=limit, max_points=max_points)
+    ]
+
+def load_historical_data():
+    # Restore the in-memory window from disk after a restart, samples only
+    # when nothing has been recorded yet
+    if readings_store is not None:
+        records = readings_store.latest(HISTORY_CAPACITY)
+        if len(records):
+            for entry in stored_history(since=float(records['timestamp'][0])):
+                historical_data.append(entry)
+            current_sensor_data.update(entry)
+            return
+    generate_sample_historical_data()
 
-@app.route('/api/sensor-data', methods=['GET'])
-def get_sensor_data():
-    arduino_data = read_arduino_data()
-    
-    if arduino_data and 'ph' in arduino_data and 'biogas' in arduino_data:
-        current_sensor_data['ph'] = arduino_data['ph']
-        current_sensor_data['biogas_production'] = arduino_data['biogas']
-    else:
-        current_sensor_data['ph'] = current_sensor_data.get('ph', 7.0) + (np.random.random() - 0.5) * 0.1
-        current_sensor_data['biogas_production'] = current_sensor_data.get('biogas_production', 50.0) + (np.random.random() - 0.5) * 2
-    
-    current_sensor_data['timestamp'] = datetime.now().isoformat()
-    
-    prediction = predict_anomaly(current_sensor_data['ph'], current_sensor_data['biogas_production'])
-    current_sensor_data['anomaly_probability'] = prediction['anomaly_probability']
-    current_sensor_data['anomaly_detected'] = prediction['anomaly_probability'] > 0.5
-    current_sensor_data['anomaly_cause'] = prediction['cause']
+def load_rollups():
+    if readings_store is None:
+        return
+    records = readings_store.query(since=time.time() - rollups.retention())
+    rollups.add_many(records['timestamp'], {field: records[field] for field in rollups.fields})
+
+def open_readings_store():
+    try:
+        store = SegmentStore(READINGS_STORE_DIR, writable=True)
+        store.start_maintenance(STORE_COMPACT_INTERVAL, STORE_RETENTION_DAYS * 86400)
+        logger.info(f"Readings store opened at {READINGS_STORE_DIR}")
+        return store
+    except Exception as e:
+        logger.error(f"Could not open readings store, history will not persist: {e}")
+        return None
+
+def close_readings_store():
+    global readings_store
+    with storage_lock:
+        store, readings_store = readings_store, None
+    if store is not None:
+        store.close()
+        logger.info(f"Readings store at {READINGS_STORE_DIR} closed")
+
+def init_storage():
+    global readings_store, storage_ready
+    with storage_lock:
+        if storage_ready:
+            return
+        readings_store = open_readings_store()
+        load_historical_data()
+        load_rollups()
+        storage_ready = True
+    if readings_store is not None:
+        atexit.register(close_readings_store)
+
+def update_sensor_data(ph, biogas_production, source='arduino', digester=None):
+    return (digester or default_digester).update(ph, biogas_production, source)
+
+def record_reading(seq, reading, previous_status, source):
+    # Runs under state_lock for the default digester only; the store,
+    # rollups and stream all describe that one device
+    if readings_store is not None:
+        try:
+            readings_store.append(dict(reading, source=source))
+        except Exception as e:
+            logger.error(f"Could not persist reading: {e}")
+    rollups.add(historical_data.timestamp[seq % historical_data.capacity], reading)
     
-    if current_sensor_data['anomaly_detected']:
-        current_sensor_data['system_status'] = 'Warning'
-    else:
-        current_sensor_data['system_status'] = 'Normal'
+    # Published under the lock so stream clients see readings in seq order
+    broadcaster.publish(seq, 'reading', reading)
+    if reading['system_status'] != previous_status:
+        publish_status_change(seq, previous_status)
+
+def publish_status_change(seq, previous_status):
+    broadcaster.publish(seq, 'status', {
+        "status": current_sensor_data['system_status'],
+        "previous_status": previous_status,
+        "last_updated": current_sensor_data['timestamp'],
+        "anomaly_detected": current_sensor_data['anomaly_detected'],
+        "anomaly_cause": current_sensor_data.get('anomaly_cause', 'Unknown')
+    })
+
+default_digester = Digester(DEFAULT_DEVICE_ID, historical_data, predict_anomaly,
+                            current=current_sensor_data, lock=state_lock, on_update=record_reading,
+                            stale_after=READING_TIMEOUT)
+default_digester.acquisition = acquisition
+digesters = {}
+
+def add_digester(digester):
+    digesters[digester.id] = digester
+    QUEUE_DEPTH.labels(f"acquisition:{digester.id}").set_function(digester.acquisition.readings.qsize)
+    HISTORY_SIZE.labels(digester.id).set_function(digester.history.__len__)
+
+def configure_digesters(spec):
+    # Adds the digesters of a DIGESTERS spec; like the others, they start
+    # reading on the next request
+    devices = parse_devices(spec)
+    for device_id in devices:
+        if device_id in digesters:
+            raise ValueError(f"Digester id {device_id!r} is already in use")
+    for device_id, port in devices.items():
+        digester = Digester(device_id, HISTORY_CAPACITY, predict_anomaly, stale_after=READING_TIMEOUT)
+        digester.acquisition = create_acquisition(port, digester)
+        add_digester(digester)
+        logger.info(f"Digester {device_id} configured on {port}")
+    return [digesters[device_id] for device_id in devices]
+
+add_digester(default_digester)
+configure_digesters(DIGESTERS)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_latency(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        HTTP_REQUEST_SECONDS.labels(request.method, endpoint, response.status_code).observe(time.perf_counter() - started)
+    return response
+
+@app.before_request
+def start_acquisition():
+    # Started on first request so the debug reloader's parent process never
+    # grabs the port or the readings store
+    init_storage()
+    for digester in digesters.values():
+        digester.start()
+
+def sensor_data(digester):
+    if digester.connected:
+        return jsonify(digester.reading())
     
-    historical_data.append(dict(current_sensor_data))
-    if len(historical_data) > 100:
-        historical_data.pop(0)
+    # No board attached: keep the simulated random walk moving per poll
+    SIMULATION_FALLBACKS.labels('api').inc()
+    with digester.lock:
+        ph = digester.current.get('ph', 7.0) + (np.random.random() - 0.5) * 0.1
+        biogas_production = digester.current.get('biogas_production', 50.0) + (np.random.random() - 0.5) * 2
     
-    return jsonify(current_sensor_data)
+    return jsonify(update_sensor_data(ph, biogas_production, source='simulation', digester=digester))
+
+@app.route('/api/sensor-data', methods=['GET'])
+def get_sensor_data():
+    return sensor_data(default_digester)
 
 @app.route('/api/predict', methods=['POST'])
 def predict():
+    if request.mimetype == NPY_CONTENT_TYPE:
+        return predict_columnar(request.get_data())
+    
     try:
         data = request.json
+        if data and isinstance(data.get('data'), list):
+            return predict_batch(data['data'])
+        
         if not data or 'ph' not in data or 'biogas_production' not in data:
             return jsonify({"error": "Missing required parameters"}), 400
         
-        ph = float(data['ph'])
-        biogas_production = float(data['biogas_production'])
+        try:
+            ph = float(data['ph'])
+            biogas_production = float(data['biogas_production'])
+        except (TypeError, ValueError) as e:
+            return jsonify({"error": f"Invalid parameters: {e}"}), 400
         
         prediction = predict_anomaly(ph, biogas_production)
         
@@ -206,24 +393,215 @@ def predict():
         error_msg = str(e)
         logger.error(f"Error during prediction: {error_msg}")
         return jsonify({"error": error_msg}), 500
+
+def prediction_input(record):
+    # Checks up front everything build_feature_matrix would fail on, so a
+    # bad record is rejected instead of scored as "Error in prediction"
+    check_record(record, prediction_cache.model_package['feature_columns'] if prediction_cache else ())
+    entry = dict(record)
+    entry['ph'] = float(record['ph'])
+    entry['biogas_production'] = float(record['biogas_production'])
+    return entry
+
+def predict_batch(records):
+    inputs = []
+    for index, record in enumerate(records):
+        if not isinstance(record, dict) or 'ph' not in record or 'biogas_production' not in record:
+            return jsonify({"error": f"Missing required parameters in record {index}"}), 400
+        
+        try:
+            inputs.append(prediction_input(record))
+        except ValueError as e:
+            return jsonify({"error": f"Invalid value in record {index}: {e}"}), 400
+    
+    predictions = predict_anomaly_batch(inputs)
+    
+    return jsonify({
+        "results": [
+            {
+                "prediction": prediction,
+                "input": {
+                    "ph": entry['ph'],
+                    "biogas_production": entry['biogas_production']
+                }
+            }
+            for prediction, entry in zip(predictions, inputs)
+        ]
+    })
        
+def predict_columnar(body):
+    # Bulk scoring as .npy in and out, see columnar.py
+    if not prediction_cache:
+        return jsonify({"error": "ML model not loaded"}), 503
+    try:
+        input_data = decode_features(body, prediction_cache.model_package['feature_columns'])
+    except (KeyError, ValueError) as e:
+        return jsonify({"error": f"Invalid columnar request: {e}"}), 400
+    
+    try:
+        with PREDICTION_SECONDS.labels('local').time():
+            anomaly_probabilities, cause_ids, causes = prediction_cache.score_uncached(input_data)
+    except Exception as e:
+        logger.error(f"Prediction error: {e}")
+        return jsonify({"error": str(e)}), 500
+    
+    anomaly_detected = anomaly_probabilities > ANOMALY_THRESHOLD
+    cause_ids, causes = mask_causes(anomaly_detected, cause_ids, causes)
+    
+    logger.info(f"Scored {len(input_data)} columnar readings, anomalies={int(anomaly_detected.sum())}")
+    return Response(
+        encode_results(anomaly_probabilities, anomaly_detected, cause_ids, causes),
+        mimetype=NPY_CONTENT_TYPE
+    )
+
 @app.route('/api/system-status', methods=['GET'])
 def system_status():
-    return jsonify({
-        "status": current_sensor_data['system_status'],
-        "last_updated": current_sensor_data['timestamp'],
-        "anomaly_detected": current_sensor_data['anomaly_detected'],
-        "anomaly_cause": current_sensor_data.get('anomaly_cause', 'Unknown')
-    })
+    with state_lock:
+        return jsonify({
+            "status": current_sensor_data['system_status'],
+            "last_updated": current_sensor_data['timestamp'],
+            "anomaly_detected": current_sensor_data['anomaly_detected'],
+            "anomaly_cause": current_sensor_data.get('anomaly_cause', 'Unknown'),
+            "acquisition": acquisition.stats(),
+            "prediction_cache": prediction_cache.stats() if prediction_cache else None
+        })
 
 @app.route('/api/historical-data', methods=['GET'])
 def get_historical_data():
-    return jsonify(historical_data)
+    try:
+        since = request.args.get('since')
+        until = request.args.get('until')
+        limit = request.args.get('limit', type=int)
+        max_points = request.args.get('max_points', type=int)
+        with state_lock:
+            oldest = historical_data.oldest_timestamp()
+            if readings_store is not None and since and (oldest is None or to_epoch(since) < oldest):
+                # Older than the in-memory window, serve it from disk
+                records = None
+            else:
+                records = historical_data.to_records(since=since, until=until, limit=limit, max_points=max_points)
+        if records is None:
+            records = stored_history(since=since, until=until, limit=limit, max_points=max_points)
+        return jsonify(records)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid query parameter: {e}"}), 400
+
+@app.route('/api/rollups', methods=['GET'])
+def get_rollups():
+    try:
+        resolution = request.args.get('resolution', '1h')
+        since = to_epoch(request.args.get('since'))
+        until = to_epoch(request.args.get('until'))
+        return jsonify(rollups.query(resolution, since=since, until=until))
+    except ValueError as e:
+        return jsonify({"error": f"Invalid query parameter: {e}"}), 400
+
+@app.route('/api/stream', methods=['GET'])
+def stream():
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    
+    # Subscribe before reading the backlog so nothing published in between is lost
+    subscriber = broadcaster.subscribe()
+    replay = []
+    if last_event_id is not None:
+        try:
+            with state_lock:
+                replay = historical_data.records_after(int(last_event_id))
+        except ValueError:
+            logger.warning(f"Ignoring invalid Last-Event-ID: {last_event_id!r}")
+    
+    def generate():
+        try:
+            yield "retry: 3000\n\n"
+            last_sent = -1
+            for seq, record in replay:
+                yield format_event(seq, 'reading', record)
+                last_sent = seq
+            
+            while True:
+                try:
+                    event_id, event_type, message = subscriber.get(timeout=STREAM_HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                if event_type == 'reading' and event_id <= last_sent:
+                    continue
+                yield message
+        finally:
+            broadcaster.unsubscribe(subscriber)
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 @app.route('/api/reset-alarm', methods=['POST'])
 def reset_alarm():
-    current_sensor_data['anomaly_detected'] = False
-    current_sensor_data['system_status'] = 'Normal'
+    with state_lock:
+        previous_status = current_sensor_data['system_status']
+        current_sensor_data['anomaly_detected'] = False
+        current_sensor_data['system_status'] = 'Normal'
+        if previous_status != 'Normal':
+            publish_status_change(historical_data.total - 1, previous_status)
+    return jsonify({"success": True, "message": "Alarm reset successfully"})
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(REGISTRY.render(), content_type=METRICS_CONTENT_TYPE)
+
+def unknown_device(device_id):
+    return jsonify({"error": f"Unknown device: {device_id}"}), 404
+
+@app.route('/api/devices', methods=['GET'])
+def list_devices():
+    return jsonify([
+        dict(digester.status(), connected=digester.connected)
+        for digester in digesters.values()
+    ])
+
+@app.route('/api/devices/<device_id>/sensor-data', methods=['GET'])
+def get_device_sensor_data(device_id):
+    digester = digesters.get(device_id)
+    if digester is None:
+        return unknown_device(device_id)
+    return sensor_data(digester)
+
+@app.route('/api/devices/<device_id>/system-status', methods=['GET'])
+def device_system_status(device_id):
+    digester = digesters.get(device_id)
+    if digester is None:
+        return unknown_device(device_id)
+    return jsonify(dict(digester.status(), prediction_cache=prediction_cache.stats() if prediction_cache else None))
+
+@app.route('/api/devices/<device_id>/historical-data', methods=['GET'])
+def get_device_historical_data(device_id):
+    digester = digesters.get(device_id)
+    if digester is None:
+        return unknown_device(device_id)
+    if digester is default_digester:
+        # Falls back to the readings store for older windows
+        return get_historical_data()
+    try:
+        with digester.lock:
+            records = digester.history.to_records(
+                since=request.args.get('since'),
+                until=request.args.get('until'),
+                limit=request.args.get('limit', type=int),
+                max_points=request.args.get('max_points', type=int)
+            )
+        return jsonify(records)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid query parameter: {e}"}), 400
+
+@app.route('/api/devices/<device_id>/reset-alarm', methods=['POST'])
+def reset_device_alarm(device_id):
+    digester = digesters.get(device_id)
+    if digester is None:
+        return unknown_device(device_id)
+    if digester is default_digester:
+        return reset_alarm()
+    digester.reset_alarm()
     return jsonify({"success": True, "message": "Alarm reset successfully"})
 
 if __name__ == '__main__':
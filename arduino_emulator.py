@@ -0,0 +1,308 @@
+import argparse
+import csv
+import math
+import os
+import random
+import sys
+import threading
+import time
+import tty
+from sensor_protocol import encode_frame
+
+# Stands in for gas_sensor_azure_ml.ino on a Linux pseudo-terminal, so the
+# serial paths of app.py, main.py and serial_daemon.py can be exercised and
+# load-tested without a board:
+#   python arduino_emulator.py --format csv --rate 1000 --malformed 0.01
+#   SERIAL_PORT=/dev/pts/7 python serial_daemon.py
+# Formats: 'csv' is the sketch's text mode (temperature,ph,gas_level with the
+# pH field as the raw A0 value main.py converts), 'binary' its framed mode
+# (sensor_protocol.py) and 'keyvalue' the ph:..,biogas:.. lines app.py reads.
+
+FORMATS = ('csv', 'binary', 'keyvalue')
+BANNER = (b"Starting display initialization...\r\n", b"Display setup complete\r\n")
+
+# Column names accepted when replaying a recorded CSV, first match wins
+REPLAY_COLUMNS = {
+    'temperature': ('temperature', 'temp', 'suhu'),
+    'ph': ('ph',),
+    'biogas': ('biogas', 'biogas_production'),
+    'gas_level': ('gas_level', 'methane', 'gas')
+}
+
+
+def raw_ph(ph):
+    # Inverse of sensor_protocol.ph_from_raw
+    return min(max(2.5 + (ph - 7.0) / 2, 0.0), 5.0)
+
+
+class DigesterModel:
+    # Synthetic digester: temperature and pH drift back towards their set
+    # points as Ornstein-Uhlenbeck processes, with occasional acidification
+    # upsets; biogas output follows both. step(dt) advances by dt seconds.
+
+    def __init__(self, seed=None, temperature=37.0, ph=7.0, upset_rate=1 / 600):
+        self.random = random.Random(seed)
+        self.temperature_setpoint = temperature
+        self.ph_setpoint = ph
+        self.upset_rate = upset_rate
+        self.temperature = temperature
+        self.ph = ph
+        self.upset = 0.0
+
+    def step(self, dt):
+        gauss = self.random.gauss
+        if self.random.random() < self.upset_rate * dt:
+            self.upset = self.random.uniform(0.5, 1.5)
+        self.upset *= math.exp(-dt / 300)
+
+        self.temperature += (self.temperature_setpoint - self.temperature) * min(dt / 600, 1) + gauss(0, 0.05) * math.sqrt(dt)
+        target_ph = self.ph_setpoint - self.upset
+        self.ph += (target_ph - self.ph) * min(dt / 120, 1) + gauss(0, 0.01) * math.sqrt(dt)
+
+        # Methanogens are happiest around 37 °C and neutral pH
+        activity = math.exp(-((self.temperature - 37) / 8) ** 2) * math.exp(-((self.ph - 7.0) / 0.8) ** 2)
+        biogas = max(0.0, 60 * activity + gauss(0, 1.5))
+        gas_level = max(0.0, 120 + 250 * activity + gauss(0, 10))
+        return {
+            'temperature': self.temperature,
+            'ph': self.ph,
+            'biogas': biogas,
+            'gas_level': gas_level
+        }
+
+
+def replay_rows(path, loop=False):
+    with open(path, newline='') as f:
+        rows = list(csv.DictReader(f))
+    if not rows:
+        raise ValueError(f"{path} has no rows to replay")
+
+    columns = {}
+    for field, names in REPLAY_COLUMNS.items():
+        for name in names:
+            if name in rows[0]:
+                columns[field] = name
+                break
+    if 'ph' not in columns:
+        raise ValueError(f"{path} has no ph column")
+
+    while True:
+        for row in rows:
+            reading = {}
+            for field, name in columns.items():
+                try:
+                    reading[field] = float(row[name])
+                except (TypeError, ValueError):
+                    pass
+            yield reading
+        if not loop:
+            return
+
+
+class ArduinoEmulator:
+    # Writes readings to the master side of a pty at `rate` per second.
+    # Readings come from `source` (an iterator of dicts, missing fields are
+    # filled from the synthetic model) or the model alone. The master is
+    # non-blocking: when the reader falls behind, whatever does not fit is
+    # dropped and counted, like a UART overrun.
+
+    def __init__(self, fmt='csv', rate=1.0, source=None, seed=None, malformed=0.0,
+                 burst_every=0.0, burst_size=100, stall_every=0.0, stall_for=5.0, banner=True):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown format {fmt!r}, expected one of {', '.join(FORMATS)}")
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.format = fmt
+        self.rate = rate
+        self.source = source
+        self.model = DigesterModel(seed)
+        self.random = random.Random(seed)
+        self.malformed = malformed
+        self.burst_every = burst_every
+        self.burst_size = burst_size
+        self.stall_every = stall_every
+        self.stall_for = stall_for
+        self.banner = banner
+
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        os.set_blocking(self.master, False)
+        self.port = os.ttyname(self.slave)
+
+        self.seq = 0
+        self.sent = 0
+        self.malformed_sent = 0
+        self.bursts = 0
+        self.stalls = 0
+        self.bytes_written = 0
+        self.overrun_bytes = 0
+        self.finished = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def stats(self):
+        return {
+            "port": self.port,
+            "format": self.format,
+            "rate": self.rate,
+            "sent": self.sent,
+            "malformed": self.malformed_sent,
+            "bursts": self.bursts,
+            "stalls": self.stalls,
+            "bytes": self.bytes_written,
+            "overrun_bytes": self.overrun_bytes
+        }
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f"emulator-{self.port}", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        for fd in (self.master, self.slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def next_reading(self):
+        reading = self.model.step(1 / self.rate)
+        if self.source is not None:
+            recorded = next(self.source, None)
+            if recorded is None:
+                return None
+            reading.update(recorded)
+        return reading
+
+    def encode(self, reading):
+        if self.format == 'binary':
+            frame = encode_frame(self.seq, reading['temperature'], raw_ph(reading['ph']),
+                                 min(reading['biogas'], 6553.5), min(int(reading['gas_level']), 65535))
+            self.seq += 1
+            return frame
+        if self.format == 'keyvalue':
+            return f"ph:{reading['ph']:.2f},biogas:{reading['biogas']:.1f}\r\n".encode()
+        return f"{reading['temperature']:.1f},{raw_ph(reading['ph']):.2f},{int(reading['gas_level'])}\r\n".encode()
+
+    def corrupt(self, data):
+        # One of the ways a real link mangles output
+        kind = self.random.randrange(5)
+        if kind == 0:
+            return data[:self.random.randrange(1, len(data))]
+        if kind == 1:
+            return bytes(self.random.randrange(256) for _ in range(self.random.randrange(1, 32)))
+        if kind == 2 and self.format == 'binary':
+            flipped = bytearray(data)
+            flipped[self.random.randrange(1, len(flipped))] ^= 0xFF
+            return bytes(flipped)
+        if kind == 2:
+            return data.replace(b'.', b'x', 1)
+        if kind == 3 and self.format != 'binary':
+            return data.split(b',')[0] + b'\r\n'
+        return b'\r\n'
+
+    def write(self, data):
+        try:
+            written = os.write(self.master, data)
+        except BlockingIOError:
+            written = 0
+        except OSError:
+            # Nobody has the slave open and the kernel refused, same effect
+            written = 0
+        self.bytes_written += written
+        self.overrun_bytes += len(data) - written
+
+    def produce(self, count):
+        chunks = []
+        for _ in range(count):
+            reading = self.next_reading()
+            if reading is None:
+                self.finished.set()
+                break
+            data = self.encode(reading)
+            if self.malformed and self.random.random() < self.malformed:
+                data = self.corrupt(data)
+                self.malformed_sent += 1
+            chunks.append(data)
+        self.sent += len(chunks)
+        if chunks:
+            self.write(b''.join(chunks))
+
+    def _run(self):
+        if self.banner:
+            for line in BANNER:
+                self.write(line)
+
+        start = time.perf_counter()
+        scheduled = 0
+        next_burst = start + self.burst_every if self.burst_every else math.inf
+        next_stall = start + self.stall_every if self.stall_every else math.inf
+        # Sleep at most this long, so kHz rates go out in small batches
+        tick = min(1 / self.rate, 0.005)
+
+        while not self._stop_event.is_set() and not self.finished.is_set():
+            now = time.perf_counter()
+            if now >= next_stall:
+                self.stalls += 1
+                self._stop_event.wait(self.stall_for)
+                # Carry on at the normal rate, no catch-up flood
+                start = time.perf_counter() - scheduled / self.rate
+                next_stall = start + scheduled / self.rate + self.stall_every
+                continue
+            if now >= next_burst:
+                self.bursts += 1
+                self.produce(self.burst_size)
+                next_burst = now + self.burst_every
+
+            due = int((now - start) * self.rate) + 1
+            if due > scheduled:
+                self.produce(due - scheduled)
+                scheduled = due
+            self._stop_event.wait(min(tick, max(start + scheduled / self.rate - time.perf_counter(), 0)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Emulate the biogas Arduino on a pseudo-terminal")
+    parser.add_argument('--format', choices=FORMATS, default='csv')
+    parser.add_argument('--rate', type=float, default=1.0, help="readings per second (default %(default)s)")
+    parser.add_argument('--replay', help="recorded CSV to replay instead of the synthetic model")
+    parser.add_argument('--loop', action='store_true', help="replay the CSV forever")
+    parser.add_argument('--malformed', type=float, default=0.0, help="fraction of readings to corrupt")
+    parser.add_argument('--burst-every', type=float, default=0.0, help="seconds between bursts, 0 for none")
+    parser.add_argument('--burst-size', type=int, default=100, help="extra readings per burst")
+    parser.add_argument('--stall-every', type=float, default=0.0, help="seconds between stalls, 0 for none")
+    parser.add_argument('--stall-for', type=float, default=5.0, help="length of each stall in seconds")
+    parser.add_argument('--link', help="also expose the pty under this path, e.g. /tmp/ttyARDUINO")
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--no-banner', action='store_true', help="skip the sketch's startup messages")
+    parser.add_argument('--stats-interval', type=float, default=10.0)
+    args = parser.parse_args(argv)
+
+    source = replay_rows(args.replay, args.loop) if args.replay else None
+    emulator = ArduinoEmulator(args.format, args.rate, source, args.seed, args.malformed,
+                               args.burst_every, args.burst_size, args.stall_every, args.stall_for,
+                               banner=not args.no_banner)
+    if args.link:
+        if os.path.islink(args.link):
+            os.unlink(args.link)
+        os.symlink(emulator.port, args.link)
+
+    print(f"🔌 Emulating Arduino ({args.format}, {args.rate:g}/s) on {emulator.port}" + (f" -> {args.link}" if args.link else ""))
+    emulator.start()
+    try:
+        while not emulator.finished.wait(args.stats_interval):
+            print(f"📊 {emulator.stats()}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        emulator.stop()
+        if args.link and os.path.islink(args.link):
+            os.unlink(args.link)
+        print(f"📊 {emulator.stats()}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
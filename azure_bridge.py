@@ -1,30 +1,136 @@
-import serial
-import time
-from azure.iot.device import IoTHubDeviceClient, Message
+import asyncio
+import socket
+from azure.iot.device import Message
+from azure.iot.device.aio import IoTHubDeviceClient
+from sensor_feed import FEED_ADDRESS, FEED_TIMEOUT, parse_address
 # az iot hub monitor-events --hub-name 318Hub --device-id bioserde
 
 CONNECTION_STRING = "HostName=318Hub.azure-devices.net;DeviceId=bioserde;SharedAccessKey=ml0XIrouzxoP/zmDGex1lHNjcCj76+cD/aRwKc+r9no="
-client = IoTHubDeviceClient.create_from_connection_string(CONNECTION_STRING)
-ser = serial.Serial('COM3', 9600)
 
-print("Connecting to Azure IoT Hub...")
-client.connect()
-print("Connected to Azure IoT Hub")
+# IoT Hub rejects device-to-cloud messages over 256 KB; keep headroom for
+# the message properties
+MAX_MESSAGE_BYTES = 255 * 1024
+# A batch is sent once it is full or its oldest reading is this old
+MAX_BATCH_AGE = 1.0
+# Readings waiting for the sender; when full, new readings are dropped
+QUEUE_SIZE = 10000
+SEND_TIMEOUT = 30
+SEND_RETRIES = 3
+STATS_INTERVAL = 10
+
+stats = {
+    "readings_read": 0,
+    "readings_sent": 0,
+    "messages_sent": 0,
+    "dropped_queue_full": 0,
+    "dropped_send_failed": 0,
+    "send_failures": 0
+}
+
+def enqueue(readings, reading):
+    try:
+        readings.put_nowait(reading)
+    except asyncio.QueueFull:
+        stats["dropped_queue_full"] += 1
+
+async def read_feed(readings):
+    # Subscribes to serial_daemon.py, which owns the port; the daemon's
+    # readings are already JSON and are forwarded as-is
+    family, address = parse_address(FEED_ADDRESS)
+    backoff = 1
+    while True:
+        try:
+            if family == socket.AF_INET:
+                reader, writer = await asyncio.open_connection(*address)
+            else:
+                reader, writer = await asyncio.open_unix_connection(address)
+        except OSError as e:
+            print(f"Could not connect to sensor feed {FEED_ADDRESS}: {e}, retrying in {backoff}s")
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+            continue
+
+        backoff = 1
+        try:
+            while True:
+                line = await asyncio.wait_for(reader.readline(), FEED_TIMEOUT)
+                if not line:
+                    break
+                if line.startswith(b'data: '):
+                    stats["readings_read"] += 1
+                    enqueue(readings, line[6:].decode('utf-8').strip())
+        except (OSError, asyncio.TimeoutError) as e:
+            print(f"Lost sensor feed {FEED_ADDRESS}: {e!r}")
+        finally:
+            writer.close()
+
+async def send_batch(client, batch):
+    payload = "[" + ",".join(batch) + "]"
+    msg = Message(payload, content_encoding="utf-8", content_type="application/json")
+    msg.custom_properties["batchSize"] = str(len(batch))
+
+    for attempt in range(1, SEND_RETRIES + 1):
+        try:
+            await asyncio.wait_for(client.send_message(msg), SEND_TIMEOUT)
+            stats["messages_sent"] += 1
+            stats["readings_sent"] += len(batch)
+            return
+        except Exception as e:
+            stats["send_failures"] += 1
+            print(f"Send attempt {attempt} of {len(batch)} readings failed: {e}")
+            await asyncio.sleep(min(2 ** attempt, 10))
+
+    stats["dropped_send_failed"] += len(batch)
+
+async def send_batches(client, readings):
+    loop = asyncio.get_running_loop()
+    batch = []
+    batch_bytes = 2
+    deadline = None
 
-try:
     while True:
-        print("Bytes waiting:", ser.in_waiting)
-        if ser.in_waiting > 0:
-            line = ser.readline().decode('utf-8').strip()
-            print(f"Read from Arduino: {line}")
-            msg = Message(line)
-            client.send_message(msg)
-            print("Message sent to IoT Hub")
-            time.sleep(0.5)
-        else:
-            time.sleep(0.1)
-
-finally:
-    print("Disconnecting...")
-    client.disconnect()
-    ser.close()
+        timeout = None if deadline is None else max(0.0, deadline - loop.time())
+        try:
+            reading = await asyncio.wait_for(readings.get(), timeout)
+        except asyncio.TimeoutError:
+            reading = None
+
+        if reading is not None:
+            reading_bytes = len(reading.encode('utf-8')) + 1
+            if batch and batch_bytes + reading_bytes > MAX_MESSAGE_BYTES:
+                await send_batch(client, batch)
+                batch, batch_bytes, deadline = [], 2, None
+            batch.append(reading)
+            batch_bytes += reading_bytes
+            if deadline is None:
+                deadline = loop.time() + MAX_BATCH_AGE
+
+        if batch and (reading is None or batch_bytes >= MAX_MESSAGE_BYTES):
+            await send_batch(client, batch)
+            batch, batch_bytes, deadline = [], 2, None
+
+async def report_stats(readings):
+    while True:
+        await asyncio.sleep(STATS_INTERVAL)
+        print(f"Uplink: {stats}, queued={readings.qsize()}")
+
+async def main():
+    client = IoTHubDeviceClient.create_from_connection_string(CONNECTION_STRING)
+
+    print("Connecting to Azure IoT Hub...")
+    await client.connect()
+    print("Connected to Azure IoT Hub")
+
+    readings = asyncio.Queue(maxsize=QUEUE_SIZE)
+
+    try:
+        await asyncio.gather(read_feed(readings), send_batches(client, readings), report_stats(readings))
+    finally:
+        print("Disconnecting...")
+        await client.shutdown()
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("Program terminated by user")
@@ -2,21 +2,71 @@ import os
 import json
 import time
 import logging
+import queue
 import random
+import socket
+import threading
 import requests
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from datetime import datetime
-from azure.iot.device import IoTHubDeviceClient, Message
+from azure.iot.device import Message
+from anomaly_scoring import check_record
+from requests.adapters import HTTPAdapter
+import metrics
+from file_watch import FileWatcher, atomic_write
+from iot_sender import IoTHubSender
+from metrics import (
+    AZURE_ML_FALLBACKS, PREDICTION_DISAGREEMENTS, PREDICTION_SECONDS, QUEUE_DEPTH,
+    SIMULATION_FALLBACKS
+)
+from sensor_feed import FEED_ADDRESS, FeedAcquisition, FeedServer
 
 # Configuration
 DATA_FILE = "arduino_data.json"
 RESULT_FILE = "ml_results.txt" 
-POLL_INTERVAL = 5
-ML_INTERVAL = 60
+# Where readings come from: "file" waits for DATA_FILE to be rewritten,
+# "feed" subscribes to serial_daemon.py on SENSOR_FEED
+READINGS_FROM = os.getenv("READINGS_FROM", "file")
+# Seconds between predictions; 0 scores each reading as soon as it arrives
+ML_INTERVAL = float(os.getenv("ML_INTERVAL", "60"))
+# Every result is also published here as a sequence-numbered "result"
+# event, in the sensor feed's framing (see sensor_feed.py); empty for none
+if hasattr(socket, 'AF_UNIX'):
+    DEFAULT_RESULT_FEED = "unix:/tmp/bioserde-results.sock"
+else:
+    DEFAULT_RESULT_FEED = "tcp:127.0.0.1:8767"
+RESULT_FEED = os.getenv("RESULT_FEED", DEFAULT_RESULT_FEED)
+# Port for the Prometheus-style metrics of this process, empty for none
+METRICS_PORT = os.getenv("METRICS_PORT", "")
 
 # Azure configuration
 CONNECTION_STRING = "HostName=318Hub.azure-devices.net;DeviceId=bioserde;SharedAccessKey=ml0XIrouzxoP/zmDGex1lHNjcCj76+cD/aRwKc+r9no="
 AZURE_ML_ENDPOINT = "https://biogas-model-endpoint.southeastasia.inference.ml.azure.com/score"
 
+# Hedged inference: the local model always answers, Azure ML gets this many
+# seconds to answer too before the local result is used
+MODEL_PATH = "biogas_anomaly_model.pkl"
+REMOTE_DEADLINE = float(os.getenv("REMOTE_DEADLINE", "2"))
+# Consecutive Azure ML failures that open the circuit, and seconds before a
+# single probe request is let through again
+BREAKER_FAILURES = 3
+BREAKER_RESET = 60
+# Azure ML calls run on REMOTE_WORKERS threads sharing a keep-alive
+# connection pool; with all of them busy a prediction is answered locally
+# without calling Azure ML. Connection errors and 429/5xx answers are
+# retried up to MAX_RETRIES times, with exponential backoff plus up to
+# RETRY_JITTER seconds of random jitter, as long as REMOTE_DEADLINE allows.
+REMOTE_WORKERS = 2
+MAX_RETRIES = 2
+RETRY_BACKOFF = 0.1
+RETRY_JITTER = 0.2
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Score every reading gathered during ML_INTERVAL in one request rather than
+# only the latest one ("0" to turn off); at most MAX_BATCH are kept
+ML_BATCH = os.getenv("ML_BATCH", "1") != "0"
+MAX_BATCH = 1000
+
 def read_api_key():
     try:
         with open("api_key.txt", "r") as f:
@@ -35,14 +85,12 @@ logging.basicConfig(
 )
 
 def setup_iot_hub():
-    try:
-        client = IoTHubDeviceClient.create_from_connection_string(CONNECTION_STRING)
-        client.connect()
-        print("✓ Connected to Azure IoT Hub")
-        return client
-    except Exception as e:
-        print(f"! Failed to connect to IoT Hub: {str(e)}")
-        return None
+    # Connects and sends on its own thread, so a slow or unreachable hub
+    # never holds up readings or predictions
+    sender = IoTHubSender(CONNECTION_STRING)
+    sender.start()
+    QUEUE_DEPTH.labels("iot_hub").set_function(lambda: sender.health()["queue_depth"])
+    return sender
 
 def read_sensor_data():
     # Try to read from file
@@ -56,155 +104,465 @@ def read_sensor_data():
         print(f"! Error reading file: {str(e)}")
     
     print("Generating simulated sensor data")
+    SIMULATION_FALLBACKS.labels("azure_ml_iot").inc()
     return {
         "ph": round(random.uniform(6.5, 8.0), 1),
         "biogas_production": round(random.uniform(50.0, 80.0), 1),
         "gas_level": random.randint(150, 300)
     }
 
+def queue_reading(readings, reading):
+    # A reading the model would reject is dropped here rather than failing
+    # the whole batch it would have been scored with
+    try:
+        check_record(reading)
+    except ValueError as e:
+        print(f"! Skipping reading {reading.get('seq')}: {str(e)}")
+        return
+    readings.put(reading)
+
+def watch_sensor_file(readings, stop_event):
+    # Queues the reading in DATA_FILE each time it is rewritten, numbered in
+    # arrival order unless the writer numbers them itself. A writer faster
+    # than this loop only has its latest reading seen; use the feed for
+    # every reading.
+    watcher = FileWatcher(DATA_FILE)
+    print(f"✓ Watching {DATA_FILE} ({watcher.mode})")
+    seq = 0
+    changed = os.path.exists(DATA_FILE)
+    try:
+        while not stop_event.is_set():
+            if changed:
+                try:
+                    with open(DATA_FILE, 'r') as file:
+                        data = json.loads(file.read())
+                except Exception as e:
+                    print(f"! Error reading file: {str(e)}")
+                else:
+                    seq += 1
+                    data.setdefault("seq", seq)
+                    data.setdefault("timestamp", datetime.now().isoformat())
+                    queue_reading(readings, data)
+            changed = watcher.wait(1.0)
+    finally:
+        watcher.close()
+
+def start_reading_source(readings):
+    # Returns a function that stops it
+    if READINGS_FROM == "feed":
+        def handle_reading(reading):
+            # The daemon calls the value biogas and leaves it out of CSV-mode
+            # readings, which the model cannot score
+            if reading.get("biogas") is None:
+                return None
+            reading = dict(reading)
+            reading["biogas_production"] = reading.pop("biogas")
+            # The daemon stamps readings with epoch seconds
+            if isinstance(reading.get("timestamp"), (int, float)):
+                reading["timestamp"] = datetime.fromtimestamp(reading["timestamp"]).isoformat()
+            queue_reading(readings, reading)
+            return None
+        feed = FeedAcquisition(handle_reading, FEED_ADDRESS)
+        feed.start()
+        print(f"✓ Subscribed to sensor feed on {FEED_ADDRESS}")
+        return feed.stop
+    
+    stop_event = threading.Event()
+    threading.Thread(target=watch_sensor_file, args=(readings, stop_event), name="sensor-file", daemon=True).start()
+    return stop_event.set
+
+def headline_prediction(prediction):
+    # The row reported for a batch: its most likely anomaly, otherwise the
+    # latest reading
+    predictions = prediction.get("predictions") or [{}]
+    anomalies = [p for p in predictions if p.get("anomaly_detected")]
+    if anomalies:
+        return max(anomalies, key=lambda p: p.get("anomaly_probability", 0))
+    return predictions[-1]
+
 def write_prediction_result(prediction):
     try:
-        prediction_data = prediction.get("predictions", [{}])[0]
+        prediction_data = headline_prediction(prediction)
         anomaly_detected = prediction_data.get("anomaly_detected", False)
         cause = prediction_data.get("anomaly_cause", "Normal")
         
         result_str = f"RESULT:{1 if anomaly_detected else 0},{cause}"
-        with open(RESULT_FILE, "w") as f:
-            f.write(result_str)
+        atomic_write(RESULT_FILE, result_str)
         
         print(f"→ Writing to result file: {result_str}")
+        return result_str
     except Exception as e:
         print(f"! Error writing prediction result: {str(e)}")
+        return None
 
-def send_to_azure_ml(sensor_data):
-    try:
-        # Prepare data for the model
-        input_data = {
-            "data": [
-                {
-                    "ph": sensor_data["ph"],
-                    "biogas_production": sensor_data["biogas_production"],
-                    "gas_level": sensor_data.get("gas_level", 200)
-                }
-            ]
-        }
+def publish_prediction_result(result_feed, seq, prediction, readings, result_str):
+    headline = headline_prediction(prediction)
+    result_feed.publish(seq, "result", {
+        "seq": seq,
+        # The readings this result covers
+        "reading_seqs": [reading.get("seq") for reading in readings],
+        "anomaly_detected": bool(headline.get("anomaly_detected", False)),
+        "anomaly_probability": headline.get("anomaly_probability", 0),
+        "anomaly_cause": headline.get("anomaly_cause"),
+        "source": prediction.get("source"),
+        "result": result_str,
+        "timestamp": datetime.now().isoformat()
+    })
+
+class CircuitBreaker:
+    # closed: every call goes through. open: none do, until reset_timeout
+    # has passed. half_open: exactly one probe goes through; its outcome
+    # closes or re-opens the circuit.
+    
+    def __init__(self, failure_threshold=BREAKER_FAILURES, reset_timeout=BREAKER_RESET, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = None
+        self.probe_in_flight = False
+    
+    def allow(self):
+        with self.lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and self.clock() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+            if self.state == "half_open" and not self.probe_in_flight:
+                self.probe_in_flight = True
+                return True
+            return False
+    
+    def record_success(self):
+        with self.lock:
+            self.state = "closed"
+            self.failures = 0
+            self.probe_in_flight = False
+    
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.probe_in_flight = False
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    print(f"! Azure ML circuit opened after {self.failures} failure(s), probing again in {self.reset_timeout}s")
+                self.state = "open"
+                self.opened_at = self.clock()
+
+def create_session(pool_size=REMOTE_WORKERS):
+    # Retries are post_with_retries' job, which knows the deadline
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {API_KEY}",
+        "Accept": "application/json"
+    })
+    return session
+
+breaker = CircuitBreaker()
+remote_pool = ThreadPoolExecutor(max_workers=REMOTE_WORKERS, thread_name_prefix="azure-ml")
+# Taken per submitted call, so calls never queue up behind busy workers
+remote_slots = threading.BoundedSemaphore(REMOTE_WORKERS)
+session = create_session()
+local_cache = None
+
+def init_local_model():
+    global local_cache
+    if local_cache is None:
+        try:
+            from anomaly_scoring import find_model, load_model
+            from prediction_cache import PredictionCache
+            local_cache = PredictionCache(find_model(MODEL_PATH), load_model)
+            print(f"✓ Local model loaded from {local_cache.model_path}")
+        except Exception as e:
+            print(f"! Could not load local model: {str(e)}")
+    return local_cache
+
+def predict_locally(readings):
+    cache = init_local_model()
+    if cache is None:
+        return simulate_ml_prediction(readings), "simulated"
+    
+    import score
+    with PREDICTION_SECONDS.labels("local").time():
+        predictions = score.score_records(readings, cache)
+    return {"predictions": predictions}, "local"
+
+def model_input(sensor_data):
+    record = {
+        "ph": sensor_data["ph"],
+        "biogas_production": sensor_data["biogas_production"],
+        "gas_level": sensor_data.get("gas_level", 200)
+    }
+    # Lets the model use the reading's own hour and day, not the batch's
+    if sensor_data.get("timestamp"):
+        record["timestamp"] = sensor_data["timestamp"]
+    return record
+
+def post_with_retries(input_data, deadline, cancelled, clock=time.monotonic):
+    # Every attempt gets only what is left of the deadline, and no retry
+    # starts that could not finish in time or after the caller gave up.
+    # Scoring has no side effects, so POSTs are safe to repeat.
+    attempt = 0
+    while True:
+        remaining = deadline - clock()
+        if remaining <= 0 or cancelled.is_set():
+            raise TimeoutError(f"No Azure ML answer within {REMOTE_DEADLINE}s")
+        try:
+            response = session.post(url=AZURE_ML_ENDPOINT, json=input_data, timeout=remaining)
+        except (requests.ConnectionError, requests.Timeout):
+            response = None
+            if attempt >= MAX_RETRIES:
+                raise
+        else:
+            if response.status_code not in RETRY_STATUSES or attempt >= MAX_RETRIES:
+                return response
         
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {API_KEY}",
-            "Accept": "application/json"
-        }
+        delay = RETRY_BACKOFF * 2 ** attempt + random.uniform(0, RETRY_JITTER)
+        if clock() + delay >= deadline:
+            if response is not None:
+                return response
+            raise TimeoutError(f"No Azure ML answer within {REMOTE_DEADLINE}s")
+        cancelled.wait(delay)
+        attempt += 1
+
+def call_azure_ml(readings, deadline=None, cancelled=None):
+    # Raises on any failure; the breaker hears about every outcome, including
+    # answers that arrive after the hedge stopped waiting
+    if deadline is None:
+        deadline = time.monotonic() + REMOTE_DEADLINE
+    if cancelled is None:
+        cancelled = threading.Event()
+    try:
+        # Prepare data for the model, one row per reading
+        input_data = {"data": [model_input(sensor_data) for sensor_data in readings]}
         
         # Send request
-        response = requests.post(
-            url=AZURE_ML_ENDPOINT,
-            json=input_data,
-            headers=headers,
-            timeout=10
-        )
+        with PREDICTION_SECONDS.labels("azure_ml").time():
+            response = post_with_retries(input_data, deadline, cancelled)
         
         # Check response
-        if response.status_code == 200:
-            result = response.json()
-            print("✓ Azure ML prediction received")
-            return result
+        if response.status_code != 200:
+            raise RuntimeError(f"Failed with status {response.status_code}: {response.text[:100]}")
+        result = response.json()
+        # score.run returns JSON text, which the endpoint serializes again
+        if isinstance(result, str):
+            result = json.loads(result)
+        if "error" in result:
+            raise RuntimeError(f"Azure ML error: {result['error']}")
+        if len(result.get("predictions", [])) != len(readings):
+            raise RuntimeError(f"Azure ML returned {len(result.get('predictions', []))} predictions for {len(readings)} readings")
+    except Exception:
+        breaker.record_failure()
+        raise
+    breaker.record_success()
+    return result
+
+def compare_predictions(local, remote):
+    # Which fields the two models disagree on, over every reading scored
+    disagreements = []
+    for index, (local_row, remote_row) in enumerate(zip(local.get("predictions", []), remote.get("predictions", []))):
+        if bool(local_row.get("anomaly_detected")) != bool(remote_row.get("anomaly_detected")):
+            field = "anomaly_detected"
+        elif local_row.get("anomaly_detected") and local_row.get("anomaly_cause") != remote_row.get("anomaly_cause"):
+            field = "anomaly_cause"
         else:
-            print(f"! Failed with status {response.status_code}: {response.text[:100]}")
-            
+            continue
+        PREDICTION_DISAGREEMENTS.labels(field).inc()
+        logging.warning(f"Local and Azure ML predictions disagree on {field} for reading {index}: local={local_row} remote={remote_row}")
+        if field not in disagreements:
+            disagreements.append(field)
+    return disagreements
+
+def record_late_answer(local, future):
+    # Remote answered after the local result was already used
+    try:
+        remote = future.result()
     except Exception as e:
-        print(f"! ML API Error: {str(e)}")
-    
-    # Fall back to simulation
-    return simulate_ml_prediction(sensor_data)
+        print(f"! ML API Error (after deadline): {str(e)}")
+        return
+    disagreements = compare_predictions(local, remote)
+    print(f"← Late Azure ML answer, {'disagrees on ' + ', '.join(disagreements) if disagreements else 'agrees with local model'}")
 
-def simulate_ml_prediction(sensor_data):
-    print("Generating local ML prediction simulation")
+def send_to_azure_ml(readings):
+    # Hedged: the local model answers first, Azure ML runs alongside with
+    # REMOTE_DEADLINE to beat it. The result says which path answered and
+    # has one prediction per reading.
+    if isinstance(readings, dict):
+        readings = [readings]
+    local, local_source = predict_locally(readings)
     
-    # Simple anomaly detection
-    ph = sensor_data.get('ph', 7.0)
-    biogas = sensor_data.get('biogas_production', 60.0)
+    if not remote_slots.acquire(blocking=False):
+        AZURE_ML_FALLBACKS.labels("busy").inc()
+        return dict(local, source=local_source, remote="busy", disagreements=None)
+    if not breaker.allow():
+        remote_slots.release()
+        AZURE_ML_FALLBACKS.labels("circuit_open").inc()
+        return dict(local, source=local_source, remote="circuit_open", disagreements=None)
     
-    # Generate anomaly probability
-    anomaly_prob = max(0, min(1, abs(ph - 7.0) / 1.5 + abs(biogas - 60) / 30))
-    anomaly_detected = anomaly_prob > 0.5
+    deadline = time.monotonic() + REMOTE_DEADLINE
+    cancelled = threading.Event()
+    future = remote_pool.submit(call_azure_ml, readings, deadline, cancelled)
+    future.add_done_callback(lambda done: remote_slots.release())
+    try:
+        remote = future.result(timeout=max(deadline - time.monotonic(), 0))
+    except FutureTimeoutError:
+        AZURE_ML_FALLBACKS.labels("deadline").inc()
+        # The local answer won: no further retries, and whatever is still in
+        # flight is only compared against it
+        cancelled.set()
+        future.cancel()
+        future.add_done_callback(lambda done: None if done.cancelled() else record_late_answer(local, done))
+        print(f"! Azure ML slower than {REMOTE_DEADLINE}s, using {local_source} prediction")
+        return dict(local, source=local_source, remote="late", disagreements=None)
+    except Exception as e:
+        AZURE_ML_FALLBACKS.labels("error").inc()
+        print(f"! ML API Error: {str(e)}")
+        return dict(local, source=local_source, remote="failed", disagreements=None)
     
-    # Determine cause
-    if anomaly_detected:
-        cause = "pH Level" if abs(ph - 7.0) > abs(biogas - 60) / 30 else "Biogas"
-    else:
-        cause = None
+    print("✓ Azure ML prediction received")
+    disagreements = compare_predictions(local, remote) if local_source == "local" else None
+    return dict(remote, source="azure_ml", remote="ok", disagreements=disagreements)
+
+def simulate_ml_prediction(readings):
+    # Last resort when the model file cannot be loaded
+    print("Generating local ML prediction simulation")
     
-    # Create response
-    return {
-        "predictions": [{
+    predictions = []
+    for sensor_data in readings:
+        # Simple anomaly detection
+        ph = sensor_data.get('ph', 7.0)
+        biogas = sensor_data.get('biogas_production', 60.0)
+        
+        # Generate anomaly probability
+        anomaly_prob = max(0, min(1, abs(ph - 7.0) / 1.5 + abs(biogas - 60) / 30))
+        anomaly_detected = anomaly_prob > 0.5
+        
+        # Determine cause
+        if anomaly_detected:
+            cause = "pH Level" if abs(ph - 7.0) > abs(biogas - 60) / 30 else "Biogas"
+        else:
+            cause = None
+        
+        predictions.append({
             "anomaly_detected": anomaly_detected,
             "anomaly_probability": anomaly_prob,
             "anomaly_cause": cause
-        }]
-    }
+        })
+    
+    # Create response
+    return {"predictions": predictions}
 
 def main():
+    if METRICS_PORT:
+        metrics.serve(int(METRICS_PORT))
+        print(f"✓ Metrics on http://localhost:{METRICS_PORT}/metrics")
+    
     print("Connecting to Azure IoT Hub and ML services...")
+    init_local_model()
+    
+    # Set up IoT Hub sender
+    iot_sender = setup_iot_hub()
     
-    # Set up IoT Hub client
-    iot_client = setup_iot_hub()
+    result_feed = None
+    if RESULT_FEED:
+        try:
+            result_feed = FeedServer(RESULT_FEED, name="result feed")
+            result_feed.start()
+            print(f"✓ Publishing results on {RESULT_FEED}")
+        except Exception as e:
+            result_feed = None
+            print(f"! Could not publish results on {RESULT_FEED}: {str(e)}")
+    
+    # Readings arrive here as soon as they are written; those gathered
+    # since the last prediction wait in pending (only the latest one when
+    # not batching)
+    readings_queue = queue.Queue()
+    pending = deque(maxlen=MAX_BATCH if ML_BATCH else 1)
+    QUEUE_DEPTH.labels("azure_ml_pending").set_function(lambda: len(pending) + readings_queue.qsize())
+    stop_readings = start_reading_source(readings_queue)
     
     print("Monitoring biogas system...")
     
     last_ml_time = 0
+    latest_reading = None
+    result_seq = 0
     
     try:
         while True:
+            # Sleep until the next prediction is due or, with ML_INTERVAL 0,
+            # until a reading arrives
+            if ML_INTERVAL > 0:
+                timeout = max(last_ml_time + ML_INTERVAL - time.time(), 0)
+            else:
+                timeout = None
+            try:
+                pending.append(readings_queue.get(timeout=timeout))
+                while True:
+                    pending.append(readings_queue.get_nowait())
+            except queue.Empty:
+                pass
+            
             current_time = time.time()
             
             # Process ML prediction on interval
             if current_time - last_ml_time >= ML_INTERVAL:
                 
-                # Get sensor data
-                sensor_data = read_sensor_data()
+                # Get sensor data; without new readings, the latest one again
+                readings = list(pending)
+                pending.clear()
+                if readings:
+                    latest_reading = readings[-1]
+                else:
+                    readings = [latest_reading or read_sensor_data()]
+                sensor_data = readings[-1]
                 
-                # Send to IoT Hub
-                if iot_client:
-                    try:
-                        message_json = json.dumps(sensor_data)
-                        msg = Message(message_json)
-                        iot_client.send_message(msg)
-                        print("✓ Data sent to IoT Hub")
-                    except Exception as e:
-                        print(f"! IoT Hub error: {str(e)}")
+                # Queue for IoT Hub
+                iot_sender.send(Message(json.dumps(sensor_data)))
                 
                 # Get ML prediction
-                prediction = send_to_azure_ml(sensor_data)
+                prediction = send_to_azure_ml(readings)
                 
                 # Display results
-                anomaly_prob = prediction.get("predictions", [{}])[0].get("anomaly_probability", 0)
-                anomaly_detected = prediction.get("predictions", [{}])[0].get("anomaly_detected", False)
+                headline = headline_prediction(prediction)
+                anomaly_prob = headline.get("anomaly_probability", 0)
+                anomaly_detected = headline.get("anomaly_detected", False)
+                anomaly_count = sum(1 for p in prediction.get("predictions", []) if p.get("anomaly_detected"))
                 
                 print("\n----- Biogas System Status -----")
                 print(f"Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
                 print(f"pH Level: {sensor_data.get('ph', 'N/A')}")
                 print(f"Biogas Production: {sensor_data.get('biogas_production', 'N/A')}")
+                print(f"Readings Scored: {len(readings)} ({anomaly_count} anomalous)")
                 print(f"Anomaly Probability: {anomaly_prob:.2f}")
+                print(f"Answered by: {prediction.get('source')} (Azure ML: {prediction.get('remote')})")
+                if prediction.get("disagreements"):
+                    print(f"⚠️ Local model disagrees on: {', '.join(prediction['disagreements'])}")
                 print(f"Status: {'⚠️ ANOMALY DETECTED!' if anomaly_detected else '✓ Normal'}")
                 
                 # Write results to file for Arduino
-                write_prediction_result(prediction)
+                result_str = write_prediction_result(prediction)
+                if result_feed is not None:
+                    result_seq += 1
+                    publish_prediction_result(result_feed, result_seq, prediction, readings, result_str)
                 
                 last_ml_time = current_time
                 
-            time.sleep(POLL_INTERVAL)
-                
     except KeyboardInterrupt:
         print("Program terminated by user")
     except Exception as e:
         print(f"! Error: {str(e)}")
         logging.error(f"Error: {str(e)}")
     finally:
-        if iot_client:
-            try:
-                iot_client.disconnect()
-            except:
-                pass
+        stop_readings()
+        if result_feed is not None:
+            result_feed.stop()
+        iot_sender.stop()
         print("Connections closed")
 
 if __name__ == "__main__":
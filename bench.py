@@ -0,0 +1,424 @@
+import argparse
+import contextlib
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+import numpy as np
+
+# Micro-benchmarks for the scoring, parsing and status hot paths. Runs
+# offline against the bundled model; results are written as JSON and can be
+# checked against an earlier run:
+#   python bench.py --save baseline.json
+#   python bench.py --baseline baseline.json --threshold 0.25
+# The exit status is 1 when any benchmark got slower than the threshold.
+
+# app.py and score.py find the model relative to the working directory, so
+# main() runs from here whatever directory bench.py is started from
+ROOT = os.path.dirname(os.path.abspath(__file__))
+MODEL_PATH = os.path.join(ROOT, 'biogas_anomaly_model.pkl')
+ROUNDS = 7
+# Each round runs for at least this long, see timeit.Timer.autorange
+MIN_ROUND_TIME = 0.2
+DEFAULT_THRESHOLD = 0.2
+# Distinct readings cycled through by the scoring benchmarks. Larger than the
+# prediction cache, so they time the model and not cache hits.
+READING_POOL_SIZE = 20000
+
+BENCHMARKS = {}
+
+
+def benchmark(name, items=1):
+    # items is how many readings one call handles, for the per-reading rate
+    def register(setup):
+        BENCHMARKS[name] = (setup, items)
+        return setup
+    return register
+
+
+def reading_pool(size=READING_POOL_SIZE, seed=0):
+    # Random readings on the Arduino's resolution, ph in 0.01 and biogas in 0.1
+    rng = np.random.default_rng(seed)
+    ph = np.round(rng.uniform(4.0, 10.0, size), 2)
+    biogas = np.round(rng.uniform(0.0, 100.0, size), 1)
+    return [{'ph': float(p), 'biogas_production': float(b)} for p, b in zip(ph, biogas)]
+
+
+def cycle(values):
+    state = {'index': 0}
+
+    def next_value():
+        value = values[state['index']]
+        state['index'] = (state['index'] + 1) % len(values)
+        return value
+    return next_value
+
+
+_app = None
+_store_dir = None
+
+
+def load_app():
+    # app.py opens its readings store and starts acquisition on the first
+    # request; keep both away from real data and hardware
+    global _app, _store_dir
+    if _app is None:
+        _store_dir = tempfile.TemporaryDirectory(prefix='bench-store-')
+        os.environ['READINGS_STORE_DIR'] = _store_dir.name
+        os.environ['SENSOR_FEED'] = 'unix:' + os.path.join(tempfile.gettempdir(), 'bench-no-daemon.sock')
+        os.environ['DIGESTERS'] = ''
+        import app
+        if app.prediction_cache is None:
+            # Timing the "ML model not loaded" path is worse than no result
+            raise RuntimeError(f"app.py could not load its model from {os.getcwd()}")
+        logging.getLogger('acquisition').setLevel(logging.CRITICAL)
+        logging.getLogger('sensor_feed').setLevel(logging.CRITICAL)
+        _app = app
+    return _app
+
+
+@benchmark('app.predict_anomaly')
+def bench_predict_anomaly():
+    app = load_app()
+    readings = cycle(reading_pool())
+
+    def run():
+        reading = readings()
+        app.predict_anomaly(reading['ph'], reading['biogas_production'])
+    return run
+
+
+@benchmark('app.predict_anomaly_batch[100]', items=100)
+def bench_predict_anomaly_batch():
+    app = load_app()
+    pool = reading_pool()
+    batches = cycle([pool[start:start + 100] for start in range(0, len(pool), 100)])
+    return lambda: app.predict_anomaly_batch(batches())
+
+
+def load_score():
+    import score
+    if 'prediction_cache' not in vars(score):
+        os.environ.setdefault('AZUREML_MODEL_DIR', os.path.dirname(os.path.abspath(MODEL_PATH)))
+        score.init()
+    return score
+
+
+def scoring_pool():
+    # score.run wants every feature column, time features included
+    return [dict(reading, hour=12, day=15, month=6, day_of_week=2) for reading in reading_pool()]
+
+
+def bench_score(payloads):
+    score = load_score()
+    payloads = cycle(payloads)
+
+    def run():
+        result = score.run(payloads())
+        if result.startswith('{"error"'):
+            raise RuntimeError(f"score.run failed: {result}")
+    return run
+
+
+@benchmark('score.run')
+def bench_score_run():
+    return bench_score([json.dumps(reading) for reading in scoring_pool()])
+
+
+@benchmark('score.run[100]', items=100)
+def bench_score_run_batch():
+    pool = scoring_pool()
+    return bench_score([json.dumps({'data': pool[start:start + 100]}) for start in range(0, len(pool), 100)])
+
+
+@benchmark('score.run[10000]', items=10000)
+def bench_score_run_bulk_json():
+    return bench_score([json.dumps({'data': scoring_pool()[:10000]})])
+
+
+@benchmark('score.run[npy 10000]', items=10000)
+def bench_score_run_bulk_columnar():
+    from columnar import encode_features
+    score = load_score()
+    columns = score.prediction_cache.model_package['feature_columns']
+    body = encode_features([[reading[column] for column in columns] for reading in scoring_pool()[:10000]])
+    return lambda: score.run(body, 'application/x-npy')
+
+
+@benchmark('status_engine.analyze')
+def bench_analyze():
+    # What main.analyze_sensor_data runs per reading
+    from status_engine import StatusEngine
+    engine = StatusEngine()
+    rng = np.random.default_rng(1)
+    rows = cycle(list(zip(rng.uniform(20, 55, 1000), rng.uniform(5.5, 9.0, 1000), rng.uniform(0, 600, 1000))))
+    return lambda: engine.analyze(*rows())
+
+
+@benchmark('status_engine.classify[10000]', items=10000)
+def bench_classify():
+    from status_engine import StatusEngine
+    engine = StatusEngine()
+    rng = np.random.default_rng(1)
+    columns = [rng.uniform(20, 55, 10000), rng.uniform(5.5, 9.0, 10000), rng.uniform(0, 600, 10000)]
+    return lambda: engine.classify(*columns)
+
+
+@benchmark('app.parse_arduino_line')
+def bench_parse_arduino_line():
+    app = load_app()
+    return lambda: app.parse_arduino_line("ph:7.12,biogas:55.3")
+
+
+@benchmark('sensor_protocol.parse_sensor_line')
+def bench_parse_sensor_line():
+    # main.py's CSV line parser
+    from sensor_protocol import parse_sensor_line
+    return lambda: parse_sensor_line("37.5,2.56,204")
+
+
+@benchmark('sensor_protocol.FrameDecoder.binary[1000]', items=1000)
+def bench_frame_decoder():
+    from sensor_protocol import FrameDecoder, encode_frame
+    stream = b''.join(encode_frame(seq, 37.5, 7.02, 55.3, 204) for seq in range(1000))
+    decoder = FrameDecoder('binary')
+    return lambda: decoder.feed(stream)
+
+
+def bench_route(method, path, bodies=None):
+    # bodies, when given, returns the JSON body for each call
+    app = load_app()
+    client = app.app.test_client()
+
+    def run():
+        kwargs = {} if bodies is None else {'json': bodies()}
+        response = client.open(path, method=method, **kwargs)
+        if response.status_code != 200:
+            raise RuntimeError(f"{method} {path} returned {response.status_code}")
+    return run
+
+
+@benchmark('GET /api/sensor-data')
+def bench_sensor_data_route():
+    # No board in the bench, so this includes a simulated reading being
+    # scored, stored and published
+    return bench_route('GET', '/api/sensor-data')
+
+
+@benchmark('POST /api/predict')
+def bench_predict_route():
+    return bench_route('POST', '/api/predict', cycle(reading_pool()))
+
+
+@benchmark('POST /api/predict[100]', items=100)
+def bench_predict_batch_route():
+    pool = reading_pool()
+    return bench_route('POST', '/api/predict', cycle([{'data': pool[start:start + 100]} for start in range(0, len(pool), 100)]))
+
+
+@benchmark('GET /api/system-status')
+def bench_system_status_route():
+    return bench_route('GET', '/api/system-status')
+
+
+@benchmark('GET /api/historical-data')
+def bench_historical_data_route():
+    return bench_route('GET', '/api/historical-data')
+
+
+@benchmark('GET /api/historical-data?max_points=20')
+def bench_historical_data_decimated_route():
+    return bench_route('GET', '/api/historical-data?max_points=20')
+
+
+@benchmark('GET /api/rollups')
+def bench_rollups_route():
+    return bench_route('GET', '/api/rollups?resolution=1m')
+
+
+def bench_startup(code, env=None):
+    # A fresh interpreter per call: imports, model load and one prediction
+    env = dict(os.environ, **(env or {}))
+    command = [sys.executable, '-W', 'ignore', '-c', code]
+
+    def run():
+        subprocess.run(command, env=env, cwd=ROOT, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return run
+
+
+# Scratch directories live until the benchmark that made them is measured
+SCRATCH = contextlib.ExitStack()
+
+
+def scratch_dir(prefix):
+    return SCRATCH.enter_context(tempfile.TemporaryDirectory(prefix=prefix))
+
+
+def model_dir(*artefacts):
+    # Scratch AZUREML_MODEL_DIR holding only the given artefacts
+    directory = scratch_dir('bench-model-')
+    for artefact in artefacts:
+        shutil.copy2(artefact, directory)
+    return directory
+
+
+SCORE_STARTUP = """
+import score
+score.init()
+score.run('{"ph": 7.1, "biogas_production": 50.0, "hour": 12, "day": 15, "month": 6, "day_of_week": 2}')
+"""
+
+
+@benchmark('startup.interpreter')
+def bench_interpreter_startup():
+    # The floor under the startup benchmarks, nothing of ours imported
+    return bench_startup("import numpy")
+
+
+@benchmark('startup.score[pickle]')
+def bench_score_startup_pickle():
+    return bench_startup(SCORE_STARTUP, {'AZUREML_MODEL_DIR': model_dir(MODEL_PATH)})
+
+
+@benchmark('startup.score[slim]')
+def bench_score_startup_slim():
+    from anomaly_scoring import slim_artefact_path
+    return bench_startup(SCORE_STARTUP, {'AZUREML_MODEL_DIR': model_dir(slim_artefact_path(MODEL_PATH))})
+
+
+APP_STARTUP = """
+import app
+if app.prediction_cache is None:
+    raise SystemExit("app.py could not load its model")
+app.predict_anomaly(7.1, 50.0)
+"""
+
+
+@benchmark('startup.app')
+def bench_app_startup():
+    store_dir = scratch_dir('bench-store-')
+    return bench_startup(APP_STARTUP, {
+        'READINGS_STORE_DIR': store_dir,
+        'SENSOR_FEED': 'unix:' + os.path.join(store_dir, 'no-daemon.sock'),
+        'DIGESTERS': ''
+    })
+
+
+def measure(run, rounds=ROUNDS, min_round_time=MIN_ROUND_TIME):
+    timer = timeit.Timer(run)
+    # Warm up caches and lazy imports before anything is timed
+    run()
+    number = 1
+    while True:
+        elapsed = timer.timeit(number)
+        if elapsed >= min_round_time:
+            break
+        number = max(number * 2, int(number * min_round_time / max(elapsed, 1e-9) * 1.1))
+    times = [elapsed / number] + [timer.timeit(number) / number for _ in range(rounds - 1)]
+    return number, times
+
+
+def environment():
+    import sklearn
+    model_stat = os.stat(MODEL_PATH)
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "sklearn": sklearn.__version__,
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "model_size": model_stat.st_size,
+        "model_mtime": model_stat.st_mtime
+    }
+
+
+def run_benchmarks(names, rounds=ROUNDS):
+    results = {}
+    for name in names:
+        setup, items = BENCHMARKS[name]
+        with SCRATCH:
+            number, times = measure(setup(), rounds)
+        median = statistics.median(times)
+        results[name] = {
+            "median_us": median * 1e6,
+            "min_us": min(times) * 1e6,
+            "stdev_us": statistics.stdev(times) * 1e6 if len(times) > 1 else 0.0,
+            "per_second": items / median,
+            "items": items,
+            "number": number,
+            "rounds": len(times)
+        }
+        print(f"{name:45s} {median * 1e6:12.2f} µs  {items / median:14,.0f} readings/s")
+    return results
+
+
+def compare(results, baseline, threshold):
+    # A benchmark regressed when its median is more than threshold (a
+    # fraction) above the baseline median
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            print(f"{name:45s} no baseline")
+            continue
+        change = result["median_us"] / previous["median_us"] - 1
+        regressed = change > threshold
+        marker = "REGRESSION" if regressed else ("faster" if change < -threshold else "ok")
+        print(f"{name:45s} {previous['median_us']:12.2f} -> {result['median_us']:12.2f} µs  {change:+7.1%}  {marker}")
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the scoring, parsing and status hot paths")
+    parser.add_argument('--save', help="write the results to this JSON file")
+    parser.add_argument('--baseline', help="compare against results saved by an earlier --save")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed slowdown as a fraction of the baseline median (default %(default)s)")
+    parser.add_argument('--filter', default='', help="only run benchmarks whose name contains this")
+    parser.add_argument('--rounds', type=int, default=ROUNDS)
+    parser.add_argument('--list', action='store_true', help="list the benchmarks and exit")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        print("\n".join(BENCHMARKS))
+        return 0
+
+    names = [name for name in BENCHMARKS if args.filter in name]
+    if not names:
+        parser.error(f"No benchmark matches {args.filter!r}")
+    save = os.path.abspath(args.save) if args.save else None
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+    os.chdir(ROOT)
+
+    # Log output would be timed along with the code under test
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger().setLevel(logging.WARNING)
+    results = run_benchmarks(names, args.rounds)
+
+    if save:
+        with open(save, 'w') as f:
+            json.dump({"created": time.time(), "environment": environment(), "results": results}, f, indent=2)
+        print(f"Saved results to {args.save}")
+
+    if baseline_path:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        print(f"\nAgainst {args.baseline} (threshold {args.threshold:.0%}):")
+        regressions = compare(results, baseline["results"], args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+import io
+import numpy as np
+
+# Binary bulk-scoring format shared by score.run and app.py's /api/predict,
+# chosen with Content-Type: application/x-npy. A request is one .npy array,
+# either 2-D with a column per feature in the model's feature_columns order
+# or 1-D structured with a field per feature name. The response is a 1-D
+# structured .npy with RESULT_FIELDS, one row per input row; the cause
+# field is as wide as the longest cause in the response. Rows that are not
+# anomalous report cause "None" and cause_id -1 (see mask_causes), like
+# app.py's JSON responses.
+
+NPY_CONTENT_TYPE = 'application/x-npy'
+NPY_MAGIC = b'\x93NUMPY'
+
+RESULT_FIELDS = [
+    ('anomaly_score', '<f8'),
+    ('anomaly_detected', '?'),
+    ('cause_id', '<i8')
+]
+
+
+def is_npy(data, content_type=None):
+    if content_type:
+        return content_type.split(';')[0].strip() == NPY_CONTENT_TYPE
+    return isinstance(data, (bytes, bytearray, memoryview)) and bytes(data[:len(NPY_MAGIC)]) == NPY_MAGIC
+
+
+def decode_features(data, feature_columns):
+    # Parses the header and views the payload in place: a little-endian
+    # float64 2-D array comes back as the feature matrix without a copy
+    buffer = memoryview(data)
+    header = io.BytesIO(buffer[:min(len(buffer), 65536 + 16)])
+    version = np.lib.format.read_magic(header)
+    if version == (1, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(header)
+    elif version in ((2, 0), (3, 0)):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(header)
+    else:
+        raise ValueError(f"Unsupported .npy version {version}")
+    if dtype.hasobject:
+        raise ValueError("Object arrays are not accepted")
+
+    count = int(np.prod(shape))
+    values = np.frombuffer(buffer, dtype=dtype, count=count, offset=header.tell())
+    values = values.reshape(shape, order='F' if fortran_order else 'C')
+
+    if dtype.names is not None:
+        missing = [feature for feature in feature_columns if feature not in dtype.names]
+        if missing:
+            raise KeyError(missing[0])
+        if values.ndim != 1:
+            raise ValueError(f"Structured input must be 1-D, got shape {values.shape}")
+        return np.column_stack([values[feature].astype(np.float64, copy=False) for feature in feature_columns])
+
+    if values.ndim != 2 or values.shape[1] != len(feature_columns):
+        raise ValueError(f"Expected shape (n, {len(feature_columns)}) for columns {feature_columns}, got {values.shape}")
+    if dtype.kind not in 'fiub':
+        raise ValueError(f"Unsupported feature dtype {dtype}")
+    return values.astype(np.float64, copy=False)
+
+
+def mask_causes(anomaly_detected, cause_ids, causes):
+    # The classifier names a cause for every row; only anomalies keep it
+    cause_ids = np.where(anomaly_detected, cause_ids, -1)
+    causes = np.where(anomaly_detected, np.asarray(causes).astype(str), "None")
+    return cause_ids, causes
+
+
+def encode_results(anomaly_scores, anomaly_detected, cause_ids, causes):
+    causes = np.asarray(causes).astype(str)
+    results = np.empty(len(anomaly_scores), dtype=RESULT_FIELDS + [('cause', causes.dtype)])
+    results['anomaly_score'] = anomaly_scores
+    results['anomaly_detected'] = anomaly_detected
+    results['cause_id'] = cause_ids
+    results['cause'] = causes
+    output = io.BytesIO()
+    np.save(output, results, allow_pickle=False)
+    return output.getvalue()
+
+
+def encode_features(input_data):
+    # Client side: a feature matrix as a request body
+    output = io.BytesIO()
+    np.save(output, np.ascontiguousarray(input_data, dtype='<f8'), allow_pickle=False)
+    return output.getvalue()
+
+
+def decode_results(data):
+    return np.load(io.BytesIO(data), allow_pickle=False)
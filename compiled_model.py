@@ -0,0 +1,260 @@
+import hashlib
+import os
+import sys
+import numpy as np
+
+
+# Arrays that make up a CompiledModel, in the order of its constructor
+ARRAY_FIELDS = ('feature_columns', 'mean', 'scale', 'selected', 'feature', 'threshold',
+                'children_left', 'children_right', 'value', 'max_depth', 'cause_classes')
+
+
+class CompiledModel:
+    # Flat-array form of the pickled package: StandardScaler -> SelectKBest ->
+    # DecisionTreeRegressor -> LabelEncoder, evaluated with plain NumPy.
+    # save()/load() keep it as an .npz of plain arrays, which loads without
+    # unpickling anything or importing sklearn. source_digest is the SHA-256
+    # of the pickle it was compiled from, to tell when an export is stale.
+
+    def __init__(self, feature_columns, mean, scale, selected, feature, threshold,
+                 children_left, children_right, value, max_depth, cause_classes):
+        self.feature_columns = list(feature_columns)
+        self.mean = mean
+        self.scale = scale
+        self.selected = selected
+        self.feature = feature
+        self.threshold = threshold
+        self.children_left = children_left
+        self.children_right = children_right
+        self.value = value
+        self.max_depth = max_depth
+        self.cause_classes = cause_classes
+        self.source_digest = None
+        self._split_points = None
+
+    @classmethod
+    def from_package(cls, model_package):
+        scaler = model_package['scaler']
+        model = model_package['model']
+        tree = getattr(model, 'tree_', None)
+        if tree is None or not hasattr(model, 'max_depth'):
+            raise ValueError(f"Unsupported model type: {type(model).__name__}")
+
+        n_features = len(model_package['feature_columns'])
+        mean = scaler.mean_ if getattr(scaler, 'with_mean', True) and scaler.mean_ is not None else np.zeros(n_features)
+        scale = scaler.scale_ if getattr(scaler, 'with_std', True) and scaler.scale_ is not None else np.ones(n_features)
+
+        if 'feature_selector' in model_package:
+            selected = model_package['feature_selector'].get_support(indices=True)
+        else:
+            selected = np.arange(n_features)
+
+        # Leaves loop back onto themselves so every row can take exactly
+        # max_depth steps without branching on whether it already stopped
+        node_ids = np.arange(tree.node_count)
+        is_leaf = tree.children_left == -1
+        children_left = np.where(is_leaf, node_ids, tree.children_left).astype(np.intp)
+        children_right = np.where(is_leaf, node_ids, tree.children_right).astype(np.intp)
+        feature = np.where(is_leaf, 0, tree.feature).astype(np.intp)
+        threshold = np.where(is_leaf, np.inf, tree.threshold).astype(np.float64)
+
+        return cls(
+            feature_columns=model_package['feature_columns'],
+            mean=np.asarray(mean, dtype=np.float64),
+            scale=np.asarray(scale, dtype=np.float64),
+            selected=np.asarray(selected, dtype=np.intp),
+            feature=feature,
+            threshold=threshold,
+            children_left=children_left,
+            children_right=children_right,
+            value=np.ascontiguousarray(tree.value[:, :, 0], dtype=np.float64),
+            max_depth=int(tree.max_depth),
+            cause_classes=np.asarray(model_package['cause_encoder'].classes_)
+        )
+
+    def save(self, path):
+        arrays = {name: np.asarray(getattr(self, name)) for name in ARRAY_FIELDS}
+        arrays['feature_columns'] = np.array(self.feature_columns, dtype=str)
+        arrays['cause_classes'] = np.asarray(self.cause_classes).astype(str)
+        arrays['source_digest'] = np.array(self.source_digest or '')
+        # Written aside and renamed so a running service never reads half a file
+        temp_path = f"{path}.tmp.npz"
+        np.savez(temp_path, **arrays)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as arrays:
+            fields = {name: arrays[name] for name in ARRAY_FIELDS}
+            source_digest = str(arrays['source_digest']) if 'source_digest' in arrays else ''
+        fields['feature_columns'] = fields['feature_columns'].tolist()
+        fields['max_depth'] = int(fields['max_depth'])
+        compiled = cls(**fields)
+        compiled.source_digest = source_digest or None
+        return compiled
+
+    def package(self):
+        # Stand-in for the pickled package, with just what the services read
+        return {'feature_columns': list(self.feature_columns), 'compiled': True}
+
+    def predict(self, input_data):
+        input_data = np.asarray(input_data, dtype=np.float64)
+        if input_data.ndim == 1:
+            input_data = input_data.reshape(1, -1)
+
+        scaled_data = (input_data - self.mean) / self.scale
+        # sklearn trees compare float32 inputs against float64 thresholds
+        selected_data = scaled_data[:, self.selected].astype(np.float32)
+
+        rows = np.arange(selected_data.shape[0])
+        node = np.zeros(selected_data.shape[0], dtype=np.intp)
+        for _ in range(self.max_depth):
+            go_left = selected_data[rows, self.feature[node]] <= self.threshold[node]
+            node = np.where(go_left, self.children_left[node], self.children_right[node])
+
+        return self.value[node]
+
+    def split_intervals(self, input_data):
+        # For each selected column, which gap between the tree's sorted
+        # thresholds on it the row falls into. Rows with equal intervals take
+        # the same path and get the same prediction, so they make an exact
+        # cache key. NaN sorts past every threshold and goes right, as above.
+        if self._split_points is None:
+            is_leaf = self.children_left == np.arange(len(self.children_left))
+            self._split_points = [np.unique(self.threshold[~is_leaf & (self.feature == column)])
+                                  for column in range(len(self.selected))]
+
+        input_data = np.asarray(input_data, dtype=np.float64)
+        if input_data.ndim == 1:
+            input_data = input_data.reshape(1, -1)
+        scaled_data = (input_data - self.mean) / self.scale
+        selected_data = scaled_data[:, self.selected].astype(np.float32)
+        return np.column_stack([np.searchsorted(points, selected_data[:, column])
+                                for column, points in enumerate(self._split_points)])
+
+    def decode_causes(self, cause_ids):
+        cause_ids = np.asarray(cause_ids)
+        if cause_ids.size and (cause_ids.min() < 0 or cause_ids.max() >= len(self.cause_classes)):
+            raise ValueError(f"y contains previously unseen labels: {sorted(set(cause_ids.tolist()))}")
+        return self.cause_classes[cause_ids]
+
+    def score(self, input_data):
+        prediction = self.predict(input_data)
+
+        anomaly_scores = prediction[:, 0]
+        cause_ids = np.round(prediction[:, 1]).astype(int)
+        causes = self.decode_causes(cause_ids)
+
+        return anomaly_scores, cause_ids, causes
+
+
+def file_digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def load_compiled_model(model_path):
+    import joblib
+    return CompiledModel.from_package(joblib.load(model_path))
+
+
+def parity_inputs(compiled, seed=0):
+    # ADC-resolution grid for pH and biogas production, every calendar
+    # combination, and values on both sides of every split threshold
+    rng = np.random.default_rng(seed)
+    columns = compiled.feature_columns
+    sensor_grid = {
+        'ph': np.arange(0, 1024) * 0.01,
+        'biogas_production': np.arange(0, 1024) * 0.1
+    }
+    calendar_grid = {
+        'hour': np.arange(0, 24),
+        'day': np.arange(1, 32),
+        'month': np.arange(1, 13),
+        'day_of_week': np.arange(0, 7)
+    }
+
+    def random_column(feature, size):
+        if feature in sensor_grid:
+            return rng.choice(sensor_grid[feature], size)
+        if feature in calendar_grid:
+            return rng.choice(calendar_grid[feature], size)
+        return rng.normal(compiled.mean[columns.index(feature)], compiled.scale[columns.index(feature)], size)
+
+    blocks = []
+    for grid in (sensor_grid, calendar_grid):
+        names = [name for name in grid if name in columns]
+        if not names:
+            continue
+        mesh = np.meshgrid(*[grid[name] for name in names], indexing='ij')
+        size = mesh[0].size
+        block = np.column_stack([random_column(feature, size) for feature in columns])
+        for name, values in zip(names, mesh):
+            block[:, columns.index(name)] = values.ravel()
+        blocks.append(block)
+
+    internal = np.flatnonzero(compiled.children_left != np.arange(len(compiled.children_left)))
+    for node in internal:
+        column = compiled.selected[compiled.feature[node]]
+        # Scaled values land on float32 steps, so probe the steps around the split
+        nearest = np.float32(compiled.threshold[node])
+        steps = np.array([
+            np.nextafter(np.nextafter(nearest, np.float32(-np.inf)), np.float32(-np.inf)),
+            np.nextafter(nearest, np.float32(-np.inf)),
+            nearest,
+            np.nextafter(nearest, np.float32(np.inf)),
+            np.nextafter(np.nextafter(nearest, np.float32(np.inf)), np.float32(np.inf))
+        ], dtype=np.float64)
+        edges = steps * compiled.scale[column] + compiled.mean[column]
+        block = np.column_stack([random_column(feature, edges.size) for feature in columns])
+        block[:, column] = edges
+        blocks.append(block)
+
+    return np.vstack(blocks)
+
+
+def check_parity(model_package, compiled=None):
+    compiled = compiled or CompiledModel.from_package(model_package)
+    input_data = parity_inputs(compiled)
+
+    scaled_data = model_package['scaler'].transform(input_data)
+    if 'feature_selector' in model_package:
+        scaled_data = model_package['feature_selector'].transform(scaled_data)
+    expected = model_package['model'].predict(scaled_data)
+    actual = compiled.predict(input_data)
+
+    mismatched = np.flatnonzero(np.any(expected != actual, axis=1))
+    expected_causes = model_package['cause_encoder'].inverse_transform(np.round(expected[:, 1]).astype(int))
+    actual_causes = compiled.decode_causes(np.round(actual[:, 1]).astype(int))
+    mismatched_causes = np.flatnonzero(expected_causes != actual_causes)
+
+    return len(input_data), mismatched, mismatched_causes
+
+
+if __name__ == '__main__':
+    # python compiled_model.py [model.pkl] [--export]
+    # --export writes the slim .npz next to the pickle once parity holds
+    import warnings
+    import joblib
+    from anomaly_scoring import slim_artefact_path
+
+    warnings.filterwarnings('ignore', message='X does not have valid feature names')
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    model_path = args[0] if args else 'biogas_anomaly_model.pkl'
+    model_package = joblib.load(model_path)
+    compiled = CompiledModel.from_package(model_package)
+    compiled.source_digest = file_digest(model_path)
+    checked, mismatched, mismatched_causes = check_parity(model_package, compiled)
+    print(f"Checked {checked} inputs: {len(mismatched)} prediction mismatches, {len(mismatched_causes)} cause mismatches")
+    if len(mismatched) or len(mismatched_causes):
+        sys.exit(1)
+
+    if '--export' in sys.argv:
+        slim_path = slim_artefact_path(model_path)
+        compiled.save(slim_path)
+        reloaded = CompiledModel.load(slim_path)
+        inputs = parity_inputs(reloaded)
+        if not np.array_equal(reloaded.predict(inputs), compiled.predict(inputs)):
+            print(f"Reloaded {slim_path} does not match the compiled model")
+            sys.exit(1)
+        print(f"Wrote {slim_path} ({os.path.getsize(slim_path)} bytes)")
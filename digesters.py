@@ -0,0 +1,126 @@
+import threading
+import time
+from datetime import datetime
+from history_buffer import HistoryBuffer
+
+# Site layout for app.py, one entry per digester: id=port pairs separated by
+# commas, e.g. "north=/dev/ttyUSB0,south=/dev/ttyUSB1". A port may also be a
+# serial_daemon.py feed address (unix:<path> or tcp:<host>:<port>).
+DEVICE_SPEC_SEPARATOR = ','
+
+
+def default_reading():
+    return {
+        'ph': 7.0,
+        'biogas_production': 50.0,
+        'timestamp': datetime.now().isoformat(),
+        'anomaly_detected': False,
+        'anomaly_probability': 0.0,
+        'system_status': 'Normal'
+    }
+
+
+def parse_devices(spec):
+    devices = {}
+    for entry in spec.split(DEVICE_SPEC_SEPARATOR):
+        entry = entry.strip()
+        if not entry:
+            continue
+        device_id, _, port = entry.partition('=')
+        device_id, port = device_id.strip(), port.strip()
+        if not device_id or not port:
+            raise ValueError(f"Invalid digester entry {entry!r}, expected id=port")
+        if device_id in devices:
+            raise ValueError(f"Digester {device_id!r} is listed twice")
+        devices[device_id] = port
+    return devices
+
+
+class Digester:
+    # Everything app.py keeps for one digester: the latest reading, a history
+    # ring and the acquisition that feeds them, behind a lock of its own so
+    # digesters never wait on each other. predict(ph, biogas_production)
+    # runs outside the lock; on_update(seq, reading, previous_status, source)
+    # runs inside it, so anything it publishes stays in seq order. It only
+    # counts as connected while the acquisition delivers usable readings,
+    # at least one every stale_after seconds.
+
+    def __init__(self, device_id, history, predict, current=None, lock=None, on_update=None, stale_after=15.0):
+        self.id = device_id
+        self.history = history if isinstance(history, HistoryBuffer) else HistoryBuffer(history)
+        self.predict = predict
+        self.current = current if current is not None else default_reading()
+        self.lock = lock if lock is not None else threading.Lock()
+        self.on_update = on_update
+        self.stale_after = stale_after
+        self.last_reading = None
+        self.acquisition = None
+
+    @property
+    def connected(self):
+        # A link that only carries readings we cannot use (CSV lines have no
+        # biogas value) is as good as none, so callers fall back to simulation
+        if self.acquisition is None or not self.acquisition.connected:
+            return False
+        last_reading = self.last_reading
+        return last_reading is not None and time.monotonic() - last_reading < self.stale_after
+
+    def update(self, ph, biogas_production, source='arduino'):
+        prediction = self.predict(ph, biogas_production)
+
+        with self.lock:
+            current = self.current
+            previous_status = current['system_status']
+            current['ph'] = ph
+            current['biogas_production'] = biogas_production
+            current['timestamp'] = datetime.now().isoformat()
+            current['anomaly_probability'] = prediction['anomaly_probability']
+            current['anomaly_detected'] = prediction['anomaly_probability'] > 0.5
+            current['anomaly_cause'] = prediction['cause']
+
+            if current['anomaly_detected']:
+                current['system_status'] = 'Warning'
+            else:
+                current['system_status'] = 'Normal'
+
+            seq = self.history.append(current)
+            if source != 'simulation':
+                self.last_reading = time.monotonic()
+            reading = dict(current)
+            if self.on_update is not None:
+                self.on_update(seq, reading, previous_status, source)
+            return reading
+
+    def reading(self):
+        with self.lock:
+            return dict(self.current)
+
+    def reset_alarm(self):
+        # Returns the status it replaced
+        with self.lock:
+            previous_status = self.current['system_status']
+            self.current['anomaly_detected'] = False
+            self.current['system_status'] = 'Normal'
+            return previous_status
+
+    def status(self):
+        with self.lock:
+            status = {
+                "device": self.id,
+                "status": self.current['system_status'],
+                "last_updated": self.current['timestamp'],
+                "anomaly_detected": self.current['anomaly_detected'],
+                "anomaly_cause": self.current.get('anomaly_cause', 'Unknown'),
+                "readings": self.history.total
+            }
+        if self.acquisition is not None:
+            status["acquisition"] = self.acquisition.stats()
+        return status
+
+    def start(self):
+        if self.acquisition is not None:
+            self.acquisition.start()
+
+    def stop(self):
+        if self.acquisition is not None:
+            self.acquisition.stop()
@@ -0,0 +1,53 @@
+import json
+import queue
+import threading
+
+
+def format_event(event_id, event_type, data):
+    return f"id: {event_id}\nevent: {event_type}\ndata: {json.dumps(data)}\n\n"
+
+
+class Broadcaster:
+    # Fans each event out to every subscriber. The event is serialized once
+    # and the same text is queued for all clients; a client that falls more
+    # than client_queue_size events behind loses its oldest pending events.
+
+    def __init__(self, client_queue_size=256):
+        self.client_queue_size = client_queue_size
+        self.lock = threading.Lock()
+        self.subscribers = []
+        self.dropped = 0
+
+    def subscribe(self):
+        subscriber = queue.Queue(maxsize=self.client_queue_size)
+        with self.lock:
+            self.subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            if subscriber in self.subscribers:
+                self.subscribers.remove(subscriber)
+
+    def client_count(self):
+        with self.lock:
+            return len(self.subscribers)
+
+    def publish(self, event_id, event_type, data):
+        with self.lock:
+            subscribers = list(self.subscribers)
+        if not subscribers:
+            return
+
+        event = (event_id, event_type, format_event(event_id, event_type, data))
+        for subscriber in subscribers:
+            while True:
+                try:
+                    subscriber.put_nowait(event)
+                    break
+                except queue.Full:
+                    try:
+                        subscriber.get_nowait()
+                        self.dropped += 1
+                    except queue.Empty:
+                        pass
@@ -0,0 +1,123 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import tempfile
+import time
+
+# File mailboxes shared with other processes (azure_ml_iot.py's
+# arduino_data.json and ml_results.txt). Writers go through atomic_write so
+# a reader never sees half a file; readers wait on a FileWatcher instead of
+# polling, so a new file is noticed within milliseconds.
+
+# inotify(7): the file was closed after writing, or renamed into place
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+EVENT_HEADER = struct.Struct('iIII')
+
+# Where inotify is missing (Windows, macOS) the file is stat()ed this often
+FALLBACK_POLL_INTERVAL = 0.1
+
+
+def atomic_write(path, data):
+    # Written next to the target and renamed over it, so readers see either
+    # the old file or the new one, never a mix
+    directory, name = os.path.split(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f".{name}.", suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb' if isinstance(data, bytes) else 'w') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _inotify():
+    libc_name = ctypes.util.find_library('c')
+    if not libc_name:
+        return None
+    libc = ctypes.CDLL(libc_name, use_errno=True)
+    if not hasattr(libc, 'inotify_init1'):
+        return None
+    return libc
+
+
+class FileWatcher:
+    # wait() blocks until path has been written and closed or renamed into
+    # place, and reports whether it was. Changes that land between two
+    # waits are coalesced into one. Watches the parent directory, so the
+    # file may be missing or replaced by rename at any time.
+
+    def __init__(self, path, poll_interval=FALLBACK_POLL_INTERVAL):
+        self.path = os.path.abspath(path)
+        self.directory, self.name = os.path.split(self.path)
+        self.poll_interval = poll_interval
+        self.fd = None
+        self.events = 0
+        libc = _inotify()
+        if libc is not None:
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd >= 0:
+                if libc.inotify_add_watch(fd, os.fsencode(self.directory), IN_CLOSE_WRITE | IN_MOVED_TO) >= 0:
+                    self.fd = fd
+                else:
+                    os.close(fd)
+        self.signature = self._stat()
+
+    @property
+    def mode(self):
+        return 'inotify' if self.fd is not None else 'poll'
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    def _read_events(self):
+        changed = False
+        name = os.fsencode(self.name)
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return changed
+            offset = 0
+            while offset < len(data):
+                _, _, _, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                if data[offset:offset + length].rstrip(b'\0') == name:
+                    changed = True
+                offset += length
+
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            if self.fd is not None:
+                ready, _, _ = select.select([self.fd], [], [], remaining)
+                if ready and self._read_events():
+                    self.events += 1
+                    return True
+            else:
+                time.sleep(self.poll_interval if remaining is None else min(self.poll_interval, remaining))
+                signature = self._stat()
+                if signature is not None and signature != self.signature:
+                    self.signature = signature
+                    self.events += 1
+                    return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
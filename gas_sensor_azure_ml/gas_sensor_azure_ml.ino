@@ -17,6 +17,16 @@ bool displayInitialized = false;
 #define BIOGAS_MAX 80
 #define GAS_THRESHOLD 350
 
+// 1: framed binary readings (see sensor_protocol.py), 0: legacy CSV lines
+#define SERIAL_PROTOCOL_BINARY 1
+#define SAMPLE_INTERVAL_MS 5000
+
+#define FRAME_SYNC 0xA5
+#define FRAME_VERSION 1
+#define FRAME_PAYLOAD_SIZE 8
+
+uint16_t frameSeq = 0;
+
 void setup() {
   Serial.begin(9600);
   
@@ -25,7 +35,9 @@ void setup() {
   
   Wire.begin();
   
-  Serial.println("Starting display initialization...");
+  if (!SERIAL_PROTOCOL_BINARY) {
+    Serial.println("Starting display initialization...");
+  }
   
   display.begin(0x3C, true);
   delay(100);
@@ -40,7 +52,9 @@ void setup() {
   display.display();
   
   displayInitialized = true;
-  Serial.println("Display setup complete");
+  if (!SERIAL_PROTOCOL_BINARY) {
+    Serial.println("Display setup complete");
+  }
   
   delay(1000);
 }
@@ -51,11 +65,15 @@ void loop() {
   float biogas = analogRead(A1) * 0.1;
   int gas_level = analogRead(A1) * 2;
   
-  Serial.print(temperature, 1);
-  Serial.print(",");
-  Serial.print(ph, 2);
-  Serial.print(",");
-  Serial.println(gas_level);
+  if (SERIAL_PROTOCOL_BINARY) {
+    sendFrame(temperature, analogRead(A0), analogRead(A1), gas_level);
+  } else {
+    Serial.print(temperature, 1);
+    Serial.print(",");
+    Serial.print(ph, 2);
+    Serial.print(",");
+    Serial.println(gas_level);
+  }
   
   if (displayInitialized) {
     display.clearDisplay();
@@ -101,7 +119,7 @@ void loop() {
     display.display();
   }
   
-  delay(5000);
+  delay(SAMPLE_INTERVAL_MS);
 }
 
 String getStatus(float value, float minThreshold, float maxThreshold) {
@@ -112,4 +130,37 @@ String getStatus(float value, float minThreshold, float maxThreshold) {
   } else {
     return "NORMAL";
   }
-}
\ No newline at end of file
+}
+
+// CRC-16/CCITT-FALSE, matches binascii.crc_hqx(data, 0xFFFF)
+uint16_t crc16(const uint8_t *data, size_t length) {
+  uint16_t crc = 0xFFFF;
+  for (size_t i = 0; i < length; i++) {
+    crc ^= (uint16_t)data[i] << 8;
+    for (uint8_t bit = 0; bit < 8; bit++) {
+      crc = (crc & 0x8000) ? (crc << 1) ^ 0x1021 : crc << 1;
+    }
+  }
+  return crc;
+}
+
+void putUint16(uint8_t *buffer, uint16_t value) {
+  buffer[0] = value & 0xFF;
+  buffer[1] = value >> 8;
+}
+
+// sync, version, length, seq, temperature (0.1 C), ph (0.01, the raw A0
+// reading), biogas (0.1, the raw A1 reading), gas level, CRC; little-endian
+void sendFrame(float temperature, uint16_t phRaw, uint16_t biogasRaw, uint16_t gasLevel) {
+  uint8_t frame[5 + FRAME_PAYLOAD_SIZE + 2];
+  frame[0] = FRAME_SYNC;
+  frame[1] = FRAME_VERSION;
+  frame[2] = FRAME_PAYLOAD_SIZE;
+  putUint16(frame + 3, frameSeq++);
+  putUint16(frame + 5, (uint16_t)(int16_t)round(temperature * 10));
+  putUint16(frame + 7, phRaw);
+  putUint16(frame + 9, biogasRaw);
+  putUint16(frame + 11, gasLevel);
+  putUint16(frame + 13, crc16(frame + 1, 4 + FRAME_PAYLOAD_SIZE));
+  Serial.write(frame, sizeof(frame));
+}
@@ -0,0 +1,69 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+
+# The dashboard's AI assistant answers, kept out of main.py so they can be
+# used and tested without running the Streamlit script
+
+
+class GuidanceCache:
+    # Shared TTL cache of finished answers. Keyed on status, the issues with
+    # their numbers stripped and the normalized question, so the quick
+    # buttons and automatic warnings for the same situation are answered
+    # locally instead of with another LLM round trip
+
+    def __init__(self, ttl, max_size=256, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    @staticmethod
+    def key(status, issues, user_question):
+        normalized_issues = tuple(sorted(re.sub(r"\d+(\.\d+)?", "#", issue) for issue in issues))
+        normalized_question = " ".join(user_question.lower().split())
+        return status, normalized_issues, normalized_question
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            stored_at, response = entry
+            if self.clock() - stored_at > self.ttl:
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return response
+
+    def put(self, key, response):
+        with self.lock:
+            self.entries[key] = (self.clock(), response)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+
+def stream_answer(cache, key, create):
+    # Yields the cached answer for key, or the content of the streamed chat
+    # completion that create() starts, as it arrives. Only an answer that
+    # streamed to the end is cached; errors propagate to the caller.
+    cached = cache.get(key)
+    if cached is not None:
+        yield cached
+        return
+
+    chunks = []
+    for chunk in create():
+        # Azure sends a content-filter chunk with no choices first
+        if not chunk.choices:
+            continue
+        content = chunk.choices[0].delta.content
+        if content:
+            chunks.append(content)
+            yield content
+
+    if chunks:
+        cache.put(key, "".join(chunks))
@@ -0,0 +1,190 @@
+import numpy as np
+from datetime import datetime
+from rollups import decimate_indices
+
+
+class CodeTable:
+    # Maps repeated strings (status, anomaly cause) to small integer codes
+
+    def __init__(self, values=(), dtype=np.uint8):
+        self.limit = np.iinfo(dtype).max + 1
+        self.values = []
+        self.codes = {}
+        for value in values:
+            self.encode(value)
+
+    def encode(self, value):
+        value = str(value)
+        code = self.codes.get(value)
+        if code is None:
+            if len(self.values) >= self.limit:
+                raise ValueError(f"Code table full, cannot add {value!r}")
+            code = len(self.values)
+            self.values.append(value)
+            self.codes[value] = code
+        return code
+
+    def decode(self, codes):
+        values = np.array(self.values, dtype=object)
+        return values[np.asarray(codes, dtype=np.intp)]
+
+
+def to_epoch(value):
+    if value is None or value == '':
+        return None
+    if isinstance(value, datetime):
+        return value.timestamp()
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return datetime.fromisoformat(str(value)).timestamp()
+
+
+def _as_floats(values):
+    # Shortest repr of each float32, so 7.2 is served as 7.2 and not 7.19999980
+    return [float(value) for value in values.astype(str)]
+
+
+class HistoryBuffer:
+    # Fixed-capacity ring of readings stored column by column. Appends
+    # overwrite the oldest row in place; reads slice at most two segments.
+
+    def __init__(self, capacity):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self.seq = np.zeros(capacity, dtype=np.int64)
+        self.timestamp = np.zeros(capacity, dtype=np.float64)
+        self.ph = np.zeros(capacity, dtype=np.float32)
+        self.biogas_production = np.zeros(capacity, dtype=np.float32)
+        self.anomaly_probability = np.zeros(capacity, dtype=np.float32)
+        self.anomaly_detected = np.zeros(capacity, dtype=np.bool_)
+        self.status = np.zeros(capacity, dtype=np.uint8)
+        self.cause = np.zeros(capacity, dtype=np.uint8)
+        self.statuses = CodeTable(['Normal', 'Warning'])
+        self.causes = CodeTable(['None', 'Unknown'])
+        self.total = 0
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    def append(self, entry):
+        # Returns the reading's sequence number, which keeps counting past
+        # the capacity and identifies the row for resumable readers
+        seq = self.total
+        index = seq % self.capacity
+        self.seq[index] = seq
+        self.timestamp[index] = to_epoch(entry['timestamp'])
+        self.ph[index] = entry['ph']
+        self.biogas_production[index] = entry['biogas_production']
+        self.anomaly_probability[index] = entry.get('anomaly_probability', 0.0)
+        self.anomaly_detected[index] = bool(entry.get('anomaly_detected', False))
+        self.status[index] = self.statuses.encode(entry.get('system_status', 'Normal'))
+        try:
+            self.cause[index] = self.causes.encode(entry.get('anomaly_cause', 'None'))
+        except ValueError:
+            self.cause[index] = self.causes.encode('Unknown')
+        self.total += 1
+        return seq
+
+    def oldest_timestamp(self):
+        if not self.total:
+            return None
+        return float(self.timestamp[self._segments()[0].start])
+
+    def _segments(self):
+        # Physical slices holding the retained rows, oldest first
+        if self.total <= self.capacity:
+            return [slice(0, self.total)]
+        head = self.total % self.capacity
+        return [slice(head, self.capacity), slice(0, head)]
+
+    def select(self, since=None, until=None, limit=None):
+        # Readings are appended in time order, so each segment is sorted and
+        # the time window is found by binary search rather than a scan
+        since = to_epoch(since)
+        until = to_epoch(until)
+
+        ranges = []
+        for segment in self._segments():
+            times = self.timestamp[segment]
+            start = 0 if since is None else int(np.searchsorted(times, since, side='left'))
+            stop = len(times) if until is None else int(np.searchsorted(times, until, side='right'))
+            if stop > start:
+                ranges.append(slice(segment.start + start, segment.start + stop))
+
+        if limit is not None:
+            # Keep the most recent `limit` rows of the window
+            remaining = max(int(limit), 0)
+            trimmed = []
+            for selected in reversed(ranges):
+                if remaining == 0:
+                    break
+                size = selected.stop - selected.start
+                take = min(size, remaining)
+                trimmed.append(slice(selected.stop - take, selected.stop))
+                remaining -= take
+            ranges = list(reversed(trimmed))
+
+        return ranges
+
+    def select_after(self, seq):
+        # Rows with a sequence number above seq that are still retained
+        oldest = max(self.total - self.capacity, 0)
+        start = max(int(seq) + 1, oldest)
+        if start >= self.total:
+            return []
+        first = start % self.capacity
+        count = self.total - start
+        if first + count <= self.capacity:
+            return [slice(first, first + count)]
+        return [slice(first, self.capacity), slice(0, first + count - self.capacity)]
+
+    def column(self, name, ranges):
+        values = getattr(self, name)
+        if len(ranges) == 1:
+            return values[ranges[0]]
+        if not ranges:
+            return values[:0]
+        return np.concatenate([values[selected] for selected in ranges])
+
+    def to_records(self, since=None, until=None, limit=None, max_points=None):
+        ranges = self.select(since, until, limit)
+        indices = None
+        if max_points is not None:
+            indices = decimate_indices(
+                self.column('timestamp', ranges),
+                [self.column('ph', ranges), self.column('biogas_production', ranges)],
+                max_points
+            )
+        return self.records(ranges, indices)
+
+    def records_after(self, seq):
+        ranges = self.select_after(seq)
+        return list(zip(self.column('seq', ranges).tolist(), self.records(ranges)))
+
+    def records(self, ranges, indices=None):
+        def column(name):
+            values = self.column(name, ranges)
+            return values if indices is None else values[indices]
+
+        timestamps = column('timestamp')
+        ph = _as_floats(column('ph'))
+        biogas_production = _as_floats(column('biogas_production'))
+        anomaly_probability = _as_floats(column('anomaly_probability'))
+        anomaly_detected = column('anomaly_detected').tolist()
+        statuses = self.statuses.decode(column('status'))
+        causes = self.causes.decode(column('cause'))
+
+        return [
+            {
+                'ph': ph[i],
+                'biogas_production': biogas_production[i],
+                'timestamp': datetime.fromtimestamp(timestamps[i]).isoformat(),
+                'anomaly_detected': anomaly_detected[i],
+                'anomaly_probability': anomaly_probability[i],
+                'system_status': statuses[i],
+                'anomaly_cause': causes[i]
+            }
+            for i in range(len(timestamps))
+        ]
@@ -0,0 +1,140 @@
+import logging
+import threading
+import time
+from collections import deque
+from azure.iot.device import IoTHubDeviceClient
+from metrics import IOT_SEND_FAILURES
+
+logger = logging.getLogger(__name__)
+
+
+class IoTHubSender:
+    # Owns the IoT Hub connection on a background thread. Callers only
+    # enqueue messages, so a hub outage never blocks them: the thread
+    # (re)connects with exponential backoff and sends the queue in order.
+    # The queue is bounded, the oldest message is dropped when it is full.
+
+    def __init__(self, connection_string, queue_size=1000, min_backoff=1.0,
+                 max_backoff=60.0, client_factory=None):
+        self.connection_string = connection_string
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.client_factory = client_factory or IoTHubDeviceClient.create_from_connection_string
+
+        self.lock = threading.Condition()
+        # (enqueued at, message)
+        self.pending = deque(maxlen=queue_size)
+        self.client = None
+        self.connected = False
+        self.sent = 0
+        self.dropped = 0
+        self.failures = 0
+        self.last_sent = None
+        self.last_error = None
+        self.retry_at = None
+
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name="iot-hub-sender", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=5.0):
+        self._stop_event.set()
+        with self.lock:
+            self.lock.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._disconnect()
+
+    def send(self, message):
+        with self.lock:
+            if len(self.pending) == self.pending.maxlen:
+                self.dropped += 1
+            self.pending.append((time.time(), message))
+            self.lock.notify()
+
+    def health(self):
+        now = time.time()
+        with self.lock:
+            oldest = self.pending[0][0] if self.pending else None
+            return {
+                "connected": self.connected,
+                "queue_depth": len(self.pending),
+                # Age of the oldest message still waiting to be sent
+                "lag": now - oldest if oldest is not None else 0.0,
+                "sent": self.sent,
+                "dropped": self.dropped,
+                "failures": self.failures,
+                "last_sent": self.last_sent,
+                "last_error": self.last_error,
+                "retry_in": max(0.0, self.retry_at - time.monotonic()) if self.retry_at is not None else None
+            }
+
+    def _connect(self):
+        client = self.client_factory(self.connection_string)
+        client.connect()
+        self.client = client
+        self.connected = True
+        logger.info("Connected to Azure IoT Hub")
+
+    def _disconnect(self):
+        self.connected = False
+        client, self.client = self.client, None
+        if client is not None:
+            try:
+                client.shutdown()
+            except Exception:
+                pass
+
+    def _wait_backoff(self, backoff, error):
+        self.failures += 1
+        IOT_SEND_FAILURES.labels('iot_sender').inc()
+        self.last_error = str(error)
+        self.retry_at = time.monotonic() + backoff
+        self._stop_event.wait(backoff)
+        self.retry_at = None
+        return min(backoff * 2, self.max_backoff)
+
+    def _run(self):
+        backoff = self.min_backoff
+        while not self._stop_event.is_set():
+            with self.lock:
+                while not self.pending and not self._stop_event.is_set():
+                    self.lock.wait()
+                if self._stop_event.is_set():
+                    return
+                _, message = self.pending[0]
+
+            if self.client is None:
+                try:
+                    self._connect()
+                except Exception as e:
+                    self._disconnect()
+                    logger.error(f"Could not connect to Azure IoT Hub: {e}, retrying in {backoff:.0f}s")
+                    backoff = self._wait_backoff(backoff, e)
+                    continue
+
+            try:
+                self.client.send_message(message)
+            except Exception as e:
+                # The message stays at the head of the queue for the retry
+                self._disconnect()
+                logger.error(f"Failed to send to Azure IoT Hub: {e}, retrying in {backoff:.0f}s")
+                backoff = self._wait_backoff(backoff, e)
+                continue
+
+            backoff = self.min_backoff
+            with self.lock:
+                # Unless the queue overflowed meanwhile and evicted it
+                if self.pending and self.pending[0][1] is message:
+                    self.pending.popleft()
+                self.sent += 1
+                self.last_sent = time.time()
+                self.last_error = None
@@ -58,6 +58,11 @@ st.markdown("""
 
 import random
 import time
+import queue
+import threading
+from collections import deque
+from itertools import islice
+import numpy as np
 import os
 from dotenv import load_dotenv
 import serial
@@ -66,16 +71,41 @@ from openai import AzureOpenAI
 import pandas as pd
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-from azure.iot.device import IoTHubDeviceClient, Message
+from azure.iot.device import Message
 import serial.tools.list_ports
+from guidance import GuidanceCache, stream_answer
+from iot_sender import IoTHubSender
+import metrics
+from segment_store import SegmentStore
+from sensor_feed import FEED_ADDRESS, FeedAcquisition
+from sensor_protocol import FrameDecoder, read_available, sensor_reading
+from status_engine import OPTIMAL_RANGES, StatusEngine
+from rollups import RollupEngine
 
 load_dotenv()
-iot_client = None
+CONNECTION_STRING = "HostName=318Hub.azure-devices.net;DeviceId=bioserde;SharedAccessKey=ml0XIrouzxoP/zmDGex1lHNjcCj76+cD/aRwKc+r9no="
+# Telemetry waiting for the IoT Hub sender; the oldest is dropped when full
+IOT_QUEUE_SIZE = 1000
+HISTORY_SIZE = 50
+# Seconds between simulated readings when no Arduino is attached
+SAMPLE_INTERVAL = 5
+# 'auto', 'binary' or 'csv', see sensor_protocol.py
+SERIAL_PROTOCOL = os.getenv("SERIAL_PROTOCOL", "auto")
+# How long a render waits for the collector's first reading
+COLLECTOR_WAIT = 3
+REFRESH_INTERVAL = 5
+# Seconds an AI answer is reused for the same status, issues and question
+GUIDANCE_CACHE_TTL = float(os.getenv("GUIDANCE_CACHE_TTL", "600"))
+# Port for the Prometheus-style metrics of this process, empty for none
+METRICS_PORT = os.getenv("METRICS_PORT", "")
+TREND_RANGES = {
+    "24 Jam Terakhir": ("1m", 24 * 3600),
+    "7 Hari Terakhir": ("15m", 7 * 24 * 3600),
+    "30 Hari Terakhir": ("1h", 30 * 24 * 3600)
+}
 
 @st.cache_resource
-def init_arduino_and_iot():
-    global iot_client
-    
+def init_arduino():
     arduino = None
     try:
         available_ports = serial.tools.list_ports.comports()
@@ -103,11 +133,12 @@ def init_arduino_and_iot():
                     time.sleep(2)
                     
                     arduino.flushInput()
-                    test_read = arduino.readline().decode('utf-8').strip()
+                    # Frames or CSV lines, the collector's decoder tells them apart
+                    test_read = arduino.read(arduino.in_waiting or 1)
                     
                     print(f"✅ Berhasil connect ke Arduino di {port_name}")
                     if test_read:
-                        print(f"📡 Test data: {test_read}")
+                        print(f"📡 Test data: {test_read[:64]!r}")
                     break
                     
                 except Exception as e:
@@ -117,128 +148,88 @@ def init_arduino_and_iot():
     except Exception as e:
         print(f"❌ Error dalam pencarian Arduino: {str(e)}")
     
-    try:
-        CONNECTION_STRING = "HostName=318Hub.azure-devices.net;DeviceId=bioserde;SharedAccessKey=ml0XIrouzxoP/zmDGex1lHNjcCj76+cD/aRwKc+r9no="
-        iot_client = IoTHubDeviceClient.create_from_connection_string(CONNECTION_STRING)
-        print("🌐 Connecting to Azure IoT Hub...")
-        iot_client.connect()
-        print("✅ Connected to Azure IoT Hub")
-    except Exception as azure_error:
-        print(f"⚠️ Azure IoT Hub connection failed: {azure_error}")
-        iot_client = None
-    
-    return arduino, iot_client
+    return arduino
+
+@st.cache_resource
+def init_iot_sender():
+    # Connects and sends on its own thread so a hub outage never adds a
+    # connection timeout to a page render
+    sender = IoTHubSender(CONNECTION_STRING, queue_size=IOT_QUEUE_SIZE)
+    sender.start()
+    return sender
 
 def send_to_iot_hub(sensor_data, status, issues):
-    global iot_client
-    
-    if iot_client is None:
-        try:
-            CONNECTION_STRING = "HostName=318Hub.azure-devices.net;DeviceId=bioserde;SharedAccessKey=ml0XIrouzxoP/zmDGex1lHNjcCj76+cD/aRwKc+r9no="
-            iot_client = IoTHubDeviceClient.create_from_connection_string(CONNECTION_STRING)
-            iot_client.connect()
-            print("🔄 IoT Hub reconnected")
-        except Exception as e:
-            print(f"⚠️ IoT Hub reconnection failed: {e}")
-            return False
+    message_data = {
+        "timestamp": time.strftime('%Y-%m-%d %H:%M:%S'),
+        "deviceId": "bioserde",
+        "temperature": sensor_data["temperature"],
+        "ph": sensor_data["ph"],
+        "methane": sensor_data["methane"],
+        "status": status,
+        "issues": issues,
+        "source": sensor_data["source"]
+    }
     
-    try:
-        message_data = {
-            "timestamp": time.strftime('%Y-%m-%d %H:%M:%S'),
-            "deviceId": "bioserde",
-            "temperature": sensor_data["temperature"],
-            "ph": sensor_data["ph"],
-            "methane": sensor_data["methane"],
-            "status": status,
-            "issues": issues,
-            "source": sensor_data["source"]
-        }
-        
-        message_json = json.dumps(message_data)
-        message = Message(message_json)
-        
-        message.custom_properties["messageType"] = "telemetry"
-        message.custom_properties["deviceId"] = "bioserde"
-        message.custom_properties["status"] = status
-        
-        iot_client.send_message(message)
-        print(f"📤 Data berhasil dikirim ke IoT Hub: {message_json}")
-        return True
-        
-    except Exception as e:
-        print(f"❌ Gagal kirim ke IoT Hub: {str(e)}")
-        iot_client = None
-        return False
-    
-arduino_connection, iot_client = init_arduino_and_iot()
-
-def read_arduino_data():
-    if arduino_connection is None:
-        return {
-            "temperature": random.uniform(30, 45),
-            "ph": random.uniform(6.0, 8.5),
-            "methane": random.uniform(80, 350),
-            "source": "simulation"
-        }
+    message = Message(json.dumps(message_data))
+    
+    message.custom_properties["messageType"] = "telemetry"
+    message.custom_properties["deviceId"] = "bioserde"
+    message.custom_properties["status"] = status
+    
+    iot_sender.send(message)
     
+# With a sensor feed configured serial_daemon.py owns the port and this
+# process only subscribes; SENSOR_FEED= (empty) opens the port directly
+arduino_connection = None if FEED_ADDRESS else init_arduino()
+iot_sender = init_iot_sender()
+
+@st.cache_resource
+def init_readings_store():
+    store_dir = os.getenv("READINGS_STORE_DIR", os.path.join("data", "dashboard"))
     try:
-        arduino_connection.flushInput()
-        time.sleep(0.1)
-        
-        for attempt in range(3):
-            line = arduino_connection.readline().decode('utf-8').strip()
-            print(f"🔍 Attempt {attempt + 1}: Raw data dari Arduino: '{line}' (length: {len(line)})")
-            
-            if line and ',' in line:
-                try:
-                    values = line.split(',')
-                    print(f"📊 Parsed values: {values} (count: {len(values)})")
-                    
-                    if len(values) >= 3:
-                        temp = float(values[0])
-                        raw_ph = float(values[1])
-                        methane = float(values[2])
-                        
-                        if 0 <= temp <= 100 and 0 <= raw_ph <= 5 and 0 <= methane <= 1024:
-                            ph = 7.0 + (raw_ph - 2.5) * 2
-                            ph = max(0, min(14, ph))
-                            
-                            print(f"✅ Valid data parsed: Temp={temp}°C, Raw_pH={raw_ph}V, pH={ph:.1f}, Methane={methane}")
-                            
-                            return {
-                                "temperature": temp,
-                                "ph": ph,
-                                "methane": methane,
-                                "source": "arduino"
-                            }
-                        else:
-                            print(f"⚠️ Data out of range: temp={temp}, raw_ph={raw_ph}, methane={methane}")
-                    else:
-                        print(f"⚠️ Not enough values: expected 3, got {len(values)}")
-                        
-                except ValueError as e:
-                    print(f"❌ Error parsing values: {e}")
-                    continue
-            else:
-                print(f"⚠️ No comma found or empty line: '{line}'")
-            
-            time.sleep(0.1)
-        
-        return {
-            "temperature": 35.0,
-            "ph": 7.0,
-            "methane": 200.0,
-            "source": "default"
-        }
-        
+        store = SegmentStore(store_dir, writable=True)
+        store.start_maintenance(3600, float(os.getenv("STORE_RETENTION_DAYS", "90")) * 86400)
+        print(f"💾 Riwayat sensor disimpan di {store_dir}")
+        return store
     except Exception as e:
-        print(f"❌ Error reading Arduino: {e}")
-        return {
-            "temperature": random.uniform(30, 45),
-            "ph": random.uniform(6.0, 8.5),
-            "methane": random.uniform(80, 350),
-            "source": "error_fallback"
+        print(f"⚠️ Gagal membuka penyimpanan riwayat: {e}")
+        return None
+
+readings_store = init_readings_store()
+
+@st.cache_resource
+def init_rollups():
+    rollups = RollupEngine()
+    if readings_store is not None:
+        records = readings_store.query(since=time.time() - max(span for _, span in TREND_RANGES.values()))
+        rollups.add_many(records["timestamp"], {field: records[field] for field in rollups.fields})
+    return rollups
+
+rollups = init_rollups()
+
+def load_sensor_history():
+    if readings_store is None:
+        return []
+    records = readings_store.latest(HISTORY_SIZE)
+    return [
+        {
+            "timestamp": float(record["timestamp"]),
+            "temperature": float(record["temperature"]),
+            "ph": float(record["ph"]),
+            "methane": float(record["methane"]),
+            "status": readings_store.codes["status"].values[record["status"]],
+            "source": readings_store.codes["source"].values[record["source"]]
         }
+        for record in records
+    ]
+
+def simulate_sensor_data(source):
+    return {
+        "temperature": random.uniform(30, 45),
+        "ph": random.uniform(6.0, 8.5),
+        "methane": random.uniform(80, 350),
+        "source": source
+    }
 
 @st.cache_resource
 def init_client():
@@ -278,56 +269,12 @@ Selalu gunakan:
 
 Ingat: User adalah orang awam yang ingin sistemnya bekerja dengan baik, bukan ahli teknis."""
 
-OPTIMAL_RANGES = {
-    "temperature": {"min": 35, "max": 40, "critical_min": 25, "critical_max": 50},
-    "ph": {"min": 6.8, "max": 7.2, "critical_min": 6.0, "critical_max": 8.5},
-    "methane": {"min": 150, "max": 300, "critical_min": 50, "critical_max": 500}
-}
+status_engine = StatusEngine(OPTIMAL_RANGES)
 
 def analyze_sensor_data(temp, ph, methane):
-    issues = []
-    status = "optimal"
-    
-    if temp < OPTIMAL_RANGES["temperature"]["critical_min"] or temp > OPTIMAL_RANGES["temperature"]["critical_max"]:
-        issues.append(f"🚨 BAHAYA: Suhu {temp:.1f}°C terlalu ekstrem!")
-        status = "critical"
-    elif temp < OPTIMAL_RANGES["temperature"]["min"] or temp > OPTIMAL_RANGES["temperature"]["max"]:
-        if temp < OPTIMAL_RANGES["temperature"]["min"]:
-            issues.append(f"⚠️ PERHATIAN: Suhu {temp:.1f}°C terlalu dingin")
-        else:
-            issues.append(f"⚠️ PERHATIAN: Suhu {temp:.1f}°C terlalu panas")
-        if status != "critical":
-            status = "warning"
-    
-    if ph < OPTIMAL_RANGES["ph"]["critical_min"] or ph > OPTIMAL_RANGES["ph"]["critical_max"]:
-        if ph < OPTIMAL_RANGES["ph"]["critical_min"]:
-            issues.append(f"🚨 BAHAYA: pH {ph:.1f} terlalu asam!")
-        else:
-            issues.append(f"🚨 BAHAYA: pH {ph:.1f} terlalu basa!")
-        status = "critical"
-    elif ph < OPTIMAL_RANGES["ph"]["min"] or ph > OPTIMAL_RANGES["ph"]["max"]:
-        if ph < OPTIMAL_RANGES["ph"]["min"]:
-            issues.append(f"⚠️ PERHATIAN: pH {ph:.1f} agak asam")
-        else:
-            issues.append(f"⚠️ PERHATIAN: pH {ph:.1f} agak basa")
-        if status != "critical":
-            status = "warning"
-    
-    if methane < OPTIMAL_RANGES["methane"]["critical_min"]:
-        issues.append(f"🚨 BAHAYA: Gas metana {methane:.0f} ppm sangat rendah!")
-        status = "critical"
-    elif methane > OPTIMAL_RANGES["methane"]["critical_max"]:
-        issues.append(f"🚨 BAHAYA: Gas metana {methane:.0f} ppm terlalu tinggi!")
-        status = "critical"
-    elif methane < OPTIMAL_RANGES["methane"]["min"]:
-        issues.append(f"⚠️ PERHATIAN: Produksi gas {methane:.0f} ppm masih kurang")
-        if status != "critical":
-            status = "warning"
-    
-    return status, issues
+    return status_engine.analyze(temp, ph, methane)
 
-def get_ai_guidance(temp, ph, methane, status, issues, user_question=""):
-    
+def build_guidance_prompt(temp, ph, methane, status, issues, user_question=""):
     sensor_context = f"""
 DATA SISTEM BIOGAS ANDA SAAT INI:
 🌡️ Suhu dalam tangki: {temp:.1f}°C
@@ -349,155 +296,426 @@ YANG PERLU DIPERHATIKAN SEKARANG:
     else:
         prompt = f"{sensor_context}\n\nTolong jelaskan kondisi sistem biogas saya sekarang dan apa yang harus saya lakukan. Gunakan bahasa yang mudah dipahami."
     
-    try:
-        response = client.chat.completions.create(
+    return prompt
+
+@st.cache_resource
+def init_guidance_cache():
+    return GuidanceCache(GUIDANCE_CACHE_TTL)
+
+guidance_cache = init_guidance_cache()
+
+def stream_ai_guidance(temp, ph, methane, status, issues, user_question=""):
+    # Yields the answer as it is generated, for st.write_stream
+    prompt = build_guidance_prompt(temp, ph, methane, status, issues, user_question)
+    
+    def create():
+        return client.chat.completions.create(
             model=deployment,
             messages=[
                 {"role": "system", "content": BIOGAS_EXPERT_PROMPT},
                 {"role": "user", "content": prompt}
             ],
             max_tokens=8192,
-            temperature=0.5
+            temperature=0.5,
+            stream=True
         )
-        return response.choices[0].message.content
-    except Exception as e:
-        return f"Maaf, ada gangguan sistem. Coba lagi nanti ya! 😅\nError: {str(e)}"
-
-st.title("🏭 Dashboard Biogas Bioserde")
-st.markdown("💚 **Monitor biogas Anda dengan mudah dan dapatkan panduan AI yang ramah!**")
-
-if "sensor_history" not in st.session_state:
-    st.session_state.sensor_history = []
-if "messages" not in st.session_state:
-    st.session_state.messages = []
-
-with st.container():
-    col1, col2 = st.columns([3, 1])
-    
-    with col1:
-        if arduino_connection:
-            st.success("🔗 **Terhubung ke Arduino COM5** - Data real-time dari sensor")
-            if iot_client:
-                st.success("☁️ **Terhubung ke Azure IoT Hub** - Data tersinkron ke cloud")
-            else:
-                st.warning("⚠️ **Arduino OK, IoT Hub gagal** - Data hanya lokal")
-        else:
-            st.warning("⚠️ **Tidak terhubung ke Arduino** - Menggunakan data simulasi")
     
-    with col2:
-        st.subheader("🔄 Kontrol Data")
-        auto_refresh = st.checkbox("Auto Refresh (5 detik)", value=True)
-        if st.button("🔄 Perbarui Data"):
-            st.rerun()
-
-sensor_data = read_arduino_data()
-suhu = sensor_data["temperature"]
-ph = sensor_data["ph"]
-gas_level = sensor_data["methane"]
-data_source = sensor_data["source"]
-
-if data_source == "arduino":
-    st.info("📡 **Data dari Arduino**: LM35 + MQ-2 sensor aktif")
-elif data_source == "simulation":
-    st.info("🎮 **Mode Simulasi**: Arduino tidak terhubung")
-
-status, issues = analyze_sensor_data(suhu, ph, gas_level)
-
-iot_success = send_to_iot_hub(sensor_data, status, issues)
-
-current_reading = {
-    "timestamp": time.time(),
-    "temperature": suhu,
-    "ph": ph, 
-    "methane": gas_level,
-    "status": status,
-    "source": data_source
-}
-st.session_state.sensor_history.append(current_reading)
-
-if len(st.session_state.sensor_history) > 50:
-    st.session_state.sensor_history = st.session_state.sensor_history[-50:]
-
-st.subheader("📊 Monitor Real-time")
-col1, col2, col3, col4 = st.columns(4)
+    try:
+        yield from stream_answer(guidance_cache, GuidanceCache.key(status, issues, user_question), create)
+    except Exception as e:
+        yield f"Maaf, ada gangguan sistem. Coba lagi nanti ya! 😅\nError: {str(e)}"
 
-status_colors = {"optimal": "🟢", "warning": "🟡", "critical": "🔴"}
-status_messages = {
-    "optimal": "Baik", 
-    "warning": "Perhatian", 
-    "critical": "Tindakan"
-}
+def get_ai_guidance(temp, ph, methane, status, issues, user_question=""):
+    return "".join(stream_ai_guidance(temp, ph, methane, status, issues, user_question))
+
+SUMMARY_FIELDS = ("temperature", "ph", "methane")
+
+class SensorCollector:
+    # One per process (see init_collector): reads the serial port
+    # continuously on a background thread, analyzes and uplinks every reading
+    # exactly once, and keeps the latest reading and a shared history that
+    # all browser sessions render from
+
+    def __init__(self, arduino, feed_address=None):
+        self.arduino = arduino
+        self.feed = FeedAcquisition(self.feed_reading, feed_address) if feed_address else None
+        # Framed binary or legacy CSV, whichever the sketch was built with
+        self.decoder = FrameDecoder(SERIAL_PROTOCOL)
+        self.lock = threading.Lock()
+        self.ready = threading.Event()
+        self.latest = None
+        self.history = deque(maxlen=HISTORY_SIZE)
+        # Running sums over the history window for the sidebar summary
+        self.totals = dict.fromkeys(SUMMARY_FIELDS, 0.0)
+        # Readings appended since start, lets sessions fetch only new ones
+        self.appended = 0
+        for reading in load_sensor_history():
+            self._append(reading)
+        self.thread = threading.Thread(target=self.run, name="sensor-collector", daemon=True)
+    
+    def start(self):
+        self.thread.start()
+    
+    def feed_reading(self, reading):
+        if not all(field in reading for field in ("temperature", "ph", "gas_level")):
+            return None
+        return sensor_reading(reading["temperature"], reading["ph"], reading["gas_level"])
+    
+    def run_feed(self):
+        self.feed.start()
+        last_simulated = 0.0
+        while True:
+            try:
+                sensor_data = self.feed.readings.get(timeout=1.0)
+            except queue.Empty:
+                if not self.feed.connected and time.monotonic() - last_simulated >= SAMPLE_INTERVAL:
+                    self.record(simulate_sensor_data("simulation"))
+                    metrics.SIMULATION_FALLBACKS.labels("dashboard").inc()
+                    last_simulated = time.monotonic()
+                continue
+            self.record(sensor_data)
+    
+    def connected(self):
+        if self.feed is not None:
+            return self.feed.connected
+        return self.arduino is not None
+    
+    def run(self):
+        if self.feed is not None:
+            self.run_feed()
+            return
+        
+        while True:
+            if self.arduino is None:
+                self.record(simulate_sensor_data("simulation"))
+                metrics.SIMULATION_FALLBACKS.labels("dashboard").inc()
+                time.sleep(SAMPLE_INTERVAL)
+                continue
+            
+            try:
+                readings = read_available(self.arduino, self.decoder)
+            except Exception as e:
+                print(f"❌ Error reading Arduino: {e}")
+                self.record(simulate_sensor_data("error_fallback"))
+                metrics.SIMULATION_FALLBACKS.labels("dashboard").inc()
+                time.sleep(SAMPLE_INTERVAL)
+                continue
+            
+            for temp, ph, methane in zip(readings["temperature"].tolist(), readings["ph"].tolist(), readings["gas_level"].tolist()):
+                sensor_data = sensor_reading(temp, ph, methane)
+                if sensor_data is not None:
+                    self.record(sensor_data)
+    
+    def record(self, sensor_data):
+        status, issues = analyze_sensor_data(sensor_data["temperature"], sensor_data["ph"], sensor_data["methane"])
+        send_to_iot_hub(sensor_data, status, issues)
+        
+        reading = {
+            "timestamp": time.time(),
+            "temperature": sensor_data["temperature"],
+            "ph": sensor_data["ph"],
+            "methane": sensor_data["methane"],
+            "status": status,
+            "source": sensor_data["source"]
+        }
+        
+        rollups.add(reading["timestamp"], reading)
+        if readings_store is not None:
+            try:
+                readings_store.append(reading)
+            except Exception as e:
+                print(f"⚠️ Gagal menyimpan data sensor: {e}")
+        
+        with self.lock:
+            self.latest = (sensor_data, status, issues)
+            self._append(reading)
+        self.ready.set()
+    
+    def _append(self, reading):
+        if len(self.history) == self.history.maxlen:
+            evicted = self.history[0]
+            for field in SUMMARY_FIELDS:
+                self.totals[field] -= evicted[field]
+        self.history.append(reading)
+        for field in SUMMARY_FIELDS:
+            self.totals[field] += reading[field]
+        self.appended += 1
+    
+    def snapshot(self):
+        with self.lock:
+            return self.latest, list(self.history)
+    
+    def readings_since(self, appended):
+        # Readings appended after the caller's counter, capped at the window
+        with self.lock:
+            new = min(self.appended - appended, len(self.history))
+            return self.appended, list(islice(self.history, len(self.history) - new, None))
+    
+    def averages(self):
+        with self.lock:
+            if not self.history:
+                return None
+            return {field: self.totals[field] / len(self.history) for field in SUMMARY_FIELDS}
 
-with col1:
-    st.metric(
-        f"{status_colors[status]} Status",
-        status_messages[status],
-        f"{len(issues)}" if issues else "OK"
-    )
+@st.cache_resource
+def init_collector():
+    collector = SensorCollector(arduino_connection, FEED_ADDRESS)
+    collector.start()
+    return collector
 
-with col2:
-    delta_temp = suhu - 37.5
-    color = "normal"
-    if abs(delta_temp) > 5:
-        color = "inverse"
-    st.metric("🌡️ Suhu", f"{suhu:.1f}°C", f"{delta_temp:+.1f}°C", delta_color=color)
+collector = init_collector()
 
-with col3:
-    delta_ph = ph - 7.0
-    color = "normal"
-    if abs(delta_ph) > 0.5:
-        color = "inverse"
-    st.metric("⚗️ pH", f"{ph:.1f}", f"{delta_ph:+.1f}", delta_color=color)
+@st.cache_resource
+def init_metrics():
+    # Gauges are read at scrape time; the registry lives as long as the
+    # process, so this runs once and not on every rerun
+    metrics.QUEUE_DEPTH.labels("iot_hub").set_function(lambda: iot_sender.health()["queue_depth"])
+    metrics.HISTORY_SIZE.labels("dashboard").set_function(lambda: len(collector.history))
+    if not METRICS_PORT:
+        return None
+    try:
+        server = metrics.serve(int(METRICS_PORT))
+        print(f"📈 Metrics tersedia di http://localhost:{METRICS_PORT}/metrics")
+        return server
+    except Exception as e:
+        print(f"⚠️ Gagal membuka server metrics: {e}")
+        return None
 
-with col4:
-    delta_gas = gas_level - 225
-    color = "normal"
-    if delta_gas < -50:
-        color = "inverse"
-    st.metric("🧪 Gas", f"{gas_level:.0f} ppm", f"{delta_gas:+.0f}", delta_color=color)
-
-if issues:
-    for issue in issues:
-        if "BAHAYA" in issue:
-            st.error(issue)
-        else:
-            st.warning(issue)
-else:
-    st.success("✅ Semua parameter dalam kondisi yang baik!")
+init_metrics()
 
-if st.session_state.sensor_history:
-    st.subheader("📈 Grafik Monitoring")
-    df = pd.DataFrame(st.session_state.sensor_history)
-    
+@st.cache_resource
+def chart_skeleton():
+    # Subplots, styling and the ideal-range lines never change; built once
+    # per process as a plain dict so each refresh only fills in the traces
     fig = make_subplots(
         rows=3, cols=1,
         subplot_titles=('🌡️ Suhu (°C)', '⚗️ Tingkat pH', '🧪 Gas Metana (ppm)'),
         vertical_spacing=0.08
     )
     
-    fig.add_trace(
-        go.Scatter(x=df.index, y=df['temperature'], name='Suhu', line=dict(color='red', width=3)),
-        row=1, col=1
-    )
+    fig.add_trace(go.Scatter(x=[], y=[], name='Suhu', line=dict(color='red', width=3)), row=1, col=1)
     fig.add_hline(y=35, line_dash="dash", line_color="green", annotation_text="Min Ideal", row=1, col=1)
     fig.add_hline(y=40, line_dash="dash", line_color="green", annotation_text="Max Ideal", row=1, col=1)
     
-    fig.add_trace(
-        go.Scatter(x=df.index, y=df['ph'], name='pH', line=dict(color='blue', width=3)),
-        row=2, col=1
-    )
+    fig.add_trace(go.Scatter(x=[], y=[], name='pH', line=dict(color='blue', width=3)), row=2, col=1)
     fig.add_hline(y=6.8, line_dash="dash", line_color="green", annotation_text="Min Ideal", row=2, col=1)
     fig.add_hline(y=7.2, line_dash="dash", line_color="green", annotation_text="Max Ideal", row=2, col=1)
     
-    fig.add_trace(
-        go.Scatter(x=df.index, y=df['methane'], name='Metana', line=dict(color='orange', width=3)),
-        row=3, col=1
-    )
+    fig.add_trace(go.Scatter(x=[], y=[], name='Metana', line=dict(color='orange', width=3)), row=3, col=1)
     fig.add_hline(y=150, line_dash="dash", line_color="green", annotation_text="Min Bagus", row=3, col=1)
     fig.add_hline(y=300, line_dash="dash", line_color="green", annotation_text="Max Bagus", row=3, col=1)
     
     fig.update_layout(height=600, showlegend=False, title_text="Monitor Data Sensor Real-time")
-    st.plotly_chart(fig, use_container_width=True)
+    return fig.to_dict()
+
+def current_reading():
+    # Readings come from the shared collector; a fresh process waits briefly
+    # for its first reading rather than rendering placeholder values
+    collector.ready.wait(COLLECTOR_WAIT)
+    latest, _ = collector.snapshot()
+    if latest is not None:
+        return latest
+    
+    sensor_data = {
+        "temperature": 35.0,
+        "ph": 7.0,
+        "methane": 200.0,
+        "source": "default"
+    }
+    status, issues = analyze_sensor_data(sensor_data["temperature"], sensor_data["ph"], sensor_data["methane"])
+    return sensor_data, status, issues
+
+def chart_points():
+    # Per-session copy of the chart series, extended with only the readings
+    # that arrived since this session's last refresh
+    if "chart_points" not in st.session_state:
+        st.session_state.chart_points = deque(maxlen=HISTORY_SIZE)
+        st.session_state.chart_appended = 0
+    
+    appended, new_readings = collector.readings_since(st.session_state.chart_appended)
+    st.session_state.chart_appended = appended
+    st.session_state.chart_points.extend(
+        (reading["temperature"], reading["ph"], reading["methane"]) for reading in new_readings
+    )
+    return st.session_state.chart_points
+
+status_colors = {"optimal": "🟢", "warning": "🟡", "critical": "🔴"}
+status_messages = {
+    "optimal": "Baik", 
+    "warning": "Perhatian", 
+    "critical": "Tindakan"
+}
+
+def render_connection_status():
+    if FEED_ADDRESS and collector.connected():
+        st.success(f"🔗 **Terhubung ke feed sensor** ({FEED_ADDRESS}) - Data real-time dari sensor")
+    elif collector.connected():
+        st.success("🔗 **Terhubung ke Arduino COM5** - Data real-time dari sensor")
+    else:
+        st.warning("⚠️ **Tidak terhubung ke Arduino** - Menggunakan data simulasi")
+    
+    iot_health = iot_sender.health()
+    if iot_health["connected"]:
+        st.success(f"☁️ **Terhubung ke Azure IoT Hub** - Data tersinkron ke cloud (antrian: {iot_health['queue_depth']}, tertunda {iot_health['lag']:.0f} detik)")
+    elif iot_health["retry_in"] is not None:
+        st.warning(f"⚠️ **IoT Hub gagal** - Data disimpan lokal, {iot_health['queue_depth']} pesan menunggu, coba lagi dalam {iot_health['retry_in']:.0f} detik")
+    else:
+        st.info(f"🌐 **Menghubungkan ke Azure IoT Hub...** - {iot_health['queue_depth']} pesan menunggu")
+
+def render_monitor():
+    sensor_data, status, issues = current_reading()
+    suhu = sensor_data["temperature"]
+    ph = sensor_data["ph"]
+    gas_level = sensor_data["methane"]
+    data_source = sensor_data["source"]
+    
+    if data_source == "arduino":
+        st.info("📡 **Data dari Arduino**: LM35 + MQ-2 sensor aktif")
+    elif data_source == "simulation":
+        st.info("🎮 **Mode Simulasi**: Arduino tidak terhubung")
+    
+    st.subheader("📊 Monitor Real-time")
+    col1, col2, col3, col4 = st.columns(4)
+    
+    with col1:
+        st.metric(
+            f"{status_colors[status]} Status",
+            status_messages[status],
+            f"{len(issues)}" if issues else "OK"
+        )
+    
+    with col2:
+        delta_temp = suhu - 37.5
+        color = "normal"
+        if abs(delta_temp) > 5:
+            color = "inverse"
+        st.metric("🌡️ Suhu", f"{suhu:.1f}°C", f"{delta_temp:+.1f}°C", delta_color=color)
+    
+    with col3:
+        delta_ph = ph - 7.0
+        color = "normal"
+        if abs(delta_ph) > 0.5:
+            color = "inverse"
+        st.metric("⚗️ pH", f"{ph:.1f}", f"{delta_ph:+.1f}", delta_color=color)
+    
+    with col4:
+        delta_gas = gas_level - 225
+        color = "normal"
+        if delta_gas < -50:
+            color = "inverse"
+        st.metric("🧪 Gas", f"{gas_level:.0f} ppm", f"{delta_gas:+.0f}", delta_color=color)
+    
+    if issues:
+        for issue in issues:
+            if "BAHAYA" in issue:
+                st.error(issue)
+            else:
+                st.warning(issue)
+    else:
+        st.success("✅ Semua parameter dalam kondisi yang baik!")
+    
+    points = chart_points()
+    if points:
+        st.subheader("📈 Grafik Monitoring")
+        # At most HISTORY_SIZE points; longer ranges are charted from the
+        # rollups in the trend view
+        x = np.arange(len(points))
+        series = np.array(points).T
+        
+        skeleton = chart_skeleton()
+        fig = {
+            "data": [dict(trace, x=x.tolist(), y=values.tolist()) for trace, values in zip(skeleton["data"], series)],
+            "layout": skeleton["layout"]
+        }
+        st.plotly_chart(fig, use_container_width=True)
+
+def render_summary():
+    averages = collector.averages()
+    if averages is None:
+        return
+    
+    avg_temp = averages["temperature"]
+    avg_ph = averages["ph"]
+    avg_methane = averages["methane"]
+    
+    temp_status = "🟢 Bagus" if 35 <= avg_temp <= 40 else "🟡 Cukup" if 30 <= avg_temp <= 45 else "🔴 Perlu Diperbaiki"
+    ph_status = "🟢 Bagus" if 6.8 <= avg_ph <= 7.2 else "🟡 Cukup" if 6.0 <= avg_ph <= 8.5 else "🔴 Perlu Diperbaiki"
+    gas_status = "🟢 Bagus" if 150 <= avg_methane <= 300 else "🟡 Cukup" if 80 <= avg_methane <= 350 else "🔴 Perlu Diperbaiki"
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        st.write("**Suhu Rata-rata:**")
+        st.write(f"{avg_temp:.1f}°C")
+        st.caption(temp_status)
+    with col2:
+        st.write("**pH Rata-rata:**")
+        st.write(f"{avg_ph:.1f}")
+        st.caption(ph_status)
+    
+    st.write("**Gas Rata-rata:**")
+    st.write(f"{avg_methane:.0f} ppm")
+    st.caption(gas_status)
+
+st.title("🏭 Dashboard Biogas Bioserde")
+st.markdown("💚 **Monitor biogas Anda dengan mudah dan dapatkan panduan AI yang ramah!**")
+
+if "messages" not in st.session_state:
+    st.session_state.messages = []
+
+with st.container():
+    col1, col2 = st.columns([3, 1])
+    
+    with col2:
+        st.subheader("🔄 Kontrol Data")
+        auto_refresh = st.checkbox(f"Auto Refresh ({REFRESH_INTERVAL} detik)", value=True)
+        if st.button("🔄 Perbarui Data"):
+            st.rerun()
+    
+    # Refresh-driven parts rerun on their own as fragments; the rest of the
+    # page (chat, sidebar guides) only reruns on interaction
+    refresh_every = REFRESH_INTERVAL if auto_refresh else None
+    
+    with col1:
+        st.fragment(render_connection_status, run_every=refresh_every)()
+
+st.fragment(render_monitor, run_every=refresh_every)()
+
+sensor_data, status, issues = current_reading()
+suhu = sensor_data["temperature"]
+ph = sensor_data["ph"]
+gas_level = sensor_data["methane"]
+
+with st.expander("📅 Tren Jangka Panjang"):
+    trend_range = st.selectbox("Rentang waktu", list(TREND_RANGES.keys()))
+    resolution, span = TREND_RANGES[trend_range]
+    buckets = rollups.query(resolution, since=time.time() - span)
+    
+    if buckets:
+        trend_fig = make_subplots(
+            rows=3, cols=1,
+            subplot_titles=('🌡️ Suhu (°C)', '⚗️ Tingkat pH', '🧪 Gas Metana (ppm)'),
+            vertical_spacing=0.08
+        )
+        for row, (field, color) in enumerate([('temperature', 'red'), ('ph', 'blue'), ('methane', 'orange')], start=1):
+            points = [(bucket['timestamp'], bucket[field]) for bucket in buckets if field in bucket]
+            times = [timestamp for timestamp, _ in points]
+            # Min-max band with the bucket mean on top
+            trend_fig.add_trace(
+                go.Scatter(x=times, y=[stats['max'] for _, stats in points], line=dict(width=0), hoverinfo='skip'),
+                row=row, col=1
+            )
+            trend_fig.add_trace(
+                go.Scatter(x=times, y=[stats['min'] for _, stats in points], line=dict(width=0), fill='tonexty', hoverinfo='skip'),
+                row=row, col=1
+            )
+            trend_fig.add_trace(
+                go.Scatter(x=times, y=[stats['mean'] for _, stats in points], line=dict(color=color, width=2)),
+                row=row, col=1
+            )
+        trend_fig.update_layout(height=600, showlegend=False, title_text=f"Rata-rata per {resolution} ({trend_range})")
+        st.plotly_chart(trend_fig, use_container_width=True)
+    else:
+        st.info("Belum ada data tersimpan untuk rentang ini")
 
 st.divider()
 st.subheader("🤖 Asisten AI Biogas - Tanya Apa Saja!")
@@ -517,17 +735,20 @@ with col4:
     if st.button("❓ Jelaskan Dong"):
         user_question = "Tolong jelaskan dengan sederhana apa arti angka-angka ini dan bagaimana cara bacanya."
 
+for message in st.session_state.messages:
+    with st.chat_message(message["role"]):
+        st.markdown(message["content"])
+
 if status != "optimal" and not st.session_state.messages:
-    auto_guidance = get_ai_guidance(suhu, ph, gas_level, status, issues)
+    warning_header = f"**🚨 PERINGATAN OTOMATIS - {status_messages[status].upper()}!**"
+    with st.chat_message("assistant"):
+        st.markdown(warning_header)
+        auto_guidance = st.write_stream(stream_ai_guidance(suhu, ph, gas_level, status, issues))
     st.session_state.messages.append({
         "role": "assistant", 
-        "content": f"**🚨 PERINGATAN OTOMATIS - {status_messages[status].upper()}!**\n\n{auto_guidance}"
+        "content": f"{warning_header}\n\n{auto_guidance}"
     })
 
-for message in st.session_state.messages:
-    with st.chat_message(message["role"]):
-        st.markdown(message["content"])
-
 if prompt := st.chat_input("Tanya apa saja tentang biogas Anda... (misal: 'Kenapa gas sedikit?' atau 'Aman nggak nih?')"):
     user_question = prompt
 
@@ -537,9 +758,7 @@ if 'user_question' in locals():
         st.markdown(user_question)
     
     with st.chat_message("assistant"):
-        with st.spinner("Asisten AI sedang menganalisis data Anda... 🤔"):
-            ai_response = get_ai_guidance(suhu, ph, gas_level, status, issues, user_question)
-            st.markdown(ai_response)
+        ai_response = st.write_stream(stream_ai_guidance(suhu, ph, gas_level, status, issues, user_question))
     
     st.session_state.messages.append({"role": "assistant", "content": ai_response})
 
@@ -562,30 +781,7 @@ with st.sidebar:
     """)
     
     st.subheader("📊 Ringkasan Hari Ini")
-    if st.session_state.sensor_history:
-        df = pd.DataFrame(st.session_state.sensor_history)
-        
-        avg_temp = df['temperature'].mean()
-        avg_ph = df['ph'].mean()
-        avg_methane = df['methane'].mean()
-        
-        temp_status = "🟢 Bagus" if 35 <= avg_temp <= 40 else "🟡 Cukup" if 30 <= avg_temp <= 45 else "🔴 Perlu Diperbaiki"
-        ph_status = "🟢 Bagus" if 6.8 <= avg_ph <= 7.2 else "🟡 Cukup" if 6.0 <= avg_ph <= 8.5 else "🔴 Perlu Diperbaiki"
-        gas_status = "🟢 Bagus" if 150 <= avg_methane <= 300 else "🟡 Cukup" if 80 <= avg_methane <= 350 else "🔴 Perlu Diperbaiki"
-        
-        col1, col2 = st.columns(2)
-        with col1:
-            st.write("**Suhu Rata-rata:**")
-            st.write(f"{avg_temp:.1f}°C")
-            st.caption(temp_status)
-        with col2:
-            st.write("**pH Rata-rata:**")
-            st.write(f"{avg_ph:.1f}")
-            st.caption(ph_status)
-        
-        st.write("**Gas Rata-rata:**")
-        st.write(f"{avg_methane:.0f} ppm")
-        st.caption(gas_status)
+    st.fragment(render_summary, run_every=refresh_every)()
     
     st.subheader("🔧 Aksi Cepat")
     if st.button("🗑️ Bersihkan Chat"):
@@ -593,8 +789,9 @@ with st.sidebar:
         st.rerun()
     
     if st.button("📤 Unduh Data"):
-        if st.session_state.sensor_history:
-            df = pd.DataFrame(st.session_state.sensor_history)
+        _, sensor_history = collector.snapshot()
+        if sensor_history:
+            df = pd.DataFrame(sensor_history)
             csv = df.to_csv(index=False)
             st.download_button(
                 label="💾 Download Data CSV",
@@ -640,25 +837,6 @@ with st.sidebar:
     🔴 Ada suara aneh dari sistem
     """)
 
-# if auto_refresh:
-#     placeholder = st.empty()
-#     for i in range(5, 0, -1):
-#         placeholder.info(f"🔄 Auto refresh dalam {i} detik...")
-#         time.sleep(1)
-#     placeholder.empty()
-#     st.rerun()
-if auto_refresh:
-    if "refresh_timer" not in st.session_state:
-        st.session_state.refresh_timer = time.time()
-    
-    elapsed = time.time() - st.session_state.refresh_timer
-    if elapsed >= 5:
-        st.session_state.refresh_timer = time.time()
-        st.rerun()
-    
-    remaining = max(0, 5 - elapsed)
-    st.info(f"🔄 Auto refresh dalam {remaining:.1f} detik")
-
 st.divider()
 st.markdown("""
 <div style='text-align: center; color: gray;'>
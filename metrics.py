@@ -0,0 +1,315 @@
+import bisect
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Minimal Prometheus-style metrics: counters, gauges and histograms kept in a
+# process-wide REGISTRY and rendered in the text exposition format. app.py
+# serves it on /metrics; main.py and azure_ml_iot.py call serve() to expose
+# it on METRICS_PORT. The metrics the services share are defined at the
+# bottom so every process reports them under the same names.
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds, from a parsed line (tens of µs) up to a slow Azure ML call
+LATENCY_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if value == -math.inf:
+        return '-Inf'
+    if value != value:
+        return 'NaN'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+
+    def register(self, metric):
+        with self.lock:
+            if metric.name in self.metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self.metrics[metric.name] = metric
+
+    def get(self, name):
+        with self.lock:
+            return self.metrics.get(name)
+
+    def render(self):
+        with self.lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+class _CounterValue:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount=1):
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        with self.lock:
+            self.value += amount
+
+    def get(self):
+        with self.lock:
+            return self.value
+
+
+class _GaugeValue:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.value = 0.0
+        self.function = None
+
+    def set(self, value):
+        with self.lock:
+            self.value = float(value)
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def set_function(self, function):
+        # Read at scrape time instead of being pushed, for sizes that are
+        # cheap to ask for (queue depth, buffer length)
+        with self.lock:
+            self.function = function
+
+    def get(self):
+        with self.lock:
+            function = self.function
+            value = self.value
+        if function is None:
+            return value
+        try:
+            return float(function())
+        except Exception:
+            return math.nan
+
+
+class _Timer:
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+class _HistogramValue:
+    def __init__(self, buckets):
+        self.lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def time(self):
+        return _Timer(self)
+
+    def get(self):
+        with self.lock:
+            return list(self.counts), self.sum
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.children = {}
+        if not self.labelnames:
+            self.children[()] = self._new_value()
+        if registry is not None:
+            registry.register(self)
+
+    def _new_value(self):
+        raise NotImplementedError
+
+    def labels(self, *values, **labels):
+        if labels:
+            values = tuple(labels[name] for name in self.labelnames)
+        values = tuple(str(value) for value in values)
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        with self.lock:
+            child = self.children.get(values)
+            if child is None:
+                child = self.children[values] = self._new_value()
+            return child
+
+    def _unlabelled(self):
+        if self.labelnames:
+            raise ValueError(f"{self.name} needs labels {self.labelnames}")
+        return self.children[()]
+
+    def _items(self):
+        with self.lock:
+            return sorted(self.children.items())
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def _new_value(self):
+        return _CounterValue()
+
+    def inc(self, amount=1):
+        self._unlabelled().inc(amount)
+
+    def samples(self):
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.get())}"
+                for values, child in self._items()]
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def _new_value(self):
+        return _GaugeValue()
+
+    def set(self, value):
+        self._unlabelled().set(value)
+
+    def inc(self, amount=1):
+        self._unlabelled().inc(amount)
+
+    def dec(self, amount=1):
+        self._unlabelled().dec(amount)
+
+    def set_function(self, function):
+        self._unlabelled().set_function(function)
+
+    def samples(self):
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.get())}"
+                for values, child in self._items()]
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_value(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self._unlabelled().observe(value)
+
+    def time(self):
+        return self._unlabelled().time()
+
+    def samples(self):
+        samples = []
+        for values, child in self._items():
+            counts, total = child.get()
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, values, [('le', _format_value(bound))])
+                samples.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, values)
+            samples.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            samples.append(f"{self.name}_count{labels} {cumulative}")
+        return samples
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        payload = self.registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port, host='0.0.0.0', registry=REGISTRY):
+    # /metrics on its own port, for processes without a web server of their own
+    handler = type('RegistryMetricsHandler', (MetricsHandler,), {'registry': registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, name=f"metrics-{port}", daemon=True).start()
+    return server
+
+
+# Shared by app.py, main.py, azure_ml_iot.py and the modules they use
+SERIAL_READ_SECONDS = Histogram(
+    'bioserde_serial_read_seconds', "Time spent in serial port reads that returned data", ['device'])
+PARSE_SECONDS = Histogram(
+    'bioserde_parse_seconds', "Time to parse sensor data into readings", ['format'])
+PREDICTION_SECONDS = Histogram(
+    'bioserde_prediction_seconds', "Anomaly prediction latency", ['model'])
+HTTP_REQUEST_SECONDS = Histogram(
+    'bioserde_http_request_seconds', "Flask handler latency", ['method', 'endpoint', 'status'])
+MALFORMED_LINES = Counter(
+    'bioserde_malformed_lines_total', "Sensor lines or frames that could not be parsed", ['source'])
+SIMULATION_FALLBACKS = Counter(
+    'bioserde_simulation_fallbacks_total', "Readings simulated because no sensor data was available", ['component'])
+IOT_SEND_FAILURES = Counter(
+    'bioserde_iot_send_failures_total', "Failed IoT Hub connects and sends", ['component'])
+AZURE_ML_FALLBACKS = Counter(
+    'bioserde_azure_ml_fallbacks_total', "Predictions answered locally because Azure ML failed", ['reason'])
+PREDICTION_DISAGREEMENTS = Counter(
+    'bioserde_prediction_disagreements_total', "Readings where the local model and Azure ML disagreed", ['field'])
+QUEUE_DEPTH = Gauge(
+    'bioserde_queue_depth', "Items waiting in an in-process queue", ['queue'])
+HISTORY_SIZE = Gauge(
+    'bioserde_history_size', "Readings held in an in-memory history buffer", ['buffer'])
@@ -0,0 +1,107 @@
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Local stand-in for the Azure OpenAI chat completions endpoint, for trying
+# the dashboard's AI assistant without credentials or network access:
+#   python openai_standin.py 8765
+#   ENDPOINT_URL=http://127.0.0.1:8765 DEPLOYMENT_NAME=standin AZURE_API_KEY=x streamlit run main.py
+
+ANSWER = "🔍 Ini jawaban uji dari server lokal. Kondisi biogas Anda sedang diperiksa, silakan cek suhu, pH dan gas secara berkala. 👍"
+# Delay before the first token and between tokens, to make streaming visible
+FIRST_TOKEN_DELAY = 0.5
+TOKEN_DELAY = 0.05
+
+stats = {"requests": 0, "streamed": 0}
+stats_lock = threading.Lock()
+
+
+def completion_chunk(content=None, finish_reason=None):
+    delta = {"role": "assistant", "content": content} if content is not None else {}
+    return {
+        "id": "chatcmpl-standin",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": "standin",
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+    }
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if not self.path.split("?")[0].endswith("/chat/completions"):
+            self.send_error(404)
+            return
+
+        stream = body.get("stream", False)
+        with stats_lock:
+            stats["requests"] += 1
+            stats["streamed"] += bool(stream)
+
+        time.sleep(FIRST_TOKEN_DELAY)
+        if stream:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            # Azure sends a content-filter chunk without choices first
+            chunks = [{"id": "", "object": "", "created": 0, "model": "", "choices": []}]
+            chunks += [completion_chunk(word + " ") for word in ANSWER.split(" ")]
+            chunks.append(completion_chunk(finish_reason="stop"))
+            for chunk in chunks:
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+                time.sleep(TOKEN_DELAY)
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.close_connection = True
+            return
+
+        payload = json.dumps({
+            "id": "chatcmpl-standin",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": "standin",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": ANSWER}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        # Request counters, to check which answers were served from cache
+        with stats_lock:
+            payload = json.dumps(stats).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port=8765, host="127.0.0.1"):
+    server = ThreadingHTTPServer((host, port), StandinHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8765
+    server = serve(port)
+    print(f"🧪 OpenAI stand-in listening on http://127.0.0.1:{port}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
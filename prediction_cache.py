@@ -0,0 +1,146 @@
+import logging
+import os
+import threading
+import time
+import numpy as np
+from collections import OrderedDict
+from anomaly_scoring import score_batch, slim_artefact_path
+
+logger = logging.getLogger(__name__)
+
+
+class PredictionCache:
+    # LRU cache of model outputs. With the compiled evaluator, rows are keyed
+    # on the split interval each feature falls into (see
+    # CompiledModel.split_intervals), so any two rows sharing a key get the
+    # same answer from the model and a hit is exact; otherwise only exact
+    # repeats of a row hit. The model file is re-stat'ed at most every
+    # check_interval seconds; when it changes the model is reloaded through
+    # load_model and the cache is cleared.
+
+    def __init__(self, model_path, load_model, max_size=4096, check_interval=1.0):
+        self.model_path = model_path
+        self.load_model = load_model
+        self.max_size = max_size
+        self.check_interval = check_interval
+
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.generation = 0
+
+        self._artefact = self._stat()
+        self._last_check = time.monotonic()
+        self.model_package, self.compiled_model = load_model(model_path)
+
+    def _stat(self):
+        # The slim export counts too, load_model may prefer it over the pickle
+        artefact = []
+        for path in dict.fromkeys([self.model_path, slim_artefact_path(self.model_path)]):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                if path == self.model_path:
+                    raise
+                continue
+            artefact.append((stat.st_mtime_ns, stat.st_size))
+        return tuple(artefact)
+
+    def _check_artefact(self):
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+
+        try:
+            artefact = self._stat()
+        except OSError:
+            return
+        if artefact == self._artefact:
+            return
+
+        try:
+            model_package, compiled_model = self.load_model(self.model_path)
+        except Exception as e:
+            # Possibly caught mid-write, keep the old model and retry later
+            logger.error(f"Could not reload model from {self.model_path}: {e}")
+            return
+
+        with self.lock:
+            self.model_package, self.compiled_model = model_package, compiled_model
+            self.entries.clear()
+            self.invalidations += 1
+            self.generation += 1
+            self._artefact = artefact
+        logger.info(f"Model artefact {self.model_path} changed, reloaded and cleared prediction cache")
+
+    def score(self, input_data):
+        # Same return shape as anomaly_scoring.score_batch
+        self._check_artefact()
+        with self.lock:
+            model_package, compiled_model = self.model_package, self.compiled_model
+            generation = self.generation
+
+        input_data = np.asarray(input_data, dtype=np.float64)
+        if compiled_model is not None:
+            key_data = compiled_model.split_intervals(input_data)
+        else:
+            key_data = input_data
+        keys = [tuple(row) for row in key_data.tolist()]
+
+        results = [None] * len(keys)
+        missing = {}
+        with self.lock:
+            for index, key in enumerate(keys):
+                cached = self.entries.get(key)
+                if cached is None:
+                    missing.setdefault(key, []).append(index)
+                else:
+                    self.entries.move_to_end(key)
+                    results[index] = cached
+            self.hits += len(keys) - sum(len(indices) for indices in missing.values())
+            self.misses += len(missing)
+
+        if missing:
+            # One vectorized model pass for every distinct missing key
+            rows = [indices[0] for indices in missing.values()]
+            anomaly_scores, cause_ids, causes = score_batch(model_package, input_data[rows], compiled_model)
+
+            with self.lock:
+                for (key, indices), anomaly_score, cause_id, cause in zip(missing.items(), anomaly_scores, cause_ids, causes):
+                    result = (float(anomaly_score), int(cause_id), cause)
+                    for index in indices:
+                        results[index] = result
+                    # Results from a model replaced mid-call are not cached
+                    if generation == self.generation:
+                        self.entries[key] = result
+                while len(self.entries) > self.max_size:
+                    self.entries.popitem(last=False)
+
+        anomaly_scores = np.array([result[0] for result in results], dtype=np.float64)
+        cause_ids = np.array([result[1] for result in results], dtype=int)
+        causes = np.array([result[2] for result in results], dtype=object)
+        return anomaly_scores, cause_ids, causes
+
+    def score_uncached(self, input_data):
+        # Bulk scoring (replays, columnar requests) rarely repeats a row, so
+        # skip the per-row key lookups and score everything in one pass with
+        # the current model
+        self._check_artefact()
+        with self.lock:
+            model_package, compiled_model = self.model_package, self.compiled_model
+        return score_batch(model_package, np.asarray(input_data, dtype=np.float64), compiled_model)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self.entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "invalidations": self.invalidations
+            }
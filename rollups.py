@@ -0,0 +1,166 @@
+import threading
+import numpy as np
+from datetime import datetime
+
+# Bucket width in seconds and how many buckets of each are kept in memory
+RESOLUTIONS = {
+    '1m': (60, 7 * 24 * 60),
+    '15m': (15 * 60, 30 * 24 * 4),
+    '1h': (60 * 60, 365 * 24)
+}
+ROLLUP_FIELDS = ('temperature', 'ph', 'methane', 'biogas_production')
+
+
+class RollupEngine:
+    # Running min/max/sum/count per time bucket and field, updated as each
+    # reading arrives so long-range charts never touch raw points
+
+    def __init__(self, fields=ROLLUP_FIELDS, resolutions=RESOLUTIONS):
+        self.fields = tuple(fields)
+        self.resolutions = dict(resolutions)
+        self.lock = threading.Lock()
+        # resolution -> {bucket start: [[min, max, sum, count] per field]}
+        self.buckets = {name: {} for name in self.resolutions}
+
+    def _bucket(self, name, start):
+        buckets = self.buckets[name]
+        stats = buckets.get(start)
+        if stats is None:
+            stats = [[np.inf, -np.inf, 0.0, 0] for _ in self.fields]
+            buckets[start] = stats
+            _, max_buckets = self.resolutions[name]
+            while len(buckets) > max_buckets:
+                # Buckets are created in time order, the first is the oldest
+                del buckets[next(iter(buckets))]
+        return stats
+
+    def retention(self):
+        # Seconds of history the coarsest resolution holds; older readings
+        # would be evicted as soon as they were added
+        return max(width * max_buckets for width, max_buckets in self.resolutions.values())
+
+    def add(self, timestamp, reading):
+        values = []
+        for index, field in enumerate(self.fields):
+            value = reading.get(field)
+            if value is not None and value == value:
+                values.append((index, float(value)))
+        if not values:
+            return
+
+        with self.lock:
+            for name, (width, _) in self.resolutions.items():
+                stats = self._bucket(name, timestamp - timestamp % width)
+                for index, value in values:
+                    field_stats = stats[index]
+                    if value < field_stats[0]:
+                        field_stats[0] = value
+                    if value > field_stats[1]:
+                        field_stats[1] = value
+                    field_stats[2] += value
+                    field_stats[3] += 1
+
+    def add_many(self, timestamps, columns):
+        # Vectorized backfill, e.g. from the segment store at startup.
+        # columns maps field name to an array aligned with timestamps.
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        if not len(timestamps):
+            return
+
+        with self.lock:
+            for name, (width, _) in self.resolutions.items():
+                starts = timestamps - timestamps % width
+                order = np.argsort(starts, kind='stable')
+                unique_starts, first = np.unique(starts[order], return_index=True)
+                for index, field in enumerate(self.fields):
+                    if field not in columns:
+                        continue
+                    values = np.asarray(columns[field], dtype=np.float64)[order]
+                    valid = ~np.isnan(values)
+                    counts = np.add.reduceat(valid.astype(np.int64), first)
+                    sums = np.add.reduceat(np.where(valid, values, 0.0), first)
+                    minimums = np.minimum.reduceat(np.where(valid, values, np.inf), first)
+                    maximums = np.maximum.reduceat(np.where(valid, values, -np.inf), first)
+                    for start, low, high, total, count in zip(unique_starts.tolist(), minimums.tolist(), maximums.tolist(), sums.tolist(), counts.tolist()):
+                        if not count:
+                            continue
+                        field_stats = self._bucket(name, start)[index]
+                        field_stats[0] = min(field_stats[0], low)
+                        field_stats[1] = max(field_stats[1], high)
+                        field_stats[2] += total
+                        field_stats[3] += count
+
+    def query(self, resolution, since=None, until=None):
+        if resolution not in self.buckets:
+            raise ValueError(f"Unknown resolution {resolution!r}, expected one of {', '.join(self.resolutions)}")
+
+        with self.lock:
+            items = sorted(self.buckets[resolution].items())
+
+        width, _ = self.resolutions[resolution]
+        rows = []
+        for start, stats in items:
+            if since is not None and start + width <= since:
+                continue
+            if until is not None and start > until:
+                continue
+            row = {'timestamp': datetime.fromtimestamp(start).isoformat()}
+            for index, field in enumerate(self.fields):
+                low, high, total, count = stats[index]
+                if count:
+                    row[field] = {'min': low, 'max': high, 'mean': total / count, 'count': int(count)}
+            rows.append(row)
+        return rows
+
+
+def lttb_indices(x, y, threshold):
+    # Largest-Triangle-Three-Buckets: keeps the first and last point and,
+    # from each of threshold - 2 equal buckets in between, the point that
+    # forms the largest triangle with the previously kept point and the
+    # mean of the next bucket
+    n = len(x)
+    if threshold >= n:
+        return np.arange(n)
+    if threshold < 3:
+        return np.array([0, n - 1][:max(threshold, 0)], dtype=np.intp)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.intp)
+
+    selected = np.empty(threshold, dtype=np.intp)
+    selected[0] = 0
+    selected[-1] = n - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        next_start, next_stop = stop, edges[bucket + 2] if bucket + 2 < len(edges) else n
+        next_x = x[next_start:next_stop].mean()
+        next_y = y[next_start:next_stop].mean()
+
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:stop] - y[previous])
+            - (x[previous] - x[start:stop]) * (next_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+    return selected
+
+
+def decimate_indices(x, series, max_points):
+    # Shares the point budget between the series and keeps the union of
+    # what LTTB picks for each, so every plotted line keeps its shape
+    if max_points is not None and max_points < 1:
+        raise ValueError(f"max_points must be positive, got {max_points}")
+    n = len(x)
+    series = [np.asarray(values, dtype=np.float64) for values in series]
+    series = [values for values in series if not np.isnan(values).all()]
+    if max_points is None or n <= max_points or not series:
+        return np.arange(n)
+
+    budget = max(max_points // len(series), 3)
+    picked = [lttb_indices(x, np.nan_to_num(values), budget) for values in series]
+    indices = np.unique(np.concatenate(picked))
+    if len(indices) > max_points:
+        indices = indices[lttb_indices(x[indices], np.nan_to_num(series[0][indices]), max_points)]
+    return indices
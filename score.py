@@ -1,52 +1,80 @@
 import os
-import joblib
 import json
-import numpy as np
+from anomaly_scoring import build_feature_matrix, check_records, find_model, load_model
+from columnar import decode_features, encode_results, is_npy, mask_causes
+from prediction_cache import PredictionCache
 
 def init():
-    global model_package
-    
+    global prediction_cache
+
     # Load the model from the artifacts
-    model_path = os.path.join(os.getenv("AZUREML_MODEL_DIR"), "biogas_anomaly_model.pkl")
-    model_package = joblib.load(model_path)
-    
+    model_path = find_model(os.path.join(os.getenv("AZUREML_MODEL_DIR"), "biogas_anomaly_model.pkl"))
+    prediction_cache = PredictionCache(model_path, load_model)
+
     print("Model initialized successfully!")
 
-def run(raw_data):
+def score_records(records, cache=None):
+    # Score every record in one vectorized pass, results keep input order.
+    # cache defaults to the one init() loaded; azure_ml_iot passes its own.
+    # Raises ValueError naming the first invalid record, scoring none.
+    cache = cache or prediction_cache
+    feature_columns = cache.model_package['feature_columns']
+    check_records(records, feature_columns)
+    input_data = build_feature_matrix(records, feature_columns)
+
+    anomaly_scores, cause_ids, causes = cache.score(input_data)
+
+    results = []
+    for anomaly_score, cause_id, cause in zip(anomaly_scores, cause_ids, causes):
+        anomaly_result = int(anomaly_score >= 0.5)
+        results.append({
+            'anomaly_detected': bool(anomaly_result),
+            'anomaly_score': float(anomaly_score),
+            'cause': str(cause),
+            'cause_id': int(cause_id),
+            # Field names read by azure_ml_iot.write_prediction_result
+            'anomaly_probability': float(anomaly_score),
+            'anomaly_cause': str(cause) if anomaly_result else "Normal"
+        })
+    return results
+
+def score_columnar(raw_data):
+    # application/x-npy in and out, see columnar.py
+    input_data = decode_features(raw_data, prediction_cache.model_package['feature_columns'])
+    anomaly_scores, cause_ids, causes = prediction_cache.score_uncached(input_data)
+    anomaly_detected = anomaly_scores >= 0.5
+    cause_ids, causes = mask_causes(anomaly_detected, cause_ids, causes)
+    return encode_results(anomaly_scores, anomaly_detected, cause_ids, causes)
+
+def run(raw_data, content_type=None):
     try:
-        # Convert the input data to a numpy array
+        # Binary bulk requests are picked by content type, or by the .npy
+        # magic when the caller passes the raw body bytes without one
+        if is_npy(raw_data, content_type):
+            return score_columnar(raw_data)
+
         data = json.loads(raw_data)
-        
-        # Get the feature names from the model package
-        feature_columns = model_package['feature_columns']
-        
+
+        # Batch shape sent by azure_ml_iot: {"data": [{...}, {...}]}
+        if isinstance(data, dict) and isinstance(data.get('data'), list):
+            return json.dumps({'predictions': score_records(data['data'])})
+
         # Ensure the input has all required features
-        input_data = np.array([data[feature] for feature in feature_columns]).reshape(1, -1)
-        
-        # Scale the input data
-        scaled_data = model_package['scaler'].transform(input_data)
-        
-        # Make prediction
-        prediction = model_package['model'].predict(scaled_data)
-        
-        # Extract anomaly prediction
-        anomaly_score = prediction[0, 0]
-        anomaly_result = int(anomaly_score >= 0.5)
-        
-        # Extract cause prediction
-        cause_id = int(np.round(prediction[0, 1]))
-        cause = model_package['cause_encoder'].inverse_transform([cause_id])[0]
-        
+        feature_columns = prediction_cache.model_package['feature_columns']
+        missing = [feature for feature in feature_columns if feature not in data]
+        if missing:
+            raise KeyError(missing[0])
+
+        result = score_records([data])[0]
+
         # Create response
-        result = {
-            'anomaly_detected': bool(anomaly_result),
-            'anomaly_score': float(anomaly_score),
-            'cause': cause,
-            'cause_id': cause_id
-        }
-        
-        return json.dumps(result)
-    
+        return json.dumps({
+            'anomaly_detected': result['anomaly_detected'],
+            'anomaly_score': result['anomaly_score'],
+            'cause': result['cause'],
+            'cause_id': result['cause_id']
+        })
+
     except Exception as e:
         error = str(e)
-        return json.dumps({"error": error})
\ No newline at end of file
+        return json.dumps({"error": error})
@@ -0,0 +1,452 @@
+import json
+import logging
+import os
+import re
+import struct
+import threading
+import time
+import numpy as np
+from datetime import datetime
+from history_buffer import CodeTable, to_epoch
+from rollups import ROLLUP_FIELDS, decimate_indices
+
+logger = logging.getLogger(__name__)
+
+# Fixed-width record shared by the API and dashboard writers; float fields a
+# writer does not measure are stored as NaN
+RECORD_DTYPE = np.dtype([
+    ('timestamp', '<f8'),
+    ('temperature', '<f4'),
+    ('ph', '<f4'),
+    ('methane', '<f4'),
+    ('biogas_production', '<f4'),
+    ('anomaly_probability', '<f4'),
+    ('status', 'u1'),
+    ('cause', 'u1'),
+    ('source', 'u1'),
+    ('anomaly_detected', 'u1')
+])
+FLOAT_FIELDS = ('temperature', 'ph', 'methane', 'biogas_production', 'anomaly_probability')
+CODE_FIELDS = ('status', 'cause', 'source')
+
+MAGIC = b'BSTS'
+VERSION = 1
+# magic, version, record size, committed count, first ts, last ts,
+# and the id range of the segments a compacted segment replaces
+HEADER = struct.Struct('<4sHHQddQQ')
+HEADER_SIZE = 64
+SEGMENT_PATTERN = re.compile(r'^segment-(\d{8})\.dat$')
+
+
+class Segment:
+    # One memory-mapped segment file: a 64 byte header then fixed-width
+    # records. Files are preallocated and never truncated, so readers that
+    # map a segment while it is being written never touch unmapped pages.
+
+    def __init__(self, path, writable=False):
+        self.path = path
+        self.segment_id = int(SEGMENT_PATTERN.match(os.path.basename(path)).group(1))
+        self.mm = np.memmap(path, dtype=np.uint8, mode='r+' if writable else 'r')
+
+        magic, version, record_size, _, _, _, source_lo, source_hi = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC or version != VERSION or record_size != RECORD_DTYPE.itemsize:
+            raise ValueError(f"{path} is not a version {VERSION} segment")
+
+        self.capacity = (len(self.mm) - HEADER_SIZE) // RECORD_DTYPE.itemsize
+        self.records = self.mm[HEADER_SIZE:HEADER_SIZE + self.capacity * RECORD_DTYPE.itemsize].view(RECORD_DTYPE)
+        self._count = self.mm[8:16].view('<u8')
+        self._first = self.mm[16:24].view('<f8')
+        self._last = self.mm[24:32].view('<f8')
+        self.source_range = (source_lo, source_hi) if source_lo else None
+
+    @classmethod
+    def create(cls, path, capacity, source_range=None, records=None):
+        count = 0 if records is None else len(records)
+        first = float(records['timestamp'][0]) if count else 0.0
+        last = float(records['timestamp'][-1]) if count else 0.0
+        source_lo, source_hi = source_range or (0, 0)
+
+        temp_path = path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            header = HEADER.pack(MAGIC, VERSION, RECORD_DTYPE.itemsize, count, first, last, source_lo, source_hi)
+            f.write(header.ljust(HEADER_SIZE, b'\0'))
+            if count:
+                f.write(np.ascontiguousarray(records, dtype=RECORD_DTYPE).tobytes())
+            f.truncate(HEADER_SIZE + capacity * RECORD_DTYPE.itemsize)
+            f.flush()
+            os.fsync(f.fileno())
+        # Readers only ever see complete segment files
+        os.replace(temp_path, path)
+        return cls(path, writable=records is None)
+
+    @property
+    def count(self):
+        return int(self._count[0])
+
+    @property
+    def first_timestamp(self):
+        return float(self._first[0])
+
+    @property
+    def last_timestamp(self):
+        return float(self._last[0])
+
+    @property
+    def full(self):
+        return self.count >= self.capacity
+
+    def append(self, record):
+        index = self.count
+        self.records[index] = record
+        if index == 0:
+            self._first[0] = record[0]
+        self._last[0] = record[0]
+        # Count is bumped last, so a reader never sees a half-written record
+        self._count[0] = index + 1
+
+    def view(self, since=None, until=None):
+        records = self.records[:self.count]
+        times = records['timestamp']
+        start = 0 if since is None else int(np.searchsorted(times, since, side='left'))
+        stop = len(records) if until is None else int(np.searchsorted(times, until, side='right'))
+        return records[start:stop]
+
+    def flush(self):
+        self.mm.flush()
+
+    def close(self):
+        # The mapping is released once the last view of it is dropped
+        if self.mm is not None and self.mm.mode != 'r':
+            self.mm.flush()
+        self.records = self._count = self._first = self._last = self.mm = None
+
+
+class SegmentStore:
+    # Append-only time-series store of readings and predictions. One process
+    # writes a store directory, any number of processes can range-query it.
+    # Records go into memory-mapped segments of segment_records rows each;
+    # each segment header holds its time range, which is the store's time index.
+
+    def __init__(self, path, writable=False, segment_records=65536, flush_interval=1.0):
+        self.path = path
+        self.writable = writable
+        self.segment_records = segment_records
+        self.flush_interval = flush_interval
+        self.lock = threading.RLock()
+        self.segments = {}
+        self.active = None
+        self._last_flush = time.monotonic()
+        self._lock_file = None
+        self._codes_mtime = None
+        self._maintenance = None
+        self._closed = threading.Event()
+        self.codes = {field: CodeTable() for field in CODE_FIELDS}
+
+        if writable:
+            os.makedirs(path, exist_ok=True)
+            self._acquire_writer_lock()
+        self._load_codes()
+        self._scan()
+        if writable:
+            self._resume_active()
+
+    def _acquire_writer_lock(self):
+        self._lock_file = open(os.path.join(self.path, 'writer.lock'), 'a+')
+        try:
+            import fcntl
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except ImportError:
+            import msvcrt
+            self._lock_file.seek(0)
+            msvcrt.locking(self._lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            self._lock_file.close()
+            raise RuntimeError(f"Store {self.path} is already open for writing by another process")
+
+    def _codes_path(self):
+        return os.path.join(self.path, 'codes.json')
+
+    def _load_codes(self):
+        try:
+            mtime = os.stat(self._codes_path()).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self._codes_mtime:
+            return
+        with open(self._codes_path(), 'r') as f:
+            saved = json.load(f)
+        for field in CODE_FIELDS:
+            for value in saved.get(field, []):
+                self.codes[field].encode(value)
+        self._codes_mtime = mtime
+
+    def _save_codes(self):
+        temp_path = self._codes_path() + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump({field: self.codes[field].values for field in CODE_FIELDS}, f)
+        os.replace(temp_path, self._codes_path())
+
+    def _segment_path(self, segment_id):
+        return os.path.join(self.path, f"segment-{segment_id:08d}.dat")
+
+    def _scan(self):
+        # Picks up segments written or compacted by another process since the
+        # last call and forgets the ones that were removed
+        try:
+            names = os.listdir(self.path)
+        except FileNotFoundError:
+            names = []
+
+        present = {}
+        for name in names:
+            match = SEGMENT_PATTERN.match(name)
+            if match:
+                present[int(match.group(1))] = os.path.join(self.path, name)
+
+        for segment_id in list(self.segments):
+            if segment_id not in present:
+                if self.segments[segment_id] is not self.active:
+                    self.segments.pop(segment_id).close()
+
+        for segment_id, path in present.items():
+            if segment_id not in self.segments:
+                try:
+                    self.segments[segment_id] = Segment(path)
+                except (ValueError, OSError) as e:
+                    logger.warning(f"Skipping unreadable segment {path}: {e}")
+
+    def _live_segments(self):
+        # A compacted segment replaces the id range it was built from; the
+        # sources may still be on disk for a moment after the swap
+        replaced = set()
+        for segment in self.segments.values():
+            if segment.source_range:
+                replaced.update(range(segment.source_range[0], segment.source_range[1] + 1))
+        return [segment for segment_id, segment in sorted(self.segments.items()) if segment_id not in replaced]
+
+    def _next_segment_id(self):
+        return max(self.segments, default=0) + 1
+
+    def _resume_active(self):
+        candidates = [segment for segment in self._live_segments() if not segment.source_range]
+        if candidates and not candidates[-1].full:
+            segment = candidates[-1]
+            segment.close()
+            self.active = self.segments[segment.segment_id] = Segment(segment.path, writable=True)
+
+    def _roll(self):
+        if self.active is not None:
+            self.active.flush()
+        segment_id = self._next_segment_id()
+        self.active = self.segments[segment_id] = Segment.create(self._segment_path(segment_id), self.segment_records)
+
+    def encode(self, reading):
+        record = [to_epoch(reading.get('timestamp')) or time.time()]
+        for field in FLOAT_FIELDS:
+            value = reading.get(field)
+            record.append(np.nan if value is None else float(value))
+
+        codes_changed = False
+        for field in CODE_FIELDS:
+            value = reading.get(field)
+            if value is None:
+                value = reading.get('system_status') if field == 'status' else reading.get('anomaly_cause') if field == 'cause' else ''
+            table = self.codes[field]
+            known = len(table.values)
+            record.append(table.encode('' if value is None else value))
+            codes_changed = codes_changed or len(table.values) != known
+
+        record.append(1 if reading.get('anomaly_detected') else 0)
+        return tuple(record), codes_changed
+
+    def append(self, reading):
+        if not self.writable:
+            raise RuntimeError("Store was opened read-only")
+
+        with self.lock:
+            record, codes_changed = self.encode(reading)
+            if codes_changed:
+                self._save_codes()
+
+            active = self.active
+            # A clock step backwards starts a new segment so each segment
+            # stays sorted by time
+            if active is None or active.full or (active.count and record[0] < active.last_timestamp):
+                self._roll()
+            self.active.append(record)
+
+            now = time.monotonic()
+            if now - self._last_flush >= self.flush_interval:
+                self.active.flush()
+                self._last_flush = now
+
+    def flush(self):
+        with self.lock:
+            if self.active is not None:
+                self.active.flush()
+            self._last_flush = time.monotonic()
+
+    def query(self, since=None, until=None, limit=None):
+        since = to_epoch(since)
+        until = to_epoch(until)
+
+        with self.lock:
+            if not self.writable:
+                self._scan()
+                self._load_codes()
+
+            parts = []
+            for segment in self._live_segments():
+                if not segment.count:
+                    continue
+                if since is not None and segment.last_timestamp < since:
+                    continue
+                if until is not None and segment.first_timestamp > until:
+                    continue
+                parts.append(np.array(segment.view(since, until)))
+
+        if not parts:
+            return np.empty(0, dtype=RECORD_DTYPE)
+
+        records = np.concatenate(parts)
+        if len(parts) > 1 and np.any(np.diff(records['timestamp']) < 0):
+            records = records[np.argsort(records['timestamp'], kind='stable')]
+        if limit is not None:
+            records = records[len(records) - min(int(limit), len(records)):]
+        return records
+
+    def latest(self, limit):
+        with self.lock:
+            if not self.writable:
+                self._scan()
+            segments = [segment for segment in self._live_segments() if segment.count]
+
+        # Walk back from the newest segment only as far as needed
+        parts = []
+        remaining = limit
+        for segment in sorted(segments, key=lambda segment: segment.last_timestamp, reverse=True):
+            if remaining <= 0:
+                break
+            since = None if remaining >= segment.count else float(segment.records['timestamp'][segment.count - remaining])
+            part = np.array(segment.view(since))
+            parts.append(part)
+            remaining -= len(part)
+        if not parts:
+            return np.empty(0, dtype=RECORD_DTYPE)
+        records = np.concatenate(parts)
+        records = records[np.argsort(records['timestamp'], kind='stable')]
+        return records[len(records) - min(limit, len(records)):]
+
+    def decode(self, records):
+        self._load_codes()
+        decoded = {field: self.codes[field].decode(records[field]) for field in CODE_FIELDS}
+        floats = {field: records[field].astype(str) for field in FLOAT_FIELDS}
+
+        rows = []
+        for i in range(len(records)):
+            row = {'timestamp': datetime.fromtimestamp(float(records['timestamp'][i])).isoformat()}
+            for field in FLOAT_FIELDS:
+                value = float(floats[field][i])
+                if value == value:
+                    row[field] = value
+            for field in CODE_FIELDS:
+                if decoded[field][i]:
+                    row[field] = decoded[field][i]
+            row['anomaly_detected'] = bool(records['anomaly_detected'][i])
+            rows.append(row)
+        return rows
+
+    def to_records(self, since=None, until=None, limit=None, max_points=None):
+        records = self.query(since, until, limit)
+        if max_points is not None:
+            records = records[decimate_indices(records['timestamp'], [records[field] for field in ROLLUP_FIELDS], max_points)]
+        return self.decode(records)
+
+    def compact(self, retention_seconds=None):
+        # Packs sealed, partly filled segments into full ones and drops rows
+        # older than the retention window. Sealed segments are immutable, so
+        # the rewrite runs without blocking appends.
+        if not self.writable:
+            raise RuntimeError("Store was opened read-only")
+
+        with self.lock:
+            # Seal the active segment first so it can never fall inside the
+            # id range a compacted segment declares it replaces
+            if self.active is not None and self.active.count:
+                self._roll()
+            live = [segment for segment in self._live_segments() if segment is not self.active]
+            cutoff = None if retention_seconds is None else time.time() - retention_seconds
+
+        sealed = [segment for segment in live if segment.count]
+        expired = [segment for segment in sealed if cutoff is not None and segment.last_timestamp < cutoff]
+        empty = [segment for segment in live if not segment.count]
+        candidates = [
+            segment for segment in sealed
+            if segment not in expired and (segment.count < self.segment_records or (cutoff is not None and segment.first_timestamp < cutoff))
+        ]
+
+        written = []
+        if len(candidates) > 1 or (candidates and cutoff is not None and candidates[0].first_timestamp < cutoff):
+            source_range = (min(s.segment_id for s in candidates), max(s.segment_id for s in candidates))
+            # Everything inside the declared range is rewritten, including
+            # full segments that happen to sit between two partial ones
+            candidates = [
+                segment for segment in sealed
+                if segment not in expired and source_range[0] <= segment.segment_id <= source_range[1]
+            ]
+            records = np.concatenate([np.array(segment.view(cutoff)) for segment in candidates])
+            records = records[np.argsort(records['timestamp'], kind='stable')]
+
+            with self.lock:
+                next_id = self._next_segment_id()
+                for offset, start in enumerate(range(0, max(len(records), 1), self.segment_records)):
+                    chunk = records[start:start + self.segment_records]
+                    segment_id = next_id + offset
+                    segment = Segment.create(self._segment_path(segment_id), len(chunk), source_range, chunk)
+                    self.segments[segment_id] = segment
+                    written.append(segment)
+        else:
+            candidates = []
+
+        removed = expired + empty + candidates
+        with self.lock:
+            for segment in removed:
+                self.segments.pop(segment.segment_id, None)
+                segment.close()
+                try:
+                    os.remove(segment.path)
+                except OSError as e:
+                    logger.warning(f"Could not remove compacted segment {segment.path}: {e}")
+
+        return {"removed": len(removed), "written": len(written)}
+
+    def start_maintenance(self, compact_interval=3600.0, retention_seconds=None):
+        # Flushes the active segment every flush_interval and compacts every
+        # compact_interval, so an idle writer still persists and tidies up
+        if self._maintenance is not None:
+            return
+
+        def run():
+            last_compact = time.monotonic()
+            while not self._closed.wait(self.flush_interval):
+                try:
+                    self.flush()
+                    if time.monotonic() - last_compact >= compact_interval:
+                        self.compact(retention_seconds)
+                        last_compact = time.monotonic()
+                except Exception as e:
+                    logger.error(f"Store maintenance failed for {self.path}: {e}")
+
+        self._maintenance = threading.Thread(target=run, name=f"store-maintenance-{self.path}", daemon=True)
+        self._maintenance.start()
+
+    def close(self):
+        self._closed.set()
+        with self.lock:
+            for segment in self.segments.values():
+                segment.close()
+            self.segments = {}
+            self.active = None
+            if self._lock_file is not None:
+                self._lock_file.close()
+                self._lock_file = None
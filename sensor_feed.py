@@ -0,0 +1,205 @@
+import json
+import logging
+import os
+import queue
+import socket
+import threading
+from acquisition import SerialAcquisition
+from event_stream import Broadcaster, format_event
+
+logger = logging.getLogger(__name__)
+
+# Where serial_daemon.py publishes decoded readings: unix:<path> or
+# tcp:<host>:<port>. Windows has no AF_UNIX in CPython, so it uses loopback.
+if hasattr(socket, 'AF_UNIX'):
+    DEFAULT_ADDRESS = 'unix:/tmp/bioserde-sensor.sock'
+else:
+    DEFAULT_ADDRESS = 'tcp:127.0.0.1:8766'
+FEED_ADDRESS = os.getenv('SENSOR_FEED', DEFAULT_ADDRESS)
+
+# The daemon sends a keepalive comment this often; a subscriber that hears
+# nothing for FEED_TIMEOUT seconds assumes the connection is dead
+HEARTBEAT_INTERVAL = 5.0
+FEED_TIMEOUT = 3 * HEARTBEAT_INTERVAL
+
+
+def parse_address(address):
+    scheme, _, rest = address.partition(':')
+    if scheme == 'unix' and rest:
+        return socket.AF_UNIX, rest
+    if scheme == 'tcp':
+        host, _, port = rest.rpartition(':')
+        if host and port.isdigit():
+            return socket.AF_INET, (host, int(port))
+    raise ValueError(f"Invalid sensor feed address {address!r}, expected unix:<path> or tcp:<host>:<port>")
+
+
+def connect(address, timeout=FEED_TIMEOUT):
+    family, sockaddr = parse_address(address)
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(sockaddr)
+    except Exception:
+        sock.close()
+        raise
+    return sock
+
+
+def parse_event_line(line):
+    # The feed uses the same framing as the SSE stream (see event_stream.py);
+    # only the data lines carry readings
+    if line.startswith(b'data: '):
+        return json.loads(line[6:])
+    return None
+
+
+class FeedAcquisition(SerialAcquisition):
+    # SerialAcquisition's interface (start/stop/latest/drain/stats and the
+    # bounded queue) fed from serial_daemon.py instead of the serial port,
+    # so any number of processes can consume the one decoded stream.
+    # handle_line gets each reading as a dict, and each reading only once:
+    # the one the server re-sends after a reconnect is dropped when its seq
+    # was already seen. A restarted daemon numbers from 1 again, which its
+    # newer timestamp tells apart from a repeat.
+
+    device = "sensor feed"
+
+    def __init__(self, handle_line, address=FEED_ADDRESS, queue_size=1000,
+                 min_backoff=1.0, max_backoff=30.0, timeout=FEED_TIMEOUT):
+        super().__init__(address, None, handle_line, queue_size=queue_size,
+                         min_backoff=min_backoff, max_backoff=max_backoff, settle_time=0)
+        self.timeout = timeout
+        self.sock = None
+        self.last_seq = None
+        self.last_timestamp = None
+        self.duplicates = 0
+
+    def _connect(self):
+        self.sock = connect(self.port, self.timeout)
+        self.ser = self.sock.makefile('rb')
+        self.connected = True
+        logger.info(f"Connected to {self.device} on {self.port}")
+
+    def _close(self):
+        self.connected = False
+        for resource in (self.ser, self.sock):
+            if resource is not None:
+                try:
+                    resource.close()
+                except Exception:
+                    pass
+        self.ser = None
+        self.sock = None
+
+    def _already_seen(self, reading):
+        seq = reading.get('seq')
+        if seq is None:
+            return False
+        timestamp = reading.get('timestamp')
+        if (self.last_seq is not None and seq <= self.last_seq
+                and (timestamp is None or self.last_timestamp is None or timestamp <= self.last_timestamp)):
+            return True
+        self.last_seq, self.last_timestamp = seq, timestamp
+        return False
+
+    def _read_items(self):
+        line = self.ser.readline()
+        if not line:
+            raise ConnectionError("sensor feed closed the connection")
+        reading = parse_event_line(line)
+        if reading is None:
+            return []
+        if isinstance(reading, dict) and self._already_seen(reading):
+            self.duplicates += 1
+            return []
+        return [reading]
+
+    def stats(self):
+        return dict(super().stats(), duplicates=self.duplicates)
+
+
+class FeedServer:
+    # The publishing side of a feed: listens on a unix:/tcp: address and
+    # streams every published event to each connected subscriber, with a
+    # keepalive comment whenever there is nothing to send. A new subscriber
+    # gets the latest event straight away instead of waiting for the next.
+
+    def __init__(self, address, client_queue_size=1024, heartbeat=HEARTBEAT_INTERVAL, name="feed"):
+        self.address = address
+        self.heartbeat = heartbeat
+        self.name = name
+        self.broadcaster = Broadcaster(client_queue_size)
+        self.lock = threading.Lock()
+        self.latest = None
+        self.server = None
+        self._stop_event = threading.Event()
+
+    def publish(self, event_id, event_type, data):
+        with self.lock:
+            self.latest = (event_id, event_type, data)
+        self.broadcaster.publish(event_id, event_type, data)
+
+    def client_count(self):
+        return self.broadcaster.client_count()
+
+    @property
+    def dropped(self):
+        return self.broadcaster.dropped
+
+    def _listen(self):
+        family, sockaddr = parse_address(self.address)
+        if family == getattr(socket, 'AF_UNIX', None) and os.path.exists(sockaddr):
+            # Refuse to steal the socket from a server that is still running
+            try:
+                connect(self.address, timeout=1.0).close()
+            except OSError:
+                os.unlink(sockaddr)
+            else:
+                raise RuntimeError(f"Another {self.name} is already serving {self.address}")
+
+        server = socket.socket(family, socket.SOCK_STREAM)
+        if family == socket.AF_INET:
+            server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind(sockaddr)
+        server.listen()
+        return server
+
+    def _serve_client(self, conn):
+        subscriber = self.broadcaster.subscribe()
+        try:
+            with self.lock:
+                latest = self.latest
+            if latest is not None:
+                conn.sendall(format_event(*latest).encode('utf-8'))
+            while not self._stop_event.is_set():
+                try:
+                    _, _, event = subscriber.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    event = ": keepalive\n\n"
+                conn.sendall(event.encode('utf-8'))
+        except OSError:
+            pass
+        finally:
+            self.broadcaster.unsubscribe(subscriber)
+            conn.close()
+
+    def start(self):
+        self.server = self._listen()
+        threading.Thread(target=self._accept, name=f"{self.name}-accept", daemon=True).start()
+
+    def _accept(self):
+        while not self._stop_event.is_set():
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                break
+            threading.Thread(target=self._serve_client, args=(conn,), name=f"{self.name}-client", daemon=True).start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self.server is not None:
+            self.server.close()
+            family, sockaddr = parse_address(self.address)
+            if family == getattr(socket, 'AF_UNIX', None) and os.path.exists(sockaddr):
+                os.unlink(sockaddr)
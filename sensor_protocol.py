@@ -0,0 +1,290 @@
+import binascii
+import math
+import struct
+import time
+import numpy as np
+from metrics import MALFORMED_LINES, PARSE_SECONDS, SERIAL_READ_SECONDS
+
+# Framed binary protocol spoken by gas_sensor_azure_ml.ino (see the sketch
+# for the sending side). Every frame is
+#
+#   sync   u8     0xA5
+#   version u8    1
+#   length u8     payload length, 8 for version 1
+#   seq    u16    increments per frame, wraps at 65536
+#   payload       temperature i16 (0.1 °C), ph u16 (0.01), biogas u16 (0.1),
+#                 gas_level u16
+#   crc    u16    CRC-16/CCITT-FALSE over version .. payload
+#
+# All multi-byte fields are little-endian. A frame is 15 bytes against the
+# ~16 of the equivalent CSV line, and parses without any float conversion.
+#
+# Both formats send the pH probe as its 0-5 V reading (analogRead(A0) *
+# 0.01), not as pH. FrameDecoder converts it with ph_from_raw, so every
+# consumer of decoded readings gets pH; readings outside RAW_PH_RANGE come
+# out as NaN.
+
+SYNC = 0xA5
+VERSION = 1
+HEADER = struct.Struct('<BBBH')
+PAYLOAD = struct.Struct('<hHHH')
+CRC = struct.Struct('<H')
+FRAME_SIZE = HEADER.size + PAYLOAD.size + CRC.size
+
+# Everything after the sync byte and before the CRC, as one record
+FRAME_DTYPE = np.dtype([
+    ('version', 'u1'),
+    ('length', 'u1'),
+    ('seq', '<u2'),
+    ('temperature', '<i2'),
+    ('ph', '<u2'),
+    ('biogas', '<u2'),
+    ('gas_level', '<u2')
+])
+FIELDS = ('temperature', 'ph', 'biogas', 'gas_level')
+SCALES = {'temperature': 0.1, 'ph': 0.01, 'biogas': 0.1, 'gas_level': 1.0}
+# Column order of the legacy CSV line: temperature,ph,gas_level
+CSV_FIELDS = ('temperature', 'ph', 'gas_level')
+
+# Longest run of bytes kept while waiting for the rest of a frame or line
+MAX_PENDING = 4096
+
+# Probe output the pH conversion is valid for, in volts
+RAW_PH_RANGE = (0.0, 5.0)
+
+
+def crc16(data):
+    return binascii.crc_hqx(data, 0xFFFF)
+
+
+def ph_from_raw(raw_ph):
+    # Works on floats and NumPy arrays alike
+    return 7.0 + (raw_ph - 2.5) * 2
+
+
+def raw_ph_to_ph(raw_ph):
+    # Column form used by the decoder, out-of-range readings become NaN
+    raw_ph = np.asarray(raw_ph, dtype=np.float64)
+    valid = (raw_ph >= RAW_PH_RANGE[0]) & (raw_ph <= RAW_PH_RANGE[1])
+    return np.where(valid, ph_from_raw(raw_ph), np.nan)
+
+
+def encode_frame(seq, temperature, ph, biogas, gas_level):
+    body = HEADER.pack(SYNC, VERSION, PAYLOAD.size, seq & 0xFFFF)[1:] + PAYLOAD.pack(
+        int(round(temperature / SCALES['temperature'])),
+        int(round(ph / SCALES['ph'])),
+        int(round(biogas / SCALES['biogas'])),
+        int(gas_level)
+    )
+    return bytes([SYNC]) + body + CRC.pack(crc16(body))
+
+
+def empty_readings():
+    readings = {'seq': np.empty(0, dtype=np.int64)}
+    readings.update((field, np.empty(0, dtype=np.float64)) for field in FIELDS)
+    return readings
+
+
+class FrameDecoder:
+    # Incremental decoder: feed() takes whatever bytes the port had and
+    # returns every complete reading in them as NumPy columns (seq plus
+    # FIELDS, seq is -1 and biogas NaN for CSV lines, ph already converted
+    # to pH). mode is 'binary',
+    # 'csv' or 'auto', which settles on the first format it recognizes.
+
+    def __init__(self, mode='auto'):
+        if mode not in ('auto', 'binary', 'csv'):
+            raise ValueError(f"Unknown protocol mode {mode!r}, expected 'auto', 'binary' or 'csv'")
+        self.mode = mode
+        self.pending = b''
+        self.last_seq = None
+        self.frames = 0
+        self.lines = 0
+        self.dropped = 0
+        self.crc_errors = 0
+        self.parse_errors = 0
+        self.skipped_bytes = 0
+
+    def feed(self, data):
+        data = self.pending + bytes(data)
+        if self.mode == 'auto':
+            self.mode = self._detect(data)
+            if self.mode == 'auto':
+                self.pending = data[-MAX_PENDING:]
+                return empty_readings()
+
+        if self.mode == 'binary':
+            return self._feed_binary(data)
+        return self._feed_csv(data)
+
+    def stats(self):
+        return {
+            "mode": self.mode,
+            "frames": self.frames,
+            "lines": self.lines,
+            "dropped": self.dropped,
+            "crc_errors": self.crc_errors,
+            "parse_errors": self.parse_errors,
+            "skipped_bytes": self.skipped_bytes
+        }
+
+    def _detect(self, data):
+        start = data.find(bytes([SYNC]))
+        while start >= 0 and len(data) - start >= FRAME_SIZE:
+            if self._valid_frame(data, start):
+                return 'binary'
+            start = data.find(bytes([SYNC]), start + 1)
+
+        for line in data.split(b'\n')[:-1]:
+            if self._parse_line(line) is not None:
+                return 'csv'
+        return 'auto'
+
+    @staticmethod
+    def _valid_frame(data, start):
+        if data[start + 1] != VERSION or data[start + 2] != PAYLOAD.size:
+            return False
+        end = start + FRAME_SIZE
+        return crc16(data[start + 1:end - CRC.size]) == CRC.unpack_from(data, end - CRC.size)[0]
+
+    def _feed_binary(self, data):
+        bodies = []
+        position = 0
+        sync = bytes([SYNC])
+        while True:
+            start = data.find(sync, position)
+            if start < 0:
+                self.skipped_bytes += len(data) - position
+                position = len(data)
+                break
+            self.skipped_bytes += start - position
+            if len(data) - start < FRAME_SIZE:
+                position = start
+                break
+            if not self._valid_frame(data, start):
+                # Either a sync byte inside other data or a corrupted frame,
+                # resync from the next byte
+                if data[start + 1] == VERSION and data[start + 2] == PAYLOAD.size:
+                    self.crc_errors += 1
+                self.skipped_bytes += 1
+                position = start + 1
+                continue
+            bodies.append(data[start + 1:start + FRAME_SIZE - CRC.size])
+            position = start + FRAME_SIZE
+        self.pending = data[position:]
+
+        if not bodies:
+            return empty_readings()
+
+        records = np.frombuffer(b''.join(bodies), dtype=FRAME_DTYPE)
+        seq = records['seq'].astype(np.int64)
+        self._count_drops(seq)
+        self.frames += len(records)
+
+        readings = {'seq': seq}
+        for field in FIELDS:
+            readings[field] = records[field] * SCALES[field]
+        readings['ph'] = raw_ph_to_ph(readings['ph'])
+        return readings
+
+    def _count_drops(self, seq):
+        if self.last_seq is None:
+            current, previous = seq[1:], seq[:-1]
+        else:
+            current, previous = seq, np.concatenate([[self.last_seq], seq[:-1]])
+        gaps = (current - previous - 1) % 65536
+        # A huge jump backwards is the sketch restarting, not 60k lost frames
+        self.dropped += int(gaps[gaps < 32768].sum())
+        self.last_seq = int(seq[-1])
+
+    @staticmethod
+    def _parse_line(line):
+        values = line.strip().split(b',')
+        if len(values) < len(CSV_FIELDS):
+            return None
+        try:
+            return [float(value) for value in values[:len(CSV_FIELDS)]]
+        except ValueError:
+            return None
+
+    def _feed_csv(self, data):
+        lines = data.split(b'\n')
+        self.pending = lines.pop()[-MAX_PENDING:]
+
+        rows = []
+        for line in lines:
+            if not line.strip():
+                continue
+            row = self._parse_line(line)
+            if row is None:
+                self.parse_errors += 1
+                continue
+            rows.append(row)
+        self.lines += len(rows)
+
+        if not rows:
+            return empty_readings()
+
+        columns = np.array(rows, dtype=np.float64)
+        readings = {'seq': np.full(len(rows), -1, dtype=np.int64), 'biogas': np.full(len(rows), np.nan)}
+        for index, field in enumerate(CSV_FIELDS):
+            readings[field] = columns[:, index]
+        readings['ph'] = raw_ph_to_ph(readings['ph'])
+        return readings
+
+
+def read_available(ser, decoder, device="Arduino"):
+    # Drains everything the port has buffered in one read; blocks up to the
+    # port timeout for the first byte when nothing is waiting. Only reads
+    # that returned data are timed, idle waits would swamp the histogram.
+    start = time.perf_counter()
+    data = ser.read(ser.in_waiting or 1)
+    if not data:
+        return decoder.feed(data)
+    parse_start = time.perf_counter()
+    SERIAL_READ_SECONDS.labels(device).observe(parse_start - start)
+
+    errors = decoder.crc_errors + decoder.parse_errors
+    readings = decoder.feed(data)
+    PARSE_SECONDS.labels(decoder.mode).observe(time.perf_counter() - parse_start)
+    errors = decoder.crc_errors + decoder.parse_errors - errors
+    if errors:
+        MALFORMED_LINES.labels(device).inc(errors)
+    return readings
+
+
+# A decoded reading as main.py records it; ph is already pH (NaN when the
+# probe was out of range)
+def sensor_reading(temp, ph, methane):
+    if 0 <= temp <= 100 and 0 <= ph <= 14 and 0 <= methane <= 1024:
+        return {
+            "temperature": temp,
+            "ph": ph,
+            "methane": methane,
+            "source": "arduino"
+        }
+
+    print(f"⚠️ Data out of range: temp={temp}, ph={ph}, methane={methane}")
+    return None
+
+
+def parse_sensor_line(line):
+    if not line or ',' not in line:
+        print(f"⚠️ No comma found or empty line: '{line}'")
+        return None
+
+    try:
+        values = line.split(',')
+
+        if len(values) >= 3:
+            raw_ph = float(values[1])
+            ph = ph_from_raw(raw_ph) if RAW_PH_RANGE[0] <= raw_ph <= RAW_PH_RANGE[1] else math.nan
+            return sensor_reading(float(values[0]), ph, float(values[2]))
+        else:
+            print(f"⚠️ Not enough values: expected 3, got {len(values)}")
+
+    except ValueError as e:
+        print(f"❌ Error parsing values: {e}")
+
+    return None
+
@@ -0,0 +1,91 @@
+import logging
+import math
+import os
+import time
+import serial.tools.list_ports
+from acquisition import SerialAcquisition
+from sensor_feed import FEED_ADDRESS, HEARTBEAT_INTERVAL, FeedServer
+from sensor_protocol import FrameDecoder
+
+# The one process that opens the sensor port. It decodes every frame once
+# and fans the readings out over FEED_ADDRESS to app.py, main.py,
+# azure_bridge.py and anything else that subscribes (see sensor_feed.py).
+#   python serial_daemon.py
+
+logger = logging.getLogger(__name__)
+
+# Empty means autodetect, like main.py used to
+SERIAL_PORT = os.getenv('SERIAL_PORT', '')
+BAUD_RATE = int(os.getenv('BAUD_RATE', '9600'))
+# 'auto', 'binary' or 'csv', see sensor_protocol.py
+SERIAL_PROTOCOL = os.getenv('SERIAL_PROTOCOL', 'auto')
+# Readings a subscriber may fall behind before it loses the oldest
+CLIENT_QUEUE_SIZE = 1024
+STATS_INTERVAL = 60
+
+ARDUINO_KEYWORDS = ('arduino', 'ch340', 'cp210', 'ftdi', 'usb-serial', 'com')
+
+
+def find_arduino_port():
+    ports = serial.tools.list_ports.comports()
+    for port in ports:
+        if any(keyword in port.description.lower() for keyword in ARDUINO_KEYWORDS):
+            return port.device
+    if ports:
+        return ports[0].device
+    return 'COM3'
+
+
+class SerialDaemon:
+    # Reads the port through SerialAcquisition and publishes every decoded
+    # reading, serialized once, to all subscribers via a FeedServer
+
+    def __init__(self, port, baud_rate, address=FEED_ADDRESS, protocol=SERIAL_PROTOCOL,
+                 client_queue_size=CLIENT_QUEUE_SIZE, heartbeat=HEARTBEAT_INTERVAL):
+        self.address = address
+        self.server = FeedServer(address, client_queue_size, heartbeat, name="serial daemon")
+        self.decoder = FrameDecoder(protocol)
+        self.acquisition = SerialAcquisition(port, baud_rate, self._publish_reading, decoder=self.decoder)
+        self.seq = 0
+
+    def _publish_reading(self, reading):
+        # CSV lines have no biogas value; leave it out rather than send NaN
+        reading = {field: value for field, value in reading.items() if not math.isnan(value)}
+        self.seq += 1
+        reading['seq'] = self.seq
+        reading['timestamp'] = time.time()
+        reading['source'] = 'arduino'
+        self.server.publish(self.seq, 'reading', reading)
+        # Nothing in this process consumes the acquisition queue
+        return None
+
+    def stats(self):
+        return {
+            "acquisition": self.acquisition.stats(),
+            "subscribers": self.server.client_count(),
+            "dropped_for_slow_subscribers": self.server.dropped,
+            "published": self.seq
+        }
+
+    def start(self):
+        self.server.start()
+        self.acquisition.start()
+        logger.info(f"Serving readings from {self.acquisition.port} on {self.address}")
+
+    def stop(self):
+        self.acquisition.stop()
+        self.server.stop()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    daemon = SerialDaemon(SERIAL_PORT or find_arduino_port(), BAUD_RATE)
+    daemon.start()
+    try:
+        while True:
+            time.sleep(STATS_INTERVAL)
+            logger.info(f"Serial daemon: {daemon.stats()}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.stop()
@@ -0,0 +1,90 @@
+import numpy as np
+
+OPTIMAL_RANGES = {
+    "temperature": {"min": 35, "max": 40, "critical_min": 25, "critical_max": 50},
+    "ph": {"min": 6.8, "max": 7.2, "critical_min": 6.0, "critical_max": 8.5},
+    "methane": {"min": 150, "max": 300, "critical_min": 50, "critical_max": 500}
+}
+
+STATUSES = ("optimal", "warning", "critical")
+OPTIMAL, WARNING, CRITICAL = range(len(STATUSES))
+
+# Per field, in the order issues are listed: (comparison, bound, severity,
+# message). The first matching rule wins, so critical rules come first.
+STATUS_RULES = {
+    "temperature": [
+        ("lt", "critical_min", CRITICAL, "🚨 BAHAYA: Suhu {value:.1f}°C terlalu ekstrem!"),
+        ("gt", "critical_max", CRITICAL, "🚨 BAHAYA: Suhu {value:.1f}°C terlalu ekstrem!"),
+        ("lt", "min", WARNING, "⚠️ PERHATIAN: Suhu {value:.1f}°C terlalu dingin"),
+        ("gt", "max", WARNING, "⚠️ PERHATIAN: Suhu {value:.1f}°C terlalu panas")
+    ],
+    "ph": [
+        ("lt", "critical_min", CRITICAL, "🚨 BAHAYA: pH {value:.1f} terlalu asam!"),
+        ("gt", "critical_max", CRITICAL, "🚨 BAHAYA: pH {value:.1f} terlalu basa!"),
+        ("lt", "min", WARNING, "⚠️ PERHATIAN: pH {value:.1f} agak asam"),
+        ("gt", "max", WARNING, "⚠️ PERHATIAN: pH {value:.1f} agak basa")
+    ],
+    "methane": [
+        ("lt", "critical_min", CRITICAL, "🚨 BAHAYA: Gas metana {value:.0f} ppm sangat rendah!"),
+        ("gt", "critical_max", CRITICAL, "🚨 BAHAYA: Gas metana {value:.0f} ppm terlalu tinggi!"),
+        ("lt", "min", WARNING, "⚠️ PERHATIAN: Produksi gas {value:.0f} ppm masih kurang")
+    ]
+}
+
+
+class StatusEngine:
+    # STATUS_RULES compiled against a set of ranges. classify() labels whole
+    # arrays of readings with a status code and, per field, an issue code
+    # (0 for none, else 1 + the index of the matching rule); issue strings
+    # are only formatted by render_issues() for the rows actually shown.
+
+    def __init__(self, ranges=OPTIMAL_RANGES, rules=STATUS_RULES):
+        self.fields = tuple(rules)
+        self.rules = []
+        for field in self.fields:
+            compiled = []
+            for comparison, bound, severity, message in rules[field]:
+                compiled.append((comparison == "lt", float(ranges[field][bound]), severity, message))
+            self.rules.append(compiled)
+
+        # Severity by issue code, per field, for the vectorized path
+        self.severities = [
+            np.array([OPTIMAL] + [severity for _, _, severity, _ in compiled], dtype=np.uint8)
+            for compiled in self.rules
+        ]
+
+    def classify(self, *columns):
+        # One array per field, in self.fields order
+        columns = [np.asarray(values, dtype=np.float64) for values in columns]
+        n = len(columns[0])
+        status_codes = np.zeros(n, dtype=np.uint8)
+        issue_codes = np.zeros((n, len(self.fields)), dtype=np.uint8)
+
+        for index, (values, compiled) in enumerate(zip(columns, self.rules)):
+            conditions = [values < bound if below else values > bound for below, bound, _, _ in compiled]
+            codes = np.select(conditions, np.arange(1, len(compiled) + 1, dtype=np.uint8), 0).astype(np.uint8)
+            issue_codes[:, index] = codes
+            np.maximum(status_codes, self.severities[index][codes], out=status_codes)
+
+        return status_codes, issue_codes
+
+    def render_issues(self, issue_codes, values):
+        # issue_codes and values for a single row
+        issues = []
+        for code, value, compiled in zip(issue_codes, values, self.rules):
+            if code:
+                issues.append(compiled[code - 1][3].format(value=value))
+        return issues
+
+    def analyze(self, *values):
+        # Scalar path over the same compiled table, no array overhead
+        status = OPTIMAL
+        issues = []
+        for value, compiled in zip(values, self.rules):
+            for below, bound, severity, message in compiled:
+                if value < bound if below else value > bound:
+                    issues.append(message.format(value=value))
+                    status = max(status, severity)
+                    break
+        return STATUSES[status], issues
+
@@ -0,0 +1,39 @@
+import os
+import sys
+import tempfile
+import time
+import pytest
+
+# The modules live at the repository root and open files relative to it
+# (the model, arduino_data.json), so tests run from there too
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+# app.py reads its configuration at import; keep it away from real data,
+# the real serial daemon and real hardware
+RUNTIME_DIR = tempfile.TemporaryDirectory(prefix='bioserde-tests-')
+FEED_ADDRESS = 'unix:' + os.path.join(RUNTIME_DIR.name, 'feed.sock')
+os.environ['READINGS_STORE_DIR'] = os.path.join(RUNTIME_DIR.name, 'store')
+os.environ['SENSOR_FEED'] = FEED_ADDRESS
+os.environ['DIGESTERS'] = ''
+os.environ['READING_TIMEOUT'] = '1'
+
+
+def wait_for(condition, timeout=15.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@pytest.fixture(scope='session')
+def score_model():
+    # score.init() as Azure ML calls it, with the model from the repository
+    import score
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setenv('AZUREML_MODEL_DIR', ROOT)
+        score.init()
+    return score
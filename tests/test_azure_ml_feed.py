@@ -0,0 +1,48 @@
+import queue
+import pytest
+import azure_ml_iot
+import score
+from conftest import wait_for
+from serial_daemon import SerialDaemon
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    # Only the publishing side; readings are handed to it as the decoder would
+    daemon = SerialDaemon('/dev/null', 9600, address='unix:' + str(tmp_path / 'feed.sock'), heartbeat=0.2)
+    daemon.server.start()
+    yield daemon
+    daemon.server.stop()
+
+
+def test_feed_readings_reach_the_model_as_biogas_production(daemon, monkeypatch):
+    monkeypatch.setattr(azure_ml_iot, 'READINGS_FROM', 'feed')
+    monkeypatch.setattr(azure_ml_iot, 'FEED_ADDRESS', daemon.address)
+    readings = queue.Queue()
+    stop = azure_ml_iot.start_reading_source(readings)
+    try:
+        assert wait_for(lambda: daemon.server.client_count() == 1)
+
+        daemon._publish_reading({'temperature': 30.0, 'ph': 7.1, 'biogas': 14.84, 'gas_level': 200.0})
+        # A CSV-mode reading has no biogas value and is not scored
+        daemon._publish_reading({'temperature': 30.0, 'ph': 7.1, 'biogas': float('nan'), 'gas_level': 200.0})
+        daemon._publish_reading({'temperature': 30.0, 'ph': 6.9, 'biogas': 60.0, 'gas_level': 210.0})
+        received = [readings.get(timeout=5), readings.get(timeout=5)]
+        with pytest.raises(queue.Empty):
+            readings.get(timeout=0.3)
+    finally:
+        stop()
+
+    assert [reading['seq'] for reading in received] == [1, 3]
+    assert [reading['biogas_production'] for reading in received] == [14.84, 60.0]
+    assert all('biogas' not in reading for reading in received)
+    assert [azure_ml_iot.model_input(reading)['biogas_production'] for reading in received] == [14.84, 60.0]
+
+    cache = azure_ml_iot.init_local_model()
+    local, source = azure_ml_iot.predict_locally(received)
+    assert source == 'local'
+    expected = score.score_records([
+        {'ph': 7.1, 'biogas_production': 14.84, 'gas_level': 200.0, 'timestamp': received[0]['timestamp']},
+        {'ph': 6.9, 'biogas_production': 60.0, 'gas_level': 210.0, 'timestamp': received[1]['timestamp']}
+    ], cache)
+    assert local['predictions'] == expected
@@ -0,0 +1,269 @@
+import json
+import threading
+import time
+import pytest
+import requests
+import azure_ml_iot
+from azure_ml_iot import CircuitBreaker, call_azure_ml, post_with_retries, send_to_azure_ml
+from conftest import wait_for
+from metrics import AZURE_ML_FALLBACKS, PREDICTION_DISAGREEMENTS
+
+READING = {'ph': 7.0, 'biogas_production': 55.0, 'timestamp': '2026-10-18T10:00:00'}
+NORMAL = {'anomaly_detected': False, 'anomaly_probability': 0.1, 'anomaly_cause': 'Normal'}
+ANOMALY = {'anomaly_detected': True, 'anomaly_probability': 0.9, 'anomaly_cause': 'pH Level'}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class Response:
+    def __init__(self, status_code=200, body=None):
+        self.status_code = status_code
+        self.body = body if body is not None else {'predictions': [ANOMALY]}
+        self.text = json.dumps(self.body)
+
+    def json(self):
+        return self.body
+
+
+class Session:
+    # Stands in for the requests session: each post runs the next of
+    # outcomes, a Response, an exception or a function of the timeout
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.timeouts = []
+
+    def post(self, url, json, timeout):
+        self.timeouts.append(timeout)
+        outcome = self.outcomes.pop(0) if len(self.outcomes) > 1 else self.outcomes[0]
+        if callable(outcome):
+            outcome = outcome(timeout)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+class Cancelled:
+    # threading.Event's interface on the fake clock: waiting advances time
+    def __init__(self, clock):
+        self.clock = clock
+        self.set_ = False
+
+    def is_set(self):
+        return self.set_
+
+    def wait(self, delay):
+        self.clock.now += delay
+        return self.set_
+
+
+@pytest.fixture
+def hedge(monkeypatch):
+    # A fresh breaker and a local model that always says normal
+    breaker = CircuitBreaker()
+    monkeypatch.setattr(azure_ml_iot, 'breaker', breaker)
+    monkeypatch.setattr(azure_ml_iot, 'predict_locally', lambda readings: ({'predictions': [dict(NORMAL) for _ in readings]}, 'local'))
+    monkeypatch.setattr(azure_ml_iot, 'REMOTE_DEADLINE', 0.2)
+    monkeypatch.setattr(azure_ml_iot.random, 'uniform', lambda low, high: 0.0)
+    return breaker
+
+
+def free_slots():
+    taken = 0
+    while azure_ml_iot.remote_slots.acquire(blocking=False):
+        taken += 1
+    for _ in range(taken):
+        azure_ml_iot.remote_slots.release()
+    return taken
+
+
+def test_breaker_opens_probes_and_closes():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60, clock=clock)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == 'closed' and breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    clock.now = 59.9
+    assert not breaker.allow()
+
+    # One probe after reset_timeout; its failure re-opens the circuit
+    clock.now = 60
+    assert breaker.allow()
+    assert breaker.state == 'half_open'
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    clock.now = 119
+    assert not breaker.allow()
+
+    # A successful probe closes it
+    clock.now = 120
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == 'closed' and breaker.failures == 0
+    assert breaker.allow() and breaker.allow()
+
+
+def test_retries_stop_at_the_deadline(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(azure_ml_iot.random, 'uniform', lambda low, high: 0.0)
+
+    def slow(status):
+        def answer(timeout):
+            clock.now += 0.45
+            return Response(status)
+        return answer
+
+    # 503, backoff 0.1 s, 503 at 1.0 s: a second backoff would pass the
+    # deadline, so the last answer is returned instead of retrying
+    session = Session(slow(503))
+    monkeypatch.setattr(azure_ml_iot, 'session', session)
+    assert post_with_retries({}, 1.0, Cancelled(clock), clock).status_code == 503
+    assert session.timeouts == [1.0, pytest.approx(0.45)]
+
+    # Each attempt only gets what is left of the deadline
+    clock.now = 0.0
+    session = Session(slow(503), slow(503), slow(200))
+    monkeypatch.setattr(azure_ml_iot, 'session', session)
+    assert post_with_retries({}, 2.0, Cancelled(clock), clock).status_code == 200
+    assert session.timeouts == [2.0, pytest.approx(1.45), pytest.approx(0.8)]
+
+    # Connection errors are retried the same way, then raised
+    clock.now = 0.0
+    session = Session(lambda timeout: requests.ConnectionError("reset"))
+    monkeypatch.setattr(azure_ml_iot, 'session', session)
+    with pytest.raises(requests.ConnectionError):
+        post_with_retries({}, 10.0, Cancelled(clock), clock)
+    assert len(session.timeouts) == azure_ml_iot.MAX_RETRIES + 1
+
+    clock.now = 0.0
+    session = Session(lambda timeout: requests.ConnectionError("reset"))
+    monkeypatch.setattr(azure_ml_iot, 'session', session)
+    with pytest.raises(TimeoutError):
+        post_with_retries({}, 0.05, Cancelled(clock), clock)
+    assert len(session.timeouts) == 1
+
+
+def test_no_retry_once_cancelled(monkeypatch):
+    clock = Clock()
+    cancelled = Cancelled(clock)
+
+    def fail_and_cancel(timeout):
+        cancelled.set_ = True
+        return requests.ConnectionError("reset")
+    session = Session(fail_and_cancel)
+    monkeypatch.setattr(azure_ml_iot, 'session', session)
+    with pytest.raises(TimeoutError):
+        post_with_retries({}, 10.0, cancelled, clock)
+    assert len(session.timeouts) == 1
+
+
+@pytest.mark.parametrize('body', [
+    {'predictions': [ANOMALY]},
+    # score.run's JSON text, serialized again by the endpoint
+    json.dumps({'predictions': [ANOMALY]})
+])
+def test_call_unwraps_answers(hedge, monkeypatch, body):
+    monkeypatch.setattr(azure_ml_iot, 'session', Session(Response(200, body)))
+    assert call_azure_ml([READING]) == {'predictions': [ANOMALY]}
+    assert hedge.failures == 0
+
+
+@pytest.mark.parametrize('response, message', [
+    (Response(200, {'error': 'Invalid record 0: missing ph'}), 'Azure ML error: Invalid record 0'),
+    (Response(200, json.dumps({'error': 'model not loaded'})), 'Azure ML error: model not loaded'),
+    (Response(200, {'predictions': []}), 'returned 0 predictions for 1 readings'),
+    (Response(401, {'message': 'unauthorized'}), 'Failed with status 401')
+])
+def test_call_rejects_error_answers(hedge, monkeypatch, response, message):
+    monkeypatch.setattr(azure_ml_iot, 'session', Session(response))
+    with pytest.raises(RuntimeError, match=message):
+        call_azure_ml([READING])
+    assert hedge.failures == 1
+
+
+def test_remote_answer_in_time_is_used_and_compared(hedge, monkeypatch):
+    monkeypatch.setattr(azure_ml_iot, 'session', Session(Response(200, {'predictions': [ANOMALY]})))
+    disagreements = PREDICTION_DISAGREEMENTS.labels('anomaly_detected')
+    before = disagreements.get()
+    result = send_to_azure_ml(READING)
+    assert (result['source'], result['remote']) == ('azure_ml', 'ok')
+    assert result['predictions'] == [ANOMALY]
+    assert result['disagreements'] == ['anomaly_detected']
+    assert disagreements.get() == before + 1
+    assert wait_for(lambda: free_slots() == azure_ml_iot.REMOTE_WORKERS)
+
+
+def test_late_answer_is_compared_after_the_local_one_is_used(hedge, monkeypatch):
+    release = threading.Event()
+
+    def late(timeout):
+        release.wait(5)
+        return Response(200, {'predictions': [ANOMALY]})
+    session = Session(late)
+    monkeypatch.setattr(azure_ml_iot, 'session', session)
+    disagreements = PREDICTION_DISAGREEMENTS.labels('anomaly_detected')
+    late_fallbacks = AZURE_ML_FALLBACKS.labels('deadline')
+    before, fallbacks = disagreements.get(), late_fallbacks.get()
+
+    result = send_to_azure_ml(READING)
+    assert (result['source'], result['remote']) == ('local', 'late')
+    assert result['predictions'] == [NORMAL]
+    assert late_fallbacks.get() == fallbacks + 1
+    assert disagreements.get() == before
+
+    release.set()
+    assert wait_for(lambda: disagreements.get() == before + 1)
+    # The breaker hears about late answers too, and the slot comes back
+    assert hedge.failures == 0
+    assert wait_for(lambda: free_slots() == azure_ml_iot.REMOTE_WORKERS)
+    assert len(session.timeouts) == 1
+
+
+def test_slow_failure_is_not_retried_after_the_deadline(hedge, monkeypatch):
+    def slow_failure(timeout):
+        time.sleep(0.4)
+        return requests.ConnectionError("reset")
+    session = Session(slow_failure)
+    monkeypatch.setattr(azure_ml_iot, 'session', session)
+
+    assert send_to_azure_ml(READING)['remote'] == 'late'
+    assert wait_for(lambda: free_slots() == azure_ml_iot.REMOTE_WORKERS)
+    assert len(session.timeouts) == 1
+    assert hedge.failures == 1
+
+
+def test_busy_when_every_worker_is_taken(hedge, monkeypatch):
+    session = Session(Response())
+    monkeypatch.setattr(azure_ml_iot, 'session', session)
+    busy = AZURE_ML_FALLBACKS.labels('busy')
+    before = busy.get()
+    for _ in range(azure_ml_iot.REMOTE_WORKERS):
+        assert azure_ml_iot.remote_slots.acquire(blocking=False)
+    try:
+        result = send_to_azure_ml(READING)
+    finally:
+        for _ in range(azure_ml_iot.REMOTE_WORKERS):
+            azure_ml_iot.remote_slots.release()
+    assert (result['source'], result['remote']) == ('local', 'busy')
+    assert busy.get() == before + 1
+    assert session.timeouts == []
+
+
+def test_open_circuit_skips_the_remote_call(hedge, monkeypatch):
+    session = Session(Response())
+    monkeypatch.setattr(azure_ml_iot, 'session', session)
+    for _ in range(azure_ml_iot.BREAKER_FAILURES):
+        hedge.record_failure()
+    result = send_to_azure_ml(READING)
+    assert (result['source'], result['remote']) == ('local', 'circuit_open')
+    assert session.timeouts == []
+    assert free_slots() == azure_ml_iot.REMOTE_WORKERS
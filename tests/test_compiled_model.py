@@ -0,0 +1,118 @@
+import warnings
+import joblib
+import numpy as np
+import pytest
+from anomaly_scoring import load_model, score_batch, slim_artefact_path
+from compiled_model import CompiledModel, check_parity, file_digest, parity_inputs
+from prediction_cache import PredictionCache
+
+MODEL_PATH = 'biogas_anomaly_model.pkl'
+
+# The model was fitted on a DataFrame and is scored with plain arrays
+pytestmark = pytest.mark.filterwarnings('ignore:X does not have valid feature names')
+
+
+@pytest.fixture(scope='module')
+def model_package():
+    return joblib.load(MODEL_PATH)
+
+
+def sklearn_predict(model_package, input_data):
+    scaled_data = model_package['scaler'].transform(input_data)
+    if 'feature_selector' in model_package:
+        scaled_data = model_package['feature_selector'].transform(scaled_data)
+    return model_package['model'].predict(scaled_data)
+
+
+def test_compiled_model_matches_sklearn(model_package):
+    checked, mismatched, mismatched_causes = check_parity(model_package)
+    assert checked > 1000000
+    assert len(mismatched) == 0
+    assert len(mismatched_causes) == 0
+
+
+def test_slim_artefact_is_current_and_matches_sklearn(model_package):
+    slim = CompiledModel.load(slim_artefact_path(MODEL_PATH))
+    # Re-export with python compiled_model.py --export after retraining
+    assert slim.source_digest == file_digest(MODEL_PATH)
+
+    input_data = parity_inputs(slim)
+    expected = sklearn_predict(model_package, input_data)
+    actual = slim.predict(input_data)
+    assert np.array_equal(actual, expected)
+    expected_causes = model_package['cause_encoder'].inverse_transform(np.round(expected[:, 1]).astype(int))
+    assert np.array_equal(slim.decode_causes(np.round(actual[:, 1]).astype(int)), expected_causes)
+
+
+def test_slim_artefact_round_trip(model_package, tmp_path):
+    compiled = CompiledModel.from_package(model_package)
+    compiled.source_digest = file_digest(MODEL_PATH)
+    path = str(tmp_path / 'model.npz')
+    compiled.save(path)
+    reloaded = CompiledModel.load(path)
+
+    input_data = parity_inputs(compiled)
+    assert np.array_equal(reloaded.predict(input_data), compiled.predict(input_data))
+    assert reloaded.source_digest == compiled.source_digest
+    assert reloaded.feature_columns == compiled.feature_columns
+
+
+def test_prediction_cache_scores_like_sklearn(model_package):
+    cache = PredictionCache(MODEL_PATH, load_model)
+    # The slim artefact is current, so the cache runs without sklearn
+    assert cache.compiled_model is not None
+
+    rng = np.random.default_rng(1)
+    columns = model_package['feature_columns']
+    ranges = {
+        'ph': np.arange(0, 1024) * 0.01,
+        'biogas_production': np.arange(0, 1024) * 0.1,
+        'hour': np.arange(0, 24),
+        'day': np.arange(1, 32),
+        'month': np.arange(1, 13),
+        'day_of_week': np.arange(0, 7)
+    }
+    input_data = np.column_stack([rng.choice(ranges[feature], 20000) for feature in columns])
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        expected_scores, expected_ids, expected_causes = score_batch(model_package, input_data)
+    for _ in range(2):
+        # The second pass is answered from the cache
+        scores, cause_ids, causes = cache.score(input_data)
+        assert np.array_equal(scores, expected_scores)
+        assert np.array_equal(cause_ids, expected_ids)
+        assert np.array_equal(np.asarray(causes).astype(str), np.asarray(expected_causes).astype(str))
+    assert cache.hits > 0
+
+
+def test_prediction_cache_is_exact_between_grid_steps(model_package):
+    # The tree splits pH and biogas production off the ADC grid (biogas at
+    # 14.82, 24.535, ...); readings just either side of each split, shuffled
+    # so cache slots are filled from either side
+    cache = PredictionCache(MODEL_PATH, load_model)
+    compiled = cache.compiled_model
+    columns = compiled.feature_columns
+    base = {'ph': 7.0, 'biogas_production': 50.0, 'hour': 12, 'day': 15, 'month': 6, 'day_of_week': 2}
+    internal = np.flatnonzero(compiled.children_left != np.arange(len(compiled.children_left)))
+
+    rows = []
+    for node in internal:
+        column = compiled.selected[compiled.feature[node]]
+        if columns[column] not in ('ph', 'biogas_production'):
+            continue
+        threshold = compiled.threshold[node] * compiled.scale[column] + compiled.mean[column]
+        for offset in (-0.05, -0.02, -0.001, 0.001, 0.02, 0.05):
+            row = [base[feature] for feature in columns]
+            row[column] = threshold + offset
+            rows.append(row)
+    input_data = np.array(rows + [[dict(base, biogas_production=14.84)[feature] for feature in columns]])
+
+    expected = sklearn_predict(model_package, input_data)
+    rng = np.random.default_rng(2)
+    for _ in range(2):
+        order = rng.permutation(len(input_data))
+        scores, cause_ids, _ = cache.score(input_data[order])
+        assert np.array_equal(scores, expected[order, 0])
+        assert np.array_equal(cause_ids, np.round(expected[order, 1]).astype(int))
+    assert cache.hits > 0
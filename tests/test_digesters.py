@@ -0,0 +1,87 @@
+import itertools
+import pytest
+from arduino_emulator import ArduinoEmulator
+from conftest import wait_for
+from digesters import parse_devices
+
+# Two digesters with readings of their own, each on an emulated board
+READINGS = {
+    'north': {'ph': 7.0, 'biogas': 60.0},
+    'south': {'ph': 5.5, 'biogas': 10.0}
+}
+
+
+def test_parse_devices():
+    assert parse_devices(" north=/dev/ttyUSB0, south=unix:/tmp/feed.sock,") == {
+        'north': '/dev/ttyUSB0',
+        'south': 'unix:/tmp/feed.sock'
+    }
+    assert parse_devices("") == {}
+    with pytest.raises(ValueError, match="expected id=port"):
+        parse_devices("north")
+    with pytest.raises(ValueError, match="listed twice"):
+        parse_devices("north=/dev/ttyUSB0,north=/dev/ttyUSB1")
+
+
+@pytest.fixture
+def site():
+    import app
+    emulators = {
+        device_id: ArduinoEmulator('keyvalue', rate=50, source=itertools.repeat(reading), banner=False)
+        for device_id, reading in READINGS.items()
+    }
+    for emulator in emulators.values():
+        emulator.start()
+    added = app.configure_digesters(",".join(f"{device_id}={emulator.port}" for device_id, emulator in emulators.items()))
+    for digester in added:
+        digester.acquisition.settle_time = 0
+    try:
+        yield emulators, {digester.id: digester for digester in added}
+    finally:
+        for digester in added:
+            digester.stop()
+            del app.digesters[digester.id]
+        for emulator in emulators.values():
+            emulator.stop()
+
+
+def test_devices_keep_separate_state_and_history(site):
+    import app
+    emulators, devices = site
+    client = app.app.test_client()
+    listed = client.get('/api/devices').get_json()
+    default_readings = app.default_digester.history.total
+    assert [device['device'] for device in listed] == ['default', 'north', 'south']
+    assert wait_for(lambda: all(digester.history.total >= 20 for digester in devices.values()))
+    assert all(device['connected'] for device in client.get('/api/devices').get_json()[1:])
+
+    for device_id, expected in READINGS.items():
+        reading = client.get(f'/api/devices/{device_id}/sensor-data').get_json()
+        assert reading['ph'] == expected['ph']
+        assert reading['biogas_production'] == expected['biogas']
+
+        history = client.get(f'/api/devices/{device_id}/historical-data').get_json()
+        assert len(history) >= 20
+        assert {(record['ph'], record['biogas_production']) for record in history} == {(expected['ph'], expected['biogas'])}
+
+    with pytest.raises(ValueError, match="already in use"):
+        app.configure_digesters("north=/dev/null")
+
+    # The model's verdict depends on the time of day, so raise the alarms
+    # directly; resetting one leaves the other alone
+    for emulator in emulators.values():
+        emulator.stop()
+    assert wait_for(lambda: not any(digester.acquisition.connected for digester in devices.values()))
+    for digester in devices.values():
+        with digester.lock:
+            digester.current.update(anomaly_detected=True, system_status='Warning')
+    assert client.post('/api/devices/south/reset-alarm').get_json()['success']
+    statuses = {device_id: client.get(f'/api/devices/{device_id}/system-status').get_json() for device_id in devices}
+    assert (statuses['south']['status'], statuses['south']['anomaly_detected']) == ('Normal', False)
+    assert (statuses['north']['status'], statuses['north']['anomaly_detected']) == ('Warning', True)
+    assert all(status['readings'] >= 20 for status in statuses.values())
+
+    # None of it reached the default digester
+    assert app.default_digester.history.total == default_readings
+    assert client.get('/api/devices/west/sensor-data').status_code == 404
+    assert client.post('/api/devices/west/reset-alarm').status_code == 404
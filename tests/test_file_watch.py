@@ -0,0 +1,113 @@
+import os
+import threading
+import time
+import pytest
+import file_watch
+from file_watch import FileWatcher, atomic_write
+
+
+@pytest.fixture(params=['inotify', 'poll'])
+def watch(request, tmp_path, monkeypatch):
+    if request.param == 'poll':
+        monkeypatch.setattr(file_watch, '_inotify', lambda: None)
+    watchers = []
+
+    def make(name='data.json'):
+        watcher = FileWatcher(str(tmp_path / name), poll_interval=0.01)
+        watchers.append(watcher)
+        assert watcher.mode == request.param
+        return watcher
+    yield make
+    for watcher in watchers:
+        watcher.close()
+
+
+def test_atomic_write_replaces_whole_file(tmp_path):
+    path = str(tmp_path / 'result.txt')
+    atomic_write(path, "RESULT:0,Normal")
+    atomic_write(path, b"RESULT:1,pH Level")
+    with open(path, 'rb') as f:
+        assert f.read() == b"RESULT:1,pH Level"
+    assert os.listdir(tmp_path) == ['result.txt']
+
+
+def test_atomic_write_failure_keeps_old_file(tmp_path, monkeypatch):
+    path = str(tmp_path / 'result.txt')
+    atomic_write(path, "RESULT:0,Normal")
+
+    def fail(source, target):
+        raise OSError("disk full")
+    monkeypatch.setattr(os, 'replace', fail)
+    with pytest.raises(OSError):
+        atomic_write(path, "RESULT:1,Biogas")
+    with open(path) as f:
+        assert f.read() == "RESULT:0,Normal"
+    assert os.listdir(tmp_path) == ['result.txt']
+
+
+def test_readers_never_see_half_an_atomic_write(tmp_path):
+    path = str(tmp_path / 'data.json')
+    contents = [b'a' * 256 * 1024, b'b' * 128 * 1024]
+    atomic_write(path, contents[0])
+    stop = threading.Event()
+
+    def writer():
+        index = 0
+        while not stop.is_set():
+            index += 1
+            atomic_write(path, contents[index % 2])
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        for _ in range(500):
+            with open(path, 'rb') as f:
+                assert f.read() in contents
+    finally:
+        stop.set()
+        thread.join()
+
+
+def test_wait_reports_writes_to_the_watched_file_only(watch, tmp_path):
+    # The file does not exist yet; the watch is on its directory
+    watcher = watch()
+    assert not watcher.wait(0.1)
+
+    atomic_write(str(tmp_path / 'other.json'), '{}')
+    assert not watcher.wait(0.1)
+
+    atomic_write(watcher.path, '{"ph": 7.0}')
+    assert watcher.wait(2.0)
+    assert watcher.events == 1
+
+    os.unlink(watcher.path)
+    atomic_write(watcher.path, '{"ph": 7.1, "biogas_production": 55.0}')
+    assert watcher.wait(2.0)
+
+
+def test_changes_between_waits_are_coalesced(watch):
+    watcher = watch()
+    for ph in (6.9, 7.0, 7.1):
+        atomic_write(watcher.path, f'{{"ph": {ph}}}')
+        # Far enough apart for the poll fallback to tell them apart by mtime
+        time.sleep(0.02)
+    assert watcher.wait(2.0)
+    assert not watcher.wait(0.1)
+    assert watcher.events == 1
+
+
+def test_non_atomic_writer_is_seen_once_complete(watch):
+    watcher = watch()
+    with open(watcher.path, 'w') as f:
+        f.write('{"ph": 7.0, ')
+        f.flush()
+        if watcher.mode == 'inotify':
+            # Only closing the file counts as a write
+            assert not watcher.wait(0.1)
+        else:
+            # Polling sees the size change and reports the half file, then
+            # again once the writer is done
+            assert watcher.wait(2.0)
+        f.write('"biogas_production": 55.0}')
+    assert watcher.wait(2.0)
+    with open(watcher.path) as f:
+        assert f.read() == '{"ph": 7.0, "biogas_production": 55.0}'
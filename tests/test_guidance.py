@@ -0,0 +1,95 @@
+import pytest
+from openai import AzureOpenAI
+import openai_standin
+from guidance import GuidanceCache, stream_answer
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def standin(monkeypatch):
+    monkeypatch.setattr(openai_standin, 'FIRST_TOKEN_DELAY', 0)
+    monkeypatch.setattr(openai_standin, 'TOKEN_DELAY', 0)
+    monkeypatch.setattr(openai_standin, 'stats', {"requests": 0, "streamed": 0})
+    server = openai_standin.serve(port=0)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def completion(server):
+    client = AzureOpenAI(azure_endpoint=f"http://127.0.0.1:{server.server_address[1]}",
+                         api_key="x", api_version="2025-01-01-preview", max_retries=0)
+    return lambda: client.chat.completions.create(
+        model="standin", messages=[{"role": "user", "content": "Bagaimana kondisinya?"}], stream=True)
+
+
+def test_key_ignores_numbers_issue_order_and_question_case():
+    key = GuidanceCache.key("warning", ["pH 6.2 terlalu rendah", "Suhu 31°C terlalu dingin"], "  Apa yang harus  DILAKUKAN? ")
+    assert key == GuidanceCache.key("warning", ["Suhu 29°C terlalu dingin", "pH 6.4 terlalu rendah"], "apa yang harus dilakukan?")
+    assert key != GuidanceCache.key("critical", ["pH 6.2 terlalu rendah", "Suhu 31°C terlalu dingin"], "apa yang harus dilakukan?")
+    assert key != GuidanceCache.key("warning", ["pH 6.2 terlalu rendah"], "apa yang harus dilakukan?")
+
+
+def test_entries_expire_after_ttl_and_oldest_are_evicted():
+    clock = Clock()
+    cache = GuidanceCache(ttl=600, max_size=2, clock=clock)
+    cache.put("a", "jawaban a")
+    clock.now = 600
+    assert cache.get("a") == "jawaban a"
+    clock.now = 600.5
+    assert cache.get("a") is None
+    assert "a" not in cache.entries
+
+    cache.put("a", "jawaban a")
+    cache.put("b", "jawaban b")
+    # Reading a refreshes its place, so b is the one evicted
+    assert cache.get("a") == "jawaban a"
+    cache.put("c", "jawaban c")
+    assert list(cache.entries) == ["a", "c"]
+
+
+def test_streams_from_standin_then_answers_from_cache(standin):
+    cache = GuidanceCache(ttl=600)
+    key = GuidanceCache.key("normal", [], "")
+
+    chunks = list(stream_answer(cache, key, completion(standin)))
+    # Token by token, with the content-filter chunk skipped
+    assert len(chunks) == len(openai_standin.ANSWER.split(" "))
+    assert "".join(chunks).strip() == openai_standin.ANSWER
+    assert openai_standin.stats == {"requests": 1, "streamed": 1}
+
+    assert list(stream_answer(cache, key, completion(standin))) == ["".join(chunks)]
+    assert openai_standin.stats["requests"] == 1
+
+
+def test_errors_are_not_cached(standin):
+    cache = GuidanceCache(ttl=600)
+    key = GuidanceCache.key("critical", ["pH 5.0 terlalu rendah"], "")
+
+    def unreachable():
+        raise ConnectionError("endpoint unreachable")
+    with pytest.raises(ConnectionError):
+        list(stream_answer(cache, key, unreachable))
+    assert cache.get(key) is None
+
+    # An answer cut off part way is not cached either
+    create = completion(standin)
+
+    def cut_off():
+        for index, chunk in enumerate(create()):
+            if index == 3:
+                raise ConnectionError("stream reset")
+            yield chunk
+    with pytest.raises(ConnectionError):
+        list(stream_answer(cache, key, cut_off))
+    assert cache.get(key) is None
+
+    assert "".join(stream_answer(cache, key, create)).strip() == openai_standin.ANSWER
+    assert cache.get(key) is not None
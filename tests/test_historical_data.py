@@ -0,0 +1,31 @@
+import pytest
+
+
+@pytest.fixture(scope='module')
+def client():
+    import app
+    client = app.app.test_client()
+    # The first request loads the sample history
+    client.get('/api/system-status')
+    return client
+
+
+@pytest.mark.parametrize('path', ['/api/historical-data', '/api/devices/default/historical-data'])
+def test_max_points_decimates(client, path):
+    response = client.get(f'{path}?max_points=5')
+    assert response.status_code == 200
+    assert 0 < len(response.get_json()) <= 5
+
+
+@pytest.mark.parametrize('path', ['/api/historical-data', '/api/devices/default/historical-data'])
+@pytest.mark.parametrize('max_points', ['0', '-3'])
+def test_non_positive_max_points_is_rejected(client, path, max_points):
+    response = client.get(f'{path}?max_points={max_points}')
+    assert response.status_code == 400
+    assert 'max_points must be positive' in response.get_json()['error']
+
+
+def test_stored_history_rejects_non_positive_max_points(client):
+    # Windows older than the in-memory buffer are served from the store
+    response = client.get('/api/historical-data?since=2000-01-01T00:00:00&max_points=0')
+    assert response.status_code == 400
@@ -0,0 +1,41 @@
+import pytest
+
+
+@pytest.fixture(scope='module')
+def client():
+    import app
+    return app.app.test_client()
+
+
+def test_batch_scores_valid_records(client):
+    response = client.post('/api/predict', json={'data': [
+        {'ph': 7.0, 'biogas_production': 55.0},
+        {'ph': '6.8', 'biogas_production': 60, 'timestamp': '2026-10-18T10:00:00'}
+    ]})
+    assert response.status_code == 200
+    results = response.get_json()['results']
+    assert [result['input']['ph'] for result in results] == [7.0, 6.8]
+    assert all(result['prediction']['cause'] != 'Error in prediction' for result in results)
+
+
+@pytest.mark.parametrize('record', [
+    {'ph': 7.0, 'biogas_production': 55.0, 'timestamp': 'yesterday'},
+    {'ph': 'acidic', 'biogas_production': 55.0},
+    {'ph': 7.0, 'biogas_production': [55.0]},
+    {'ph': 7.0, 'biogas_production': 55.0, 'hour': 'noon'}
+])
+def test_batch_rejects_bad_record_with_its_index(client, record):
+    response = client.post('/api/predict', json={'data': [{'ph': 7.0, 'biogas_production': 55.0}, record]})
+    assert response.status_code == 400
+    assert 'record 1' in response.get_json()['error']
+
+
+def test_batch_rejects_missing_fields(client):
+    response = client.post('/api/predict', json={'data': [{'ph': 7.0}]})
+    assert response.status_code == 400
+    assert 'record 0' in response.get_json()['error']
+
+
+def test_single_rejects_non_numeric(client):
+    response = client.post('/api/predict', json={'ph': 'acidic', 'biogas_production': 55.0})
+    assert response.status_code == 400
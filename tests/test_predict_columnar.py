@@ -0,0 +1,52 @@
+import numpy as np
+from columnar import NPY_CONTENT_TYPE, decode_results, encode_features
+
+# Normal and anomalous readings, with calendar fields so both paths score
+# exactly the same feature rows
+READINGS = [
+    {'ph': 7.1, 'biogas_production': 50.0, 'hour': 12, 'day': 15, 'month': 6, 'day_of_week': 2},
+    {'ph': 7.0, 'biogas_production': 65.0, 'hour': 3, 'day': 1, 'month': 1, 'day_of_week': 0},
+    {'ph': 4.5, 'biogas_production': 10.0, 'hour': 12, 'day': 15, 'month': 6, 'day_of_week': 2},
+    {'ph': 9.8, 'biogas_production': 95.0, 'hour': 23, 'day': 28, 'month': 12, 'day_of_week': 6},
+    {'ph': 6.2, 'biogas_production': 30.0, 'hour': 8, 'day': 9, 'month': 3, 'day_of_week': 4},
+]
+
+
+def test_columnar_matches_json():
+    import app
+    client = app.app.test_client()
+    feature_columns = app.prediction_cache.model_package['feature_columns']
+
+    response = client.post('/api/predict', json={'data': READINGS})
+    assert response.status_code == 200
+    expected = [result['prediction'] for result in response.get_json()['results']]
+
+    features = np.array([[reading[feature] for feature in feature_columns] for reading in READINGS])
+    response = client.post('/api/predict', data=encode_features(features), content_type=NPY_CONTENT_TYPE)
+    assert response.status_code == 200
+    results = decode_results(response.data)
+
+    assert len(results) == len(expected)
+    # Both kinds of reading are covered
+    assert {bool(row['anomaly_detected']) for row in results} == {True, False}
+    for row, prediction in zip(results, expected):
+        assert row['anomaly_score'] == prediction['anomaly_probability']
+        assert str(row['cause']) == prediction['cause']
+        assert bool(row['anomaly_detected']) == (prediction['cause'] != 'None')
+        if not row['anomaly_detected']:
+            assert row['cause_id'] == -1
+
+
+def test_score_run_columnar_matches_app(score_model):
+    import app
+    feature_columns = app.prediction_cache.model_package['feature_columns']
+    body = encode_features(np.array([[reading[feature] for feature in feature_columns] for reading in READINGS]))
+
+    response = app.app.test_client().post('/api/predict', data=body, content_type=NPY_CONTENT_TYPE)
+    expected = decode_results(response.data)
+    results = decode_results(score_model.run(body, NPY_CONTENT_TYPE))
+
+    assert {bool(row['anomaly_detected']) for row in results} == {True, False}
+    for field in ('anomaly_score', 'anomaly_detected', 'cause_id'):
+        assert np.array_equal(results[field], expected[field])
+    assert results['cause'].astype(str).tolist() == expected['cause'].astype(str).tolist()
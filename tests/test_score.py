@@ -0,0 +1,45 @@
+import json
+import pytest
+import score
+
+VALID = {'ph': 7.1, 'biogas_production': 50.0, 'timestamp': '2026-10-18T10:00:00'}
+
+
+pytestmark = pytest.mark.usefixtures('score_model')
+
+
+def run(records):
+    return json.loads(score.run(json.dumps({'data': records})))
+
+
+def test_run_scores_valid_batch():
+    result = run([VALID, dict(VALID, ph='6.5', hour=3)])
+    assert len(result['predictions']) == 2
+
+
+@pytest.mark.parametrize('record, message', [
+    ({}, 'missing ph, biogas_production'),
+    ({'ph': 7.0}, 'missing biogas_production'),
+    (dict(VALID, ph='acidic'), 'ph is not a number'),
+    (dict(VALID, biogas_production=[50.0]), 'biogas_production is not a number'),
+    (dict(VALID, hour='noon'), 'hour is not a number'),
+    (dict(VALID, timestamp='yesterday'), 'invalid timestamp'),
+    ('7.1,50.0', 'expected an object')
+])
+def test_run_rejects_bad_record_with_its_index(record, message):
+    result = run([VALID, record])
+    assert 'predictions' not in result
+    assert result['error'].startswith('Invalid record 1: ')
+    assert message in result['error']
+
+
+def test_run_rejects_bad_single_record():
+    record = {'ph': 'acidic', 'biogas_production': 50.0, 'hour': 12, 'day': 15, 'month': 6, 'day_of_week': 2}
+    result = json.loads(score.run(json.dumps(record)))
+    assert 'anomaly_score' not in result
+    assert 'Invalid record 0' in result['error']
+
+
+def test_score_records_rejects_bad_record():
+    with pytest.raises(ValueError, match='Invalid record 2: missing biogas_production'):
+        score.score_records([VALID, VALID, {'ph': 7.0, 'biogas_production': None}])
@@ -0,0 +1,99 @@
+import os
+import tty
+import pytest
+from conftest import wait_for
+from sensor_feed import FeedAcquisition, FeedServer, connect, parse_event_line
+from sensor_protocol import encode_frame
+from serial_daemon import SerialDaemon
+
+
+def read_events(sock, count, timeout=10.0):
+    sock.settimeout(timeout)
+    stream = sock.makefile('rb')
+    events = []
+    while len(events) < count:
+        line = stream.readline()
+        assert line, "feed closed early"
+        event = parse_event_line(line)
+        if event is not None:
+            events.append(event)
+    return events
+
+
+@pytest.fixture
+def address(tmp_path):
+    return 'unix:' + str(tmp_path / 'feed.sock')
+
+
+def test_daemon_resyncs_and_fans_out(address):
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    daemon = SerialDaemon(os.ttyname(slave), 115200, address=address, protocol='binary')
+    daemon.acquisition.settle_time = 0
+    daemon.start()
+    subscribers = []
+    try:
+        assert wait_for(lambda: daemon.acquisition.connected)
+        subscribers = [connect(address), connect(address)]
+        assert wait_for(lambda: daemon.server.client_count() == 2)
+
+        frames = [encode_frame(seq, 37.0, 2.5, 50.0 + seq, 200) for seq in range(6)]
+        corrupted = bytearray(frames[2])
+        corrupted[8] ^= 0xFF
+        # Boot noise, a frame cut short, a frame with a bad CRC, and frames
+        # split across writes
+        stream = b"Display setup complete\r\n" + frames[0] + frames[1][:7] + frames[1] + bytes(corrupted) + b''.join(frames[3:])
+        for offset in range(0, len(stream), 10):
+            os.write(master, stream[offset:offset + 10])
+
+        received = [read_events(sock, 5) for sock in subscribers]
+        for events in received:
+            assert [round(event['biogas'], 1) for event in events] == [50.0, 51.0, 53.0, 54.0, 55.0]
+            assert [event['seq'] for event in events] == [1, 2, 3, 4, 5]
+            assert all(event['ph'] == pytest.approx(7.0) for event in events)
+        # The cut-short frame fails its CRC too, read together with the next
+        assert daemon.decoder.crc_errors == 2
+        assert daemon.decoder.dropped == 1
+    finally:
+        for sock in subscribers:
+            sock.close()
+        daemon.stop()
+        os.close(master)
+
+
+def test_feed_acquisition_reconnects(address):
+    received = []
+    server = FeedServer(address, heartbeat=0.2)
+    server.start()
+    feed = FeedAcquisition(received.append, address, min_backoff=0.05, max_backoff=0.1, timeout=1.0)
+    feed.start()
+    try:
+        assert wait_for(lambda: feed.connected and server.client_count() == 1)
+        server.publish(1, 'reading', {'seq': 1, 'timestamp': 100.0})
+        assert wait_for(lambda: [reading['seq'] for reading in received] == [1])
+
+        # The connection drops; on reconnect the server re-sends the reading
+        # the subscriber already has, which is dropped
+        server.stop()
+        assert wait_for(lambda: not feed.connected)
+        server = FeedServer(address, heartbeat=0.2)
+        server.publish(1, 'reading', {'seq': 1, 'timestamp': 100.0})
+        server.start()
+        assert wait_for(lambda: feed.stats()['duplicates'] == 1)
+        server.publish(2, 'reading', {'seq': 2, 'timestamp': 101.0})
+        assert wait_for(lambda: [reading['seq'] for reading in received] == [1, 2])
+
+        # The daemon restarts and numbers from 1 again; its newer timestamp
+        # gets the reading through
+        server.stop()
+        assert wait_for(lambda: not feed.connected)
+        server = FeedServer(address, heartbeat=0.2)
+        server.publish(1, 'reading', {'seq': 1, 'timestamp': 200.0})
+        server.start()
+        assert wait_for(lambda: [reading['seq'] for reading in received] == [1, 2, 1])
+        server.publish(2, 'reading', {'seq': 2, 'timestamp': 201.0})
+        assert wait_for(lambda: [reading['seq'] for reading in received] == [1, 2, 1, 2])
+        assert feed.stats()['duplicates'] == 1
+    finally:
+        feed.stop()
+        server.stop()
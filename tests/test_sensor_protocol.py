@@ -0,0 +1,80 @@
+import math
+import numpy as np
+from sensor_protocol import FIELDS, FrameDecoder, encode_frame, parse_sensor_line, ph_from_raw
+
+
+def synthetic_stream(count, seed=0):
+    rng = np.random.default_rng(seed)
+    values = {
+        'temperature': rng.integers(300, 450, count) / 10,
+        'ph': rng.integers(0, 501, count) / 100,
+        'biogas': rng.integers(0, 1024, count) / 10,
+        'gas_level': rng.integers(0, 2048, count)
+    }
+    frames = [encode_frame(seq, *row) for seq, row in enumerate(zip(*(values[field] for field in FIELDS)))]
+    return values, frames
+
+
+def decode_all(decoder, stream, chunk_size=4096):
+    chunks = [decoder.feed(stream[offset:offset + chunk_size]) for offset in range(0, len(stream), chunk_size)]
+    return {field: np.concatenate([chunk[field] for chunk in chunks]) for field in ('seq',) + FIELDS}
+
+
+def test_binary_round_trip_with_loss_and_corruption():
+    count = 20000
+    values, frames = synthetic_stream(count)
+    # One frame lost on the wire, one corrupted behind a line of boot text
+    frames.pop(1000)
+    corrupted = bytearray(frames[2000])
+    corrupted[6] ^= 0xFF
+    frames[2000] = b"Display setup complete\r\n" + bytes(corrupted)
+
+    decoder = FrameDecoder()
+    decoded = decode_all(decoder, b''.join(frames))
+
+    kept = np.delete(np.arange(count), [1000, 2001])
+    assert decoder.mode == 'binary'
+    assert np.array_equal(decoded['seq'], kept % 65536)
+    assert np.allclose(decoded['temperature'], values['temperature'][kept])
+    assert np.allclose(decoded['biogas'], values['biogas'][kept])
+    assert np.array_equal(decoded['gas_level'], values['gas_level'][kept])
+    # The probe reading arrives converted to pH
+    assert np.allclose(decoded['ph'], ph_from_raw(values['ph'][kept]))
+    assert decoder.dropped == 2
+    assert decoder.crc_errors == 1
+
+
+def test_resync_at_every_split_point():
+    _, frames = synthetic_stream(3)
+    stream = b'\xa5\x01garbage' + b''.join(frames)
+    for split in range(1, len(stream)):
+        decoder = FrameDecoder('binary')
+        first = decoder.feed(stream[:split])
+        second = decoder.feed(stream[split:])
+        assert np.concatenate([first['seq'], second['seq']]).tolist() == [0, 1, 2]
+
+
+def test_sequence_wraps_without_drops():
+    frames = [encode_frame(seq, 37.0, 2.5, 50.0, 200) for seq in range(65530, 65542)]
+    decoder = FrameDecoder('binary')
+    decoded = decoder.feed(b''.join(frames))
+    assert decoded['seq'].tolist() == [seq % 65536 for seq in range(65530, 65542)]
+    assert decoder.dropped == 0
+
+
+def test_csv_compatibility():
+    decoder = FrameDecoder()
+    readings = decoder.feed(b"Starting display initialization...\r\n37.5,2.56,204\r\n36.0,9.90,210\r\n")
+    assert decoder.mode == 'csv'
+    assert readings['gas_level'].tolist() == [204.0, 210.0]
+    assert math.isnan(readings['biogas'][0])
+    # In range converts to pH, out of range is NaN
+    assert readings['ph'][0] == ph_from_raw(2.56)
+    assert math.isnan(readings['ph'][1])
+    assert decoder.parse_errors == 1
+
+
+def test_parse_sensor_line():
+    assert parse_sensor_line("37.5,2.56,204")['ph'] == ph_from_raw(2.56)
+    assert parse_sensor_line("37.5,7.0,204") is None
+    assert parse_sensor_line("37.5") is None
@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+from status_engine import OPTIMAL_RANGES, STATUSES, StatusEngine
+
+
+def cascade_analyze(temp, ph, methane):
+    # main.analyze_sensor_data before the rule table, kept as the reference
+    issues = []
+    status = "optimal"
+
+    if temp < OPTIMAL_RANGES["temperature"]["critical_min"] or temp > OPTIMAL_RANGES["temperature"]["critical_max"]:
+        issues.append(f"🚨 BAHAYA: Suhu {temp:.1f}°C terlalu ekstrem!")
+        status = "critical"
+    elif temp < OPTIMAL_RANGES["temperature"]["min"] or temp > OPTIMAL_RANGES["temperature"]["max"]:
+        if temp < OPTIMAL_RANGES["temperature"]["min"]:
+            issues.append(f"⚠️ PERHATIAN: Suhu {temp:.1f}°C terlalu dingin")
+        else:
+            issues.append(f"⚠️ PERHATIAN: Suhu {temp:.1f}°C terlalu panas")
+        if status != "critical":
+            status = "warning"
+
+    if ph < OPTIMAL_RANGES["ph"]["critical_min"] or ph > OPTIMAL_RANGES["ph"]["critical_max"]:
+        if ph < OPTIMAL_RANGES["ph"]["critical_min"]:
+            issues.append(f"🚨 BAHAYA: pH {ph:.1f} terlalu asam!")
+        else:
+            issues.append(f"🚨 BAHAYA: pH {ph:.1f} terlalu basa!")
+        status = "critical"
+    elif ph < OPTIMAL_RANGES["ph"]["min"] or ph > OPTIMAL_RANGES["ph"]["max"]:
+        if ph < OPTIMAL_RANGES["ph"]["min"]:
+            issues.append(f"⚠️ PERHATIAN: pH {ph:.1f} agak asam")
+        else:
+            issues.append(f"⚠️ PERHATIAN: pH {ph:.1f} agak basa")
+        if status != "critical":
+            status = "warning"
+
+    if methane < OPTIMAL_RANGES["methane"]["critical_min"]:
+        issues.append(f"🚨 BAHAYA: Gas metana {methane:.0f} ppm sangat rendah!")
+        status = "critical"
+    elif methane > OPTIMAL_RANGES["methane"]["critical_max"]:
+        issues.append(f"🚨 BAHAYA: Gas metana {methane:.0f} ppm terlalu tinggi!")
+        status = "critical"
+    elif methane < OPTIMAL_RANGES["methane"]["min"]:
+        issues.append(f"⚠️ PERHATIAN: Produksi gas {methane:.0f} ppm masih kurang")
+        if status != "critical":
+            status = "warning"
+
+    return status, issues
+
+
+@pytest.fixture(scope='module')
+def engine():
+    return StatusEngine()
+
+
+@pytest.fixture(scope='module')
+def readings(engine):
+    # Random readings around each field's bounds, and every bound, its float
+    # neighbours and NaN mixed into the other fields at random
+    rng = np.random.default_rng(0)
+    n = 50000
+    columns = []
+    for compiled in engine.rules:
+        bounds = np.array([bound for _, bound, _, _ in compiled])
+        edges = np.concatenate([bounds, np.nextafter(bounds, -np.inf), np.nextafter(bounds, np.inf), [np.nan]])
+        span = bounds.max() - bounds.min()
+        random_values = rng.uniform(bounds.min() - span, bounds.max() + span, n)
+        columns.append(np.concatenate([random_values, rng.choice(edges, n)]))
+    return columns
+
+
+def test_analyze_matches_cascade(engine, readings):
+    for values in zip(*(column.tolist() for column in readings)):
+        assert engine.analyze(*values) == cascade_analyze(*values), values
+
+
+def test_classify_matches_analyze(engine, readings):
+    status_codes, issue_codes = engine.classify(*readings)
+    for row, values in enumerate(zip(*(column.tolist() for column in readings))):
+        expected = engine.analyze(*values)
+        assert (STATUSES[status_codes[row]], engine.render_issues(issue_codes[row], values)) == expected, values
+
+
+def test_nan_raises_no_issue(engine):
+    assert engine.analyze(float('nan'), 7.0, 200.0) == ("optimal", [])
+    status_codes, issue_codes = engine.classify([np.nan], [7.0], [200.0])
+    assert status_codes.tolist() == [0]
+    assert issue_codes.tolist() == [[0, 0, 0]]